@@ -0,0 +1,207 @@
+# api.py
+# Версионированный JSON API для объявлений (/api/v1) с условными GET-запросами
+import base64
+import hashlib
+import json
+from datetime import datetime
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Optional, Dict, Any
+
+from fastapi import APIRouter, Request, Query
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response
+
+from services import OfferService
+from similarity import index as similarity_index
+
+offer_service = OfferService()
+
+router = APIRouter(prefix="/api/v1", tags=["api-v1"])
+
+# Клиенты обязаны перепроверять ответ, но могут хранить его у себя
+CACHE_CONTROL = "public, max-age=0, must-revalidate"
+# Контакты видны только вошедшим пользователям: их нет ни в публичном API,
+# ни в карточке/списке для анонимов (шаблоны проверяют вход, снимок собирается без них)
+PRIVATE_OFFER_FIELDS = ("contact", "email", "phone")
+
+
+# ================================
+# Вспомогательные функции
+# ================================
+
+def make_etag(*parts) -> str:
+    """Сформировать слабый ETag из частей версии"""
+    raw = "|".join(str(part) for part in parts)
+    return 'W/"' + hashlib.sha1(raw.encode()).hexdigest()[:20] + '"'
+
+
+def format_http_date(value: Optional[datetime]) -> Optional[str]:
+    """Отформатировать дату для заголовка Last-Modified"""
+    if not value or not hasattr(value, "timestamp"):
+        return None
+    return formatdate(value.timestamp(), usegmt=True)
+
+
+def is_not_modified(request: Request, etag: str, last_modified: Optional[datetime]) -> bool:
+    """Проверить If-None-Match / If-Modified-Since (If-None-Match имеет приоритет)"""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        if if_none_match.strip() == "*":
+            return True
+        # Сравнение слабых ETag: префикс W/ не учитывается
+        candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return etag.removeprefix("W/") in candidates
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified and hasattr(last_modified, "timestamp"):
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        return int(last_modified.timestamp()) <= int(since.timestamp())
+
+    return False
+
+
+def conditional_headers(etag: str, last_modified: Optional[datetime]) -> Dict[str, str]:
+    """Заголовки валидации кеша"""
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+    http_date = format_http_date(last_modified)
+    if http_date:
+        headers["Last-Modified"] = http_date
+    return headers
+
+
+def not_modified(headers: Dict[str, str]) -> Response:
+    """Ответ 304 без тела"""
+    return Response(status_code=304, headers=headers)
+
+
+def public_offer(offer: Dict[str, Any]) -> Dict[str, Any]:
+    """Объявление без контактов автора"""
+    return {key: value for key, value in offer.items() if key not in PRIVATE_OFFER_FIELDS}
+
+
+def encode_cursor(offer: Dict[str, Any]) -> str:
+    """Закодировать курсор (created_at, id) последнего объявления страницы"""
+    created_at = offer.get("created_at")
+    if hasattr(created_at, "isoformat"):
+        created_at = created_at.isoformat()
+    raw = json.dumps([created_at, offer["id"]])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Optional[tuple]:
+    """Раскодировать курсор; None, если курсор поврежден"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, offer_id = json.loads(base64.urlsafe_b64decode(padded))
+        return datetime.fromisoformat(created_at), int(offer_id)
+    except Exception:
+        return None
+
+
+# ================================
+# Объявления
+# ================================
+
+@router.get("/offers")
+async def api_offers(
+    request: Request,
+    category: str = Query(""),
+    city: str = Query(""),
+    search: str = Query(""),
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = Query(None),
+    facets: bool = Query(False),
+):
+    """Список активных объявлений с фильтрами и курсорной пагинацией"""
+    after = None
+    if cursor:
+        after = decode_cursor(cursor)
+        if not after:
+            return JSONResponse({"success": False, "message": "Некорректный курсор"}, status_code=400)
+
+    # Страница и счетчики - из кешей выдачи и фасетов (ключи включают поколения,
+    # которые сдвигает любое изменение выдачи), БД - только при промахе.
+    # ETag считается по самому ответу, поэтому тело и валидатор всегда совпадают
+    offers = offer_service.get_offers_page(category, city, search, limit + 1, after)
+    facet_counts = offer_service.get_facets(category, city, search)
+    # Берем на одну запись больше, чтобы узнать, есть ли следующая страница
+    has_more = len(offers) > limit
+    offers = offers[:limit]
+
+    body = {
+        "success": True,
+        "offers": [public_offer(offer) for offer in offers],
+        "count": len(offers),
+        "total": facet_counts["total"],
+        "next_cursor": encode_cursor(offers[-1]) if has_more and offers else None,
+    }
+    if facets:
+        body["facets"] = facet_counts
+
+    content = jsonable_encoder(body)
+    etag = make_etag("offers", json.dumps(content, sort_keys=True, ensure_ascii=False))
+    headers = conditional_headers(etag, None)
+    if is_not_modified(request, etag, None):
+        return not_modified(headers)
+    return JSONResponse(content, headers=headers)
+
+
+@router.get("/offers/{offer_id}")
+async def api_offer_detail(request: Request, offer_id: int):
+    """Одно объявление"""
+    version = offer_service.get_offer_version(offer_id)
+    if not version:
+        return JSONResponse({"success": False, "message": "Объявление не найдено"}, status_code=404)
+
+    etag = make_etag("offer", version["id"], version["user_id"],
+                     version["changed_at"], version["author_changed_at"])
+    headers = conditional_headers(etag, version["last_modified"])
+    if is_not_modified(request, etag, version["last_modified"]):
+        return not_modified(headers)
+
+    offer = offer_service.get_offer_by_id(offer_id)
+    if not offer:
+        return JSONResponse({"success": False, "message": "Объявление не найдено"}, status_code=404)
+
+    return JSONResponse(jsonable_encoder({"success": True, "offer": public_offer(offer)}), headers=headers)
+
+
+@router.get("/offers/{offer_id}/similar")
+async def api_similar_offers(
+    offer_id: int,
+    kind: str = Query("similar", pattern="^(similar|complementary)$"),
+    limit: int = Query(6, ge=1, le=50),
+):
+    """Похожие или подходящие для обмена объявления (индекс в памяти, без ETag)"""
+    items = similarity_index.top_k_batch([offer_id], limit, kind).get(offer_id, [])
+    return JSONResponse({"success": True, "kind": kind, "offers": items, "count": len(items)})
+
+
+@router.get("/users/{user_id}/offers")
+async def api_user_offers(
+    request: Request,
+    user_id: int,
+    limit: Optional[int] = Query(None, ge=1, le=100),
+):
+    """Активные объявления пользователя"""
+    version = offer_service.get_user_offers_version(user_id)
+    if version is None:
+        return JSONResponse({"success": False, "message": "Ошибка базы данных"}, status_code=503)
+
+    etag = make_etag("user_offers", user_id, version["count"], version["max_id"], version["id_sum"],
+                     version["last_modified"], limit or "")
+    headers = conditional_headers(etag, version["last_modified"])
+    if is_not_modified(request, etag, version["last_modified"]):
+        return not_modified(headers)
+
+    offers = offer_service.get_user_offers(user_id, limit)
+
+    return JSONResponse(jsonable_encoder({
+        "success": True,
+        "offers": offers,
+        "count": len(offers),
+        "total": version["count"],
+    }), headers=headers)
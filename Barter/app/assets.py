@@ -0,0 +1,190 @@
+# assets.py
+# Стили и скрипты страниц: исходники лежат в static/src, при старте они
+# минифицируются и пишутся в static/dist с хешем содержимого в имени файла.
+# Шаблоны ссылаются на них через asset_url(); бандлы отдаются с
+# Cache-Control immutable, поэтому браузер скачивает их один раз на версию.
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from fastapi.staticfiles import StaticFiles
+
+from logs import get_logger
+
+logger = get_logger("assets")
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+SRC_DIR = os.path.join(BASE_DIR, "static", "src")
+DIST_DIR = os.path.join(BASE_DIR, "static", "dist")
+URL_PREFIX = "/static/dist/"
+
+# BARTER_ASSETS_MINIFY=0 - бандлы без минификации (удобно отлаживать в браузере)
+MINIFY = os.environ.get("BARTER_ASSETS_MINIFY", "1") != "0"
+# Старые версии бандлов живут неделю: страницы, отданные до выкладки, их еще запросят
+KEEP_OLD_SECONDS = 7 * 24 * 3600
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+_STRING_PATTERN = r"""("(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*')"""
+_STRING_RE = re.compile(_STRING_PATTERN)
+# Комментарий вне строки; строка захватывается группой и остается как есть
+_CSS_COMMENT_RE = re.compile(_STRING_PATTERN + r"|/\*.*?\*/", re.S)
+
+
+def minify_css(text: str) -> str:
+    """Убрать комментарии и лишние пробелы (строки в кавычках не трогаются)"""
+    parts = _STRING_RE.split(_CSS_COMMENT_RE.sub(lambda match: match.group(1) or "", text))
+    for i in range(0, len(parts), 2):
+        code = re.sub(r"\s+", " ", parts[i])
+        code = re.sub(r"\s*([{};,>])\s*", r"\1", code)
+        parts[i] = code.replace(";}", "}")
+    return "".join(parts).strip()
+
+
+def minify_js(text: str) -> str:
+    """Консервативная минификация: отступы, пустые строки и строчные комментарии.
+
+    Переводы строк сохраняются (автоподстановка ';' не ломается),
+    многострочные шаблонные строки `...` остаются как есть.
+    """
+    lines = []
+    in_template = False
+    for line in text.splitlines():
+        if in_template:
+            lines.append(line)
+        else:
+            stripped = line.strip()
+            if stripped and not stripped.startswith("//"):
+                lines.append(stripped)
+        if line.count("`") % 2:
+            in_template = not in_template
+    return "\n".join(lines) + "\n"
+
+
+MINIFIERS = {".css": minify_css, ".js": minify_js}
+
+
+class Assets:
+    """Манифест бандлов: исходное имя ("css/home.css") -> URL с хешем"""
+
+    def __init__(self, src_dir: str, dist_dir: str, minify: bool = MINIFY):
+        self.src_dir = src_dir
+        self.dist_dir = dist_dir
+        self.minify = minify
+        self.manifest: Dict[str, str] = {}
+        self.sizes: Dict[str, Dict[str, int]] = {}
+        self.built_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def _sources(self):
+        for root, _, files in os.walk(self.src_dir):
+            for filename in sorted(files):
+                if os.path.splitext(filename)[1] in MINIFIERS:
+                    path = os.path.join(root, filename)
+                    yield os.path.relpath(path, self.src_dir).replace(os.sep, "/"), path
+
+    def _write(self, name: str, content: bytes) -> str:
+        """Записать бандл (атомарно - воркеры собирают одновременно)"""
+        stem, ext = os.path.splitext(name)
+        digest = hashlib.sha256(content).hexdigest()[:12]
+        dist_name = f"{stem}.{digest}{ext}"
+        path = os.path.join(self.dist_dir, dist_name)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(content)
+            os.replace(tmp_path, path)
+        return dist_name
+
+    def build(self) -> bool:
+        """Собрать все бандлы и манифест; неизмененные файлы не переписываются"""
+        manifest, sizes = {}, {}
+        for name, path in self._sources():
+            with open(path, encoding="utf-8") as f:
+                source = f.read()
+            text = MINIFIERS[os.path.splitext(name)[1]](source) if self.minify else source
+            content = text.encode("utf-8")
+            manifest[name] = self._write(name, content)
+            sizes[name] = {"source": len(source.encode("utf-8")), "bundle": len(content)}
+
+        with self._lock:
+            self.manifest, self.sizes = manifest, sizes
+            self.built_at = time.time()
+
+        self._write_manifest(manifest)
+        self._prune(set(manifest.values()))
+        logger.info(
+            "Бандлы собраны",
+            extra={
+                "bundles": len(manifest),
+                "source_bytes": sum(s["source"] for s in sizes.values()),
+                "bundle_bytes": sum(s["bundle"] for s in sizes.values()),
+            },
+        )
+        return bool(manifest)
+
+    def _write_manifest(self, manifest: Dict[str, str]):
+        os.makedirs(self.dist_dir, exist_ok=True)
+        path = os.path.join(self.dist_dir, "manifest.json")
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, path)
+
+    def _prune(self, current: set):
+        """Удалить старые версии бандлов, которые давно не нужны"""
+        cutoff = time.time() - KEEP_OLD_SECONDS
+        for root, _, files in os.walk(self.dist_dir):
+            for filename in files:
+                path = os.path.join(root, filename)
+                name = os.path.relpath(path, self.dist_dir).replace(os.sep, "/")
+                if name == "manifest.json" or name in current:
+                    continue
+                try:
+                    if os.path.getmtime(path) < cutoff:
+                        os.remove(path)
+                except OSError:
+                    pass
+
+    def url(self, name: str) -> str:
+        """URL бандла для шаблона: /static/dist/css/home.<хеш>.css"""
+        dist_name = self.manifest.get(name)
+        if dist_name is None and self.built_at is None:
+            # Шаблон отрисован до прогрева (скрипты, тесты) - собираем сейчас
+            self.build()
+            dist_name = self.manifest.get(name)
+        if dist_name is None:
+            logger.warning("Нет бандла '%s', отдается исходник", name)
+            return f"/static/src/{name}"
+        return URL_PREFIX + dist_name
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "bundles": len(self.manifest),
+                "minified": self.minify,
+                "source_bytes": sum(s["source"] for s in self.sizes.values()),
+                "bundle_bytes": sum(s["bundle"] for s in self.sizes.values()),
+            }
+
+
+assets = Assets(SRC_DIR, DIST_DIR)
+asset_url = assets.url
+
+
+class AssetStaticFiles(StaticFiles):
+    """StaticFiles, который отдает бандлы с долгим кешированием.
+
+    Имя бандла меняется вместе с содержимым, поэтому браузеру можно не
+    перепроверять его вовсе. Остальная статика отдается как раньше.
+    """
+
+    def file_response(self, full_path, stat_result, scope, status_code=200):
+        response = super().file_response(full_path, stat_result, scope, status_code)
+        if os.path.abspath(full_path).startswith(DIST_DIR + os.sep):
+            response.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL
+        return response
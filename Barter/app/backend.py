@@ -0,0 +1,326 @@
+# backend.py
+# Общий бэкенд кеша и pub/sub для нескольких воркеров/хостов.
+# MemoryBackend - в пределах одного процесса, RedisBackend - любой сервер,
+# говорящий на протоколе Redis (RESP): redis-server, KeyDB, локальная заглушка.
+import os
+import socket
+import threading
+import time
+import uuid
+from typing import Callable, Dict, List, Optional
+from urllib.parse import urlparse
+
+from logs import get_logger
+
+logger = get_logger("backend")
+
+# Адрес общего бэкенда, например redis://:password@localhost:6379/0
+CACHE_URL = os.environ.get("BARTER_CACHE_URL", "")
+
+# Уникальный идентификатор процесса: свои сообщения pub/sub можно отличить от чужих
+WORKER_ID = uuid.uuid4().hex[:12]
+
+
+class BackendError(Exception):
+    """Ошибка общения с бэкендом"""
+
+
+class ReplyError(BackendError):
+    """Сервер вернул ошибку (-ERR); соединение при этом остается рабочим"""
+
+
+class MemoryBackend:
+    """Бэкенд в памяти процесса (по умолчанию, один воркер)"""
+
+    shared = False
+
+    def __init__(self):
+        self._data: Dict[str, tuple] = {}
+        self._sets: Dict[str, set] = {}
+        self._subscribers: Dict[str, List[Callable[[bytes], None]]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at and expires_at <= time.monotonic():
+                del self._data[key]
+                return None
+            return value
+
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None):
+        with self._lock:
+            expires_at = time.monotonic() + ttl if ttl else None
+            self._data[key] = (value, expires_at)
+
+    def delete(self, *keys: str) -> int:
+        deleted = 0
+        with self._lock:
+            for key in keys:
+                if self._data.pop(key, None) is not None or self._sets.pop(key, None) is not None:
+                    deleted += 1
+        return deleted
+
+    def incr(self, key: str) -> int:
+        with self._lock:
+            value, expires_at = self._data.get(key, (b"0", None))
+            new_value = int(value) + 1
+            self._data[key] = (str(new_value).encode(), expires_at)
+            return new_value
+
+    def sadd(self, key: str, *members: str):
+        with self._lock:
+            self._sets.setdefault(key, set()).update(members)
+
+    def smembers(self, key: str) -> List[str]:
+        with self._lock:
+            return list(self._sets.get(key, ()))
+
+    def expire(self, key: str, ttl: float):
+        # Множества в памяти живут до явного удаления
+        pass
+
+    def publish(self, channel: str, message: bytes):
+        with self._lock:
+            callbacks = list(self._subscribers.get(channel, ()))
+        for callback in callbacks:
+            try:
+                callback(message)
+            except Exception as e:
+                logger.exception("Ошибка обработчика канала %s: %s", channel, e)
+
+    def subscribe(self, channel: str, callback: Callable[[bytes], None]):
+        with self._lock:
+            self._subscribers.setdefault(channel, []).append(callback)
+
+    def ping(self) -> bool:
+        return True
+
+    def close(self):
+        pass
+
+
+class RedisBackend:
+    """Клиент протокола RESP поверх сокетов (без внешних зависимостей).
+
+    На каждый поток - свое командное соединение; подписки обслуживает
+    отдельный фоновый поток со своим соединением и переподключением.
+    """
+
+    shared = True
+
+    def __init__(self, url: str, timeout: float = 1.0):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port or 6379
+        self.password = parsed.password
+        self.db = int(parsed.path.lstrip("/") or 0)
+        self.timeout = timeout
+
+        self._local = threading.local()
+        self._subscribers: Dict[str, List[Callable[[bytes], None]]] = {}
+        self._sub_lock = threading.Lock()
+        self._sub_sock: Optional[socket.socket] = None
+        self._sub_thread: Optional[threading.Thread] = None
+        self._closed = False
+
+    # ================================
+    # Протокол RESP
+    # ================================
+
+    @staticmethod
+    def _encode(*args) -> bytes:
+        parts = [b"*%d\r\n" % len(args)]
+        for arg in args:
+            if isinstance(arg, bytes):
+                data = arg
+            else:
+                data = str(arg).encode()
+            parts.append(b"$%d\r\n%s\r\n" % (len(data), data))
+        return b"".join(parts)
+
+    @staticmethod
+    def _read_reply(reader):
+        line = reader.readline()
+        if not line:
+            raise BackendError("Соединение закрыто сервером")
+        kind, payload = line[:1], line[1:-2]
+
+        if kind == b"+":
+            return payload
+        if kind == b"-":
+            raise ReplyError(payload.decode(errors="replace"))
+        if kind == b":":
+            return int(payload)
+        if kind == b"$":
+            length = int(payload)
+            if length == -1:
+                return None
+            data = reader.read(length + 2)
+            return data[:-2]
+        if kind == b"*":
+            length = int(payload)
+            if length == -1:
+                return None
+            return [RedisBackend._read_reply(reader) for _ in range(length)]
+        raise BackendError(f"Неизвестный ответ сервера: {line!r}")
+
+    def _connect(self, timeout: Optional[float]):
+        sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        sock.settimeout(timeout)
+        reader = sock.makefile("rb")
+        if self.password:
+            sock.sendall(self._encode("AUTH", self.password))
+            self._read_reply(reader)
+        if self.db:
+            sock.sendall(self._encode("SELECT", self.db))
+            self._read_reply(reader)
+        return sock, reader
+
+    def _command(self, *args):
+        """Выполнить команду; при обрыве соединения - одна повторная попытка"""
+        for attempt in range(2):
+            conn = getattr(self._local, "conn", None)
+            try:
+                if conn is None:
+                    conn = self._connect(self.timeout)
+                    self._local.conn = conn
+                sock, reader = conn
+                sock.sendall(self._encode(*args))
+                return self._read_reply(reader)
+            except ReplyError:
+                raise
+            except (OSError, BackendError) as e:
+                self._local.conn = None
+                if conn is not None:
+                    try:
+                        conn[0].close()
+                    except OSError:
+                        pass
+                if attempt:
+                    raise BackendError(str(e)) from e
+
+    # ================================
+    # Команды
+    # ================================
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self._command("GET", key)
+
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None):
+        if ttl:
+            self._command("SET", key, value, "PX", int(ttl * 1000))
+        else:
+            self._command("SET", key, value)
+
+    def delete(self, *keys: str) -> int:
+        if not keys:
+            return 0
+        return self._command("DEL", *keys)
+
+    def incr(self, key: str) -> int:
+        return self._command("INCR", key)
+
+    def sadd(self, key: str, *members: str):
+        if members:
+            self._command("SADD", key, *members)
+
+    def smembers(self, key: str) -> List[str]:
+        return [member.decode() for member in self._command("SMEMBERS", key) or []]
+
+    def expire(self, key: str, ttl: float):
+        self._command("PEXPIRE", key, int(ttl * 1000))
+
+    def publish(self, channel: str, message: bytes):
+        self._command("PUBLISH", channel, message)
+
+    def ping(self) -> bool:
+        try:
+            return self._command("PING") == b"PONG"
+        except BackendError:
+            return False
+
+    # ================================
+    # Подписки
+    # ================================
+
+    def subscribe(self, channel: str, callback: Callable[[bytes], None]):
+        with self._sub_lock:
+            is_new = channel not in self._subscribers
+            self._subscribers.setdefault(channel, []).append(callback)
+
+            if self._sub_thread is None:
+                self._sub_thread = threading.Thread(
+                    target=self._listen, name="barter-pubsub", daemon=True
+                )
+                self._sub_thread.start()
+            elif is_new and self._sub_sock is not None:
+                try:
+                    self._sub_sock.sendall(self._encode("SUBSCRIBE", channel))
+                except OSError:
+                    # Поток прослушивания переподключится и подпишется заново
+                    pass
+
+    def _listen(self):
+        """Фоновый поток: читает сообщения и раздает их обработчикам"""
+        delay = 0.5
+        while not self._closed:
+            try:
+                sock, reader = self._connect(None)
+                with self._sub_lock:
+                    self._sub_sock = sock
+                    channels = list(self._subscribers)
+                if channels:
+                    sock.sendall(self._encode("SUBSCRIBE", *channels))
+                delay = 0.5
+
+                while not self._closed:
+                    reply = self._read_reply(reader)
+                    if isinstance(reply, list) and len(reply) == 3 and reply[0] == b"message":
+                        self._dispatch(reply[1].decode(), reply[2])
+            except (OSError, BackendError) as e:
+                if self._closed:
+                    break
+                logger.warning("Pub/sub: соединение потеряно (%s), переподключение через %s с", e, delay)
+                time.sleep(delay)
+                delay = min(delay * 2, 10)
+            finally:
+                with self._sub_lock:
+                    self._sub_sock = None
+
+    def _dispatch(self, channel: str, message: bytes):
+        with self._sub_lock:
+            callbacks = list(self._subscribers.get(channel, ()))
+        for callback in callbacks:
+            try:
+                callback(message)
+            except Exception as e:
+                logger.exception("Ошибка обработчика канала %s: %s", channel, e)
+
+    def close(self):
+        self._closed = True
+        with self._sub_lock:
+            if self._sub_sock is not None:
+                try:
+                    self._sub_sock.close()
+                except OSError:
+                    pass
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn[0].close()
+            self._local.conn = None
+
+
+def create_backend(url: str = CACHE_URL):
+    """Создать бэкенд по URL (пустой URL - память процесса)"""
+    if not url or url.startswith("memory://"):
+        return MemoryBackend()
+    if url.startswith("redis://"):
+        return RedisBackend(url)
+    raise ValueError(f"Неизвестный бэкенд кеша: {url}")
+
+
+backend = create_backend()
@@ -0,0 +1,780 @@
+# benchmark.py
+# Нагрузочный тест: воспроизводимые синтетические данные + виртуальные пользователи.
+#
+#   python benchmark.py seed --users 2000 --offers 20000 --messages 100000
+#   python benchmark.py run --vus 50 --duration 60 --save-baseline main
+#   python benchmark.py run --vus 50 --duration 60 --compare main
+#   python benchmark.py run --url http://127.0.0.1:8000 ...   # живой сервер
+#   python benchmark.py reset
+#   python benchmark.py similarity --offers 100000   # индекс похожих, без БД
+import argparse
+import asyncio
+import bisect
+import itertools
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlencode, urlparse
+
+import bcrypt
+
+from database import db, query_log
+from services import MessageArchiveService, UnreadCountService
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+BASELINE_DIR = os.path.join(BASE_DIR, "benchmarks")
+
+# Все синтетические пользователи имеют этот префикс - так их легко удалить
+USER_PREFIX = "bench_"
+PASSWORD = "bench-password"
+
+CATEGORIES = {
+    "books": ["книга", "учебник", "комикс", "энциклопедия", "словарь"],
+    "electronics": ["телефон", "наушники", "ноутбук", "планшет", "колонка", "фотоаппарат"],
+    "clothes": ["куртка", "кроссовки", "платье", "джинсы", "шапка"],
+    "furniture": ["стул", "стол", "шкаф", "полка", "кресло"],
+    "sports": ["велосипед", "гантели", "ролики", "лыжи", "мяч", "палатка"],
+    "hobby": ["гитара", "пазл", "настольная игра", "мольберт", "конструктор"],
+    "services": ["репетиторство", "ремонт", "фотосессия", "перевод", "уборка"],
+    "other": ["растение", "посуда", "лампа", "часы", "рюкзак"],
+}
+CITIES = ["moscow", "spb", "ekb", "nnov", "kazan", "novosibirsk", "krasnodar", "other"]
+# Доля пользователей по городам: столицы заметно крупнее
+CITY_WEIGHTS = [35, 20, 9, 7, 7, 6, 6, 10]
+ADJECTIVES = ["новый", "б/у", "почти новый", "винтажный", "детский", "большой", "компактный"]
+NAMES = ["Анна", "Иван", "Мария", "Дмитрий", "Ольга", "Сергей", "Елена", "Алексей", "Наталья", "Павел"]
+PHRASES = [
+    "Здравствуйте! Еще актуально?", "Могу предложить обмен", "Когда удобно встретиться?",
+    "Пришлите, пожалуйста, фото", "Договорились", "А что по состоянию?", "Спасибо!",
+    "Могу подъехать вечером", "Есть еще варианты?", "Давайте на выходных",
+]
+
+
+# ================================
+# Генерация данных
+# ================================
+
+class Zipf:
+    """Выбор индекса 0..n-1 с вероятностью ~ 1/(i+1)^s (реалистичный перекос)"""
+
+    def __init__(self, n: int, s: float, rng: random.Random):
+        self.rng = rng
+        self.cumulative = list(itertools.accumulate(1.0 / (i + 1) ** s for i in range(n)))
+
+    def sample(self) -> int:
+        return bisect.bisect_left(self.cumulative, self.rng.random() * self.cumulative[-1])
+
+
+def random_offer(rng: random.Random):
+    """Категория, "отдам" и "хочу" синтетического объявления"""
+    give_category = rng.choice(list(CATEGORIES))
+    get_category = rng.choice(list(CATEGORIES))
+    give = f"{rng.choice(ADJECTIVES)} {rng.choice(CATEGORIES[give_category])}"
+    return give_category, give, rng.choice(CATEGORIES[get_category])
+
+
+def _insert_batches(cursor, query: str, rows: List[tuple], batch_size: int = 1000):
+    for i in range(0, len(rows), batch_size):
+        cursor.executemany(query, rows[i:i + batch_size])
+
+
+def bench_user_ids() -> List[int]:
+    rows = db.execute_query(
+        "SELECT id FROM users WHERE username LIKE %s ORDER BY id",
+        (USER_PREFIX.replace("_", "\\_") + "%",),
+        fetch=True,
+    ) or []
+    return [row["id"] for row in rows]
+
+
+def reset():
+    """Удалить все синтетические данные"""
+    user_ids = bench_user_ids()
+    if not user_ids:
+        print("Синтетических данных нет")
+        return
+
+    # Таблица счетчиков и архив создаются при старте приложения - их может еще не быть
+    UnreadCountService.ensure_table()
+    MessageArchiveService.ensure_table()
+
+    connection = db.get_connection()
+    cursor = connection.cursor()
+    for i in range(0, len(user_ids), 1000):
+        chunk = user_ids[i:i + 1000]
+        marks = ",".join(["%s"] * len(chunk))
+        cursor.execute(f"DELETE FROM messages WHERE sender_id IN ({marks}) OR recipient_id IN ({marks})", chunk * 2)
+        cursor.execute(
+            f"DELETE FROM messages_archive WHERE sender_id IN ({marks}) OR recipient_id IN ({marks})", chunk * 2
+        )
+        cursor.execute(f"DELETE FROM ratings WHERE rater_user_id IN ({marks}) OR target_user_id IN ({marks})", chunk * 2)
+        cursor.execute(f"DELETE FROM offers WHERE user_id IN ({marks})", chunk)
+        cursor.execute(f"DELETE FROM user_unread_counts WHERE user_id IN ({marks})", chunk)
+        cursor.execute(f"DELETE FROM users WHERE id IN ({marks})", chunk)
+    connection.commit()
+    cursor.close()
+    connection.close()
+    print(f"Удалено синтетических пользователей: {len(user_ids)}")
+
+
+def seed(users: int, offers: int, ratings: int, messages: int, seed_value: int):
+    """Заполнить БД воспроизводимым синтетическим маркетплейсом"""
+    rng = random.Random(seed_value)
+    now = datetime.now().replace(microsecond=0)
+    started = time.perf_counter()
+
+    if bench_user_ids():
+        print("Синтетические данные уже есть - сначала выполните reset")
+        return
+
+    # Один хеш на всех: bcrypt намеренно медленный
+    password_hash = bcrypt.hashpw(PASSWORD.encode(), bcrypt.gensalt()).decode()
+
+    connection = db.get_connection()
+    cursor = connection.cursor()
+
+    user_cities = rng.choices(CITIES, weights=CITY_WEIGHTS, k=users)
+    user_rows = [
+        (
+            f"{USER_PREFIX}{i:06d}", password_hash, f"{USER_PREFIX}{i:06d}@example.com",
+            now - timedelta(days=rng.randint(0, 720)),
+            f"{rng.choice(NAMES)} {USER_PREFIX}{i}",
+        )
+        for i in range(users)
+    ]
+    _insert_batches(
+        cursor,
+        """INSERT INTO users (username, password_hash, email, registration_date, full_name)
+           VALUES (%s, %s, %s, %s, %s)""",
+        user_rows,
+    )
+    connection.commit()
+    user_ids = bench_user_ids()
+    print(f"Пользователи: {len(user_ids)}")
+
+    # Немногие активные продавцы публикуют большую часть объявлений
+    sellers = Zipf(len(user_ids), 1.1, rng)
+    offer_rows = []
+    for _ in range(offers):
+        owner = sellers.sample()
+        give_category, give, get = random_offer(rng)
+        offer_rows.append((
+            user_ids[owner],
+            give,
+            get,
+            f"+7 900 {rng.randint(1000000, 9999999)}",
+            give_category,
+            user_cities[owner],
+            None,
+            None,
+            now - timedelta(minutes=rng.randint(0, 180 * 24 * 60)),
+            rng.random() < 0.9,
+        ))
+    _insert_batches(
+        cursor,
+        """INSERT INTO offers (user_id, give, `get`, contact, category, city, district,
+                               image_url, created_at, is_active)
+           VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)""",
+        offer_rows,
+    )
+    connection.commit()
+    print(f"Объявления: {len(offer_rows)}")
+
+    # Оценки: популярных продавцов оценивают чаще, в основном на 4-5
+    targets = Zipf(len(user_ids), 1.0, rng)
+    rating_pairs = set()
+    rating_rows = []
+    attempts = 0
+    while len(rating_rows) < ratings and attempts < ratings * 5:
+        attempts += 1
+        rater = rng.randrange(len(user_ids))
+        target = targets.sample()
+        if rater == target or (rater, target) in rating_pairs:
+            continue
+        rating_pairs.add((rater, target))
+        rating_rows.append((
+            user_ids[rater], user_ids[target],
+            rng.choices([5, 4, 3, 2, 1], weights=[50, 30, 10, 5, 5])[0],
+            None,
+            now - timedelta(minutes=rng.randint(0, 180 * 24 * 60)),
+        ))
+    _insert_batches(
+        cursor,
+        """INSERT INTO ratings (rater_user_id, target_user_id, rating, comment, created_at)
+           VALUES (%s, %s, %s, %s, %s)""",
+        rating_rows,
+    )
+    connection.commit()
+    print(f"Оценки: {len(rating_rows)}")
+
+    # Сообщения: диалоги разной длины, чаще всего пишут популярным продавцам
+    message_rows = []
+    while len(message_rows) < messages:
+        a = rng.randrange(len(user_ids))
+        b = targets.sample()
+        if a == b:
+            continue
+        length = min(int(rng.expovariate(1 / 12)) + 1, messages - len(message_rows))
+        moment = now - timedelta(minutes=rng.randint(60, 90 * 24 * 60))
+        for j in range(length):
+            sender, recipient = (a, b) if j % 2 == 0 else (b, a)
+            moment += timedelta(seconds=rng.randint(10, 6 * 3600))
+            # Последние сообщения диалога иногда еще не прочитаны
+            is_read = j < length - 2 or rng.random() < 0.5
+            message_rows.append((
+                user_ids[sender], user_ids[recipient], None,
+                rng.choice(PHRASES), is_read, min(moment, now),
+            ))
+    _insert_batches(
+        cursor,
+        """INSERT INTO messages (sender_id, recipient_id, offer_id, message, is_read, created_at)
+           VALUES (%s, %s, %s, %s, %s, %s)""",
+        message_rows,
+    )
+    connection.commit()
+    cursor.close()
+    connection.close()
+    print(f"Сообщения: {len(message_rows)}")
+    print(f"Готово за {time.perf_counter() - started:.1f} с (seed={seed_value})")
+
+
+# ================================
+# HTTP-клиенты
+# ================================
+
+class Response:
+    __slots__ = ("status", "headers", "body", "queries")
+
+    def __init__(self, status: int, headers: Dict[str, str], body: bytes, queries: Optional[int]):
+        self.status = status
+        self.headers = headers
+        self.body = body
+        self.queries = queries
+
+
+class ASGIClient:
+    """Запросы напрямую в приложение (без сети); считает SQL-запросы"""
+
+    # Каждый клиент - отдельный адрес, чтобы лимиты частоты считались как у разных людей
+    _next_address = 0
+
+    def __init__(self, app):
+        self.app = app
+        ASGIClient._next_address += 1
+        number = ASGIClient._next_address
+        self.address = f"10.{number >> 16 & 255}.{number >> 8 & 255}.{number & 255}"
+
+    async def request(self, method: str, path: str, headers: Dict[str, str], body: bytes = b"") -> Response:
+        path_only, _, query_string = path.partition("?")
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": method,
+            "scheme": "http",
+            "path": path_only,
+            "raw_path": path_only.encode(),
+            "query_string": query_string.encode(),
+            "root_path": "",
+            "headers": [(k.lower().encode(), v.encode()) for k, v in headers.items()],
+            "client": (self.address, 50000),
+            "server": ("benchmark", 80),
+        }
+        sent = False
+
+        async def receive():
+            nonlocal sent
+            if not sent:
+                sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            await asyncio.Event().wait()
+
+        status = 500
+        response_headers: Dict[str, str] = {}
+        chunks = []
+
+        async def send(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                for key, value in message.get("headers", []):
+                    response_headers[key.decode().lower()] = value.decode()
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+
+        log = []
+        token = query_log.set(log)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            query_log.reset(token)
+        return Response(status, response_headers, b"".join(chunks), len(log))
+
+    async def close(self):
+        pass
+
+
+class HTTPClient:
+    """Минимальный HTTP/1.1-клиент с keep-alive для живого сервера"""
+
+    def __init__(self, url: str):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "127.0.0.1"
+        self.port = parsed.port or 80
+        self.reader = None
+        self.writer = None
+
+    async def _connect(self):
+        self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+
+    async def request(self, method: str, path: str, headers: Dict[str, str], body: bytes = b"") -> Response:
+        for attempt in range(2):
+            try:
+                if self.writer is None:
+                    await self._connect()
+                return await self._request(method, path, headers, body)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                await self.close()
+                if attempt:
+                    raise
+
+    async def _request(self, method, path, headers, body) -> Response:
+        lines = [f"{method} {path} HTTP/1.1", f"Host: {self.host}:{self.port}", f"Content-Length: {len(body)}"]
+        lines += [f"{key}: {value}" for key, value in headers.items()]
+        self.writer.write(("\r\n".join(lines) + "\r\n\r\n").encode() + body)
+        await self.writer.drain()
+
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionError("Сервер закрыл соединение")
+        status = int(status_line.split()[1])
+        response_headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b"\r\n", b""):
+                break
+            key, _, value = line.decode("latin-1").partition(":")
+            response_headers[key.strip().lower()] = value.strip()
+
+        if response_headers.get("transfer-encoding") == "chunked":
+            chunks = []
+            while True:
+                size = int((await self.reader.readline()).strip(), 16)
+                if size == 0:
+                    await self.reader.readline()
+                    break
+                chunks.append(await self.reader.readexactly(size))
+                await self.reader.readexactly(2)
+            data = b"".join(chunks)
+        else:
+            data = await self.reader.readexactly(int(response_headers.get("content-length", 0)))
+
+        if response_headers.get("connection") == "close":
+            await self.close()
+        return Response(status, response_headers, data, None)
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+            self.reader = None
+
+
+# ================================
+# Виртуальные пользователи
+# ================================
+
+class Recorder:
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = {}
+        self.queries: Dict[str, List[int]] = {}
+        self.errors: Dict[str, int] = {}
+
+    def add(self, label: str, seconds: float, response: Optional[Response]):
+        self.samples.setdefault(label, []).append(seconds)
+        if response is None or response.status >= 500:
+            self.errors[label] = self.errors.get(label, 0) + 1
+        if response is not None and response.queries is not None:
+            self.queries.setdefault(label, []).append(response.queries)
+
+
+class VirtualUser:
+    """Повторяет реальные сценарии: просмотр, поиск, карточка, чат"""
+
+    def __init__(self, client, recorder: Recorder, rng: random.Random, data: Dict[str, Any], think: float):
+        self.client = client
+        self.recorder = recorder
+        self.rng = rng
+        self.data = data
+        self.think = think
+        self.cookie = None
+        self.user_id = None
+
+    async def call(self, label: str, method: str, path: str, form: Optional[Dict[str, str]] = None) -> Optional[Response]:
+        headers = {}
+        body = b""
+        if self.cookie:
+            headers["Cookie"] = f"session={self.cookie}"
+        if form is not None:
+            body = urlencode(form).encode()
+            headers["Content-Type"] = "application/x-www-form-urlencoded"
+
+        start = time.perf_counter()
+        response = None
+        try:
+            response = await self.client.request(method, path, headers, body)
+        except Exception as e:
+            print(f"{label}: {e}", file=sys.stderr)
+        self.recorder.add(label, time.perf_counter() - start, response)
+        return response
+
+    async def pause(self):
+        if self.think:
+            await asyncio.sleep(self.rng.expovariate(1 / self.think))
+
+    async def login(self):
+        self.user_id, username = self.rng.choice(self.data["users"])
+        response = await self.call("POST /login", "POST", "/login", {"username": username, "password": PASSWORD})
+        cookie = response.headers.get("set-cookie", "") if response else ""
+        if cookie.startswith("session="):
+            self.cookie = cookie.split(";", 1)[0].split("=", 1)[1].strip('"')
+
+    async def browse(self):
+        await self.call("GET /", "GET", "/")
+        await self.pause()
+        await self.call("GET /offer", "GET", "/offer")
+
+    async def search(self):
+        params = {"search": self.rng.choice(self.data["words"])}
+        if self.rng.random() < 0.5:
+            params["category"] = self.rng.choice(list(CATEGORIES))
+        if self.rng.random() < 0.5:
+            params["city"] = self.rng.choice(CITIES)
+        await self.call("GET /offer?filters", "GET", "/offer?" + urlencode(params))
+
+    async def open_offer(self):
+        offer_id, author_id = self.rng.choice(self.data["offers"])
+        await self.call("GET /offer/{id}", "GET", f"/offer/{offer_id}")
+        await self.pause()
+        await self.call("GET /user/{id}", "GET", f"/user/{author_id}")
+
+    async def chat(self):
+        partners = self.data["dialogs"].get(self.user_id)
+        await self.call("GET /messages", "GET", "/messages")
+        if not partners:
+            return
+        other = self.rng.choice(partners)
+        await self.call("GET /messages/{id}", "GET", f"/messages/{other}")
+        # Открытая вкладка чата опрашивает сервер несколько раз
+        for _ in range(self.rng.randint(2, 6)):
+            await self.pause()
+            await self.call("GET /messages/{id}/new", "GET", f"/messages/{other}/new?last_message_id=0")
+            await self.call("GET /api/unread_count", "GET", "/api/unread_count")
+
+    async def run(self, deadline: float):
+        flows = [self.browse, self.search, self.open_offer, self.chat]
+        weights = [30, 25, 30, 15]
+        if self.rng.random() < 0.5:
+            await self.login()
+        while time.perf_counter() < deadline:
+            flow = self.rng.choices(flows, weights=weights)[0]
+            if flow == self.chat and not self.cookie:
+                flow = self.open_offer
+            await flow()
+            await self.pause()
+
+
+def load_targets(rng: random.Random, sample: int = 5000) -> Dict[str, Any]:
+    """Идентификаторы синтетических данных, по которым ходят виртуальные пользователи"""
+    like = USER_PREFIX.replace("_", "\\_") + "%"
+    users = db.execute_query(
+        "SELECT id, username FROM users WHERE username LIKE %s", (like,), fetch=True
+    ) or []
+    offers = db.execute_query(
+        """SELECT o.id, o.user_id FROM offers o JOIN users u ON o.user_id = u.id
+           WHERE u.username LIKE %s AND o.is_active = TRUE""",
+        (like,),
+        fetch=True,
+    ) or []
+    pairs = db.execute_query(
+        """SELECT DISTINCT m.sender_id, m.recipient_id FROM messages m
+           JOIN users u ON m.sender_id = u.id WHERE u.username LIKE %s""",
+        (like,),
+        fetch=True,
+    ) or []
+    if not users or not offers:
+        raise SystemExit("Нет синтетических данных - выполните: python benchmark.py seed")
+
+    dialogs: Dict[int, List[int]] = {}
+    for pair in pairs:
+        dialogs.setdefault(pair["sender_id"], []).append(pair["recipient_id"])
+        dialogs.setdefault(pair["recipient_id"], []).append(pair["sender_id"])
+
+    user_rows = [(row["id"], row["username"]) for row in users]
+    offer_rows = [(row["id"], row["user_id"]) for row in offers]
+    return {
+        "users": rng.sample(user_rows, min(sample, len(user_rows))),
+        "offers": rng.sample(offer_rows, min(sample, len(offer_rows))),
+        "dialogs": dialogs,
+        "words": [word for words in CATEGORIES.values() for word in words],
+    }
+
+
+# ================================
+# Отчет
+# ================================
+
+def percentile(sorted_values: List[float], p: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, int(round(p / 100 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def summarize(recorder: Recorder, elapsed: float, meta: Dict[str, Any]) -> Dict[str, Any]:
+    endpoints = {}
+    all_samples = []
+    all_queries = []
+    for label, samples in sorted(recorder.samples.items()):
+        ordered = sorted(samples)
+        all_samples.extend(samples)
+        queries = recorder.queries.get(label, [])
+        all_queries.extend(queries)
+        endpoints[label] = {
+            "requests": len(samples),
+            "errors": recorder.errors.get(label, 0),
+            "rps": round(len(samples) / elapsed, 2),
+            "p50_ms": round(percentile(ordered, 50) * 1000, 2),
+            "p95_ms": round(percentile(ordered, 95) * 1000, 2),
+            "p99_ms": round(percentile(ordered, 99) * 1000, 2),
+            "queries_per_request": round(sum(queries) / len(queries), 2) if queries else None,
+        }
+    ordered = sorted(all_samples)
+    return {
+        "meta": meta,
+        "total": {
+            "requests": len(all_samples),
+            "errors": sum(recorder.errors.values()),
+            "rps": round(len(all_samples) / elapsed, 2),
+            "p50_ms": round(percentile(ordered, 50) * 1000, 2),
+            "p95_ms": round(percentile(ordered, 95) * 1000, 2),
+            "p99_ms": round(percentile(ordered, 99) * 1000, 2),
+            "queries_per_request": round(sum(all_queries) / len(all_queries), 2) if all_queries else None,
+        },
+        "endpoints": endpoints,
+    }
+
+
+def print_report(result: Dict[str, Any]):
+    header = f"{'endpoint':<26}{'req':>8}{'err':>6}{'rps':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'q/req':>8}"
+    print(header)
+    print("-" * len(header))
+    rows = list(result["endpoints"].items()) + [("TOTAL", result["total"])]
+    for label, stats in rows:
+        queries = stats["queries_per_request"]
+        print(
+            f"{label:<26}{stats['requests']:>8}{stats['errors']:>6}{stats['rps']:>9}"
+            f"{stats['p50_ms']:>9}{stats['p95_ms']:>9}{stats['p99_ms']:>9}"
+            f"{queries if queries is not None else '-':>8}"
+        )
+
+
+def baseline_path(name: str) -> str:
+    return os.path.join(BASELINE_DIR, f"{name}.json")
+
+
+def compare(result: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> bool:
+    """Сравнить с базовым прогоном; True - если есть регрессия больше threshold %"""
+    regressed = False
+    print(f"\nСравнение с базовым прогоном {baseline['meta'].get('started_at')} (порог {threshold}%)")
+    current = dict(result["endpoints"], TOTAL=result["total"])
+    previous = dict(baseline["endpoints"], TOTAL=baseline["total"])
+    for label, stats in current.items():
+        base = previous.get(label)
+        if not base:
+            continue
+        notes = []
+        for key, worse_if_higher in (("p95_ms", True), ("rps", False), ("queries_per_request", True)):
+            old, new = base.get(key), stats.get(key)
+            if not old or new is None:
+                continue
+            change = (new - old) / old * 100
+            is_worse = change > threshold if worse_if_higher else change < -threshold
+            # Пропускная способность отдельных эндпоинтов зависит от сценария - судим по TOTAL
+            if key == "rps" and label != "TOTAL":
+                is_worse = False
+            regressed |= is_worse
+            notes.append(f"{key} {old} -> {new} ({change:+.1f}%){' РЕГРЕССИЯ' if is_worse else ''}")
+        print(f"{label:<26}" + "; ".join(notes))
+    return regressed
+
+
+async def run_load(args) -> Dict[str, Any]:
+    rng = random.Random(args.seed)
+    data = load_targets(rng)
+
+    if args.url:
+        make_client = lambda: HTTPClient(args.url)
+        lifespan = None
+    else:
+        from routes import create_app
+        app = create_app()
+        make_client = lambda: ASGIClient(app)
+        lifespan = app.router.lifespan_context(app)
+
+    if lifespan is not None:
+        await lifespan.__aenter__()
+    try:
+        # Прогрев: один проход каждого сценария, в статистику не попадает
+        warm = VirtualUser(make_client(), Recorder(), random.Random(args.seed), data, 0)
+        await warm.login()
+        for flow in (warm.browse, warm.search, warm.open_offer, warm.chat):
+            await flow()
+        await warm.client.close()
+
+        recorder = Recorder()
+        clients = [make_client() for _ in range(args.vus)]
+        users = [
+            VirtualUser(client, recorder, random.Random(args.seed * 1000 + i), data, args.think)
+            for i, client in enumerate(clients)
+        ]
+        started_at = datetime.now().isoformat(timespec="seconds")
+        start = time.perf_counter()
+        deadline = start + args.duration
+        await asyncio.gather(*(user.run(deadline) for user in users))
+        elapsed = time.perf_counter() - start
+        for client in clients:
+            await client.close()
+    finally:
+        if lifespan is not None:
+            await lifespan.__aexit__(None, None, None)
+
+    meta = {
+        "started_at": started_at,
+        "target": args.url or "asgi",
+        "vus": args.vus,
+        "duration": args.duration,
+        "think": args.think,
+        "seed": args.seed,
+        "elapsed": round(elapsed, 2),
+    }
+    return summarize(recorder, elapsed, meta)
+
+
+# ================================
+# Индекс похожих объявлений
+# ================================
+
+def similarity_benchmark(offers: int, users: int, queries: int, seed_value: int) -> Dict[str, Any]:
+    """Построение индекса на синтетических объявлениях и задержка выдачи
+    страницы объявления (оба вида top-k одним вызовом); БД не нужна"""
+    from similarity import SimilarityIndex
+    from routes import SIMILAR_OFFERS_LIMIT
+
+    rng = random.Random(seed_value)
+    sellers = Zipf(users, 1.1, rng)
+    rows = []
+    for offer_id in range(1, offers + 1):
+        category, give, get = random_offer(rng)
+        rows.append({
+            "id": offer_id, "user_id": sellers.sample() + 1, "give": give, "get": get,
+            "category": category, "city": rng.choice(CITIES), "image_url": None,
+        })
+
+    index = SimilarityIndex()
+    index.load(rows)
+
+    # Прогрев (первые умножения выделяют память), в статистику не попадает
+    for _ in range(10):
+        index.top_k_kinds([rng.randint(1, offers)], SIMILAR_OFFERS_LIMIT)
+
+    samples = []
+    for _ in range(queries):
+        offer_id = rng.randint(1, offers)
+        start = time.perf_counter()
+        index.top_k_kinds([offer_id], SIMILAR_OFFERS_LIMIT)
+        samples.append(time.perf_counter() - start)
+    samples.sort()
+    return {
+        "offers": offers,
+        "queries": queries,
+        "build_seconds": index.build_seconds,
+        "p50_ms": round(percentile(samples, 50) * 1000, 2),
+        "p95_ms": round(percentile(samples, 95) * 1000, 2),
+        "p99_ms": round(percentile(samples, 99) * 1000, 2),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Нагрузочный тест Swap Space")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    seed_parser = sub.add_parser("seed", help="заполнить БД синтетическими данными")
+    seed_parser.add_argument("--users", type=int, default=1000)
+    seed_parser.add_argument("--offers", type=int, default=10000)
+    seed_parser.add_argument("--ratings", type=int, default=20000)
+    seed_parser.add_argument("--messages", type=int, default=50000)
+    seed_parser.add_argument("--seed", type=int, default=42)
+
+    sub.add_parser("reset", help="удалить синтетические данные")
+
+    run_parser = sub.add_parser("run", help="запустить нагрузку")
+    run_parser.add_argument("--url", help="адрес живого сервера (по умолчанию - приложение в процессе)")
+    run_parser.add_argument("--vus", type=int, default=20, help="число виртуальных пользователей")
+    run_parser.add_argument("--duration", type=float, default=30, help="длительность, секунд")
+    run_parser.add_argument("--think", type=float, default=0.2, help="средняя пауза между действиями, секунд")
+    run_parser.add_argument("--seed", type=int, default=42)
+    run_parser.add_argument("--output", help="сохранить результат в JSON-файл")
+    run_parser.add_argument("--save-baseline", metavar="NAME", help="сохранить как базовый прогон")
+    run_parser.add_argument("--compare", metavar="NAME", help="сравнить с базовым прогоном")
+    run_parser.add_argument("--threshold", type=float, default=10.0, help="допустимое ухудшение, %%")
+
+    similarity_parser = sub.add_parser("similarity", help="замерить индекс похожих объявлений")
+    similarity_parser.add_argument("--offers", type=int, default=100000)
+    similarity_parser.add_argument("--users", type=int, default=10000)
+    similarity_parser.add_argument("--queries", type=int, default=500)
+    similarity_parser.add_argument("--seed", type=int, default=42)
+    similarity_parser.add_argument("--budget-ms", type=float, default=10.0,
+                                   help="допустимый p95 одного запроса, мс")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "seed":
+        seed(args.users, args.offers, args.ratings, args.messages, args.seed)
+        return 0
+    if args.command == "reset":
+        reset()
+        return 0
+    if args.command == "similarity":
+        result = similarity_benchmark(args.offers, args.users, args.queries, args.seed)
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+        if result["p95_ms"] > args.budget_ms:
+            print(f"p95 {result['p95_ms']} мс больше бюджета {args.budget_ms} мс")
+            return 1
+        return 0
+
+    result = asyncio.run(run_load(args))
+    print_report(result)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+    if args.save_baseline:
+        os.makedirs(BASELINE_DIR, exist_ok=True)
+        with open(baseline_path(args.save_baseline), "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"\nБазовый прогон сохранен: {baseline_path(args.save_baseline)}")
+    if args.compare:
+        with open(baseline_path(args.compare), encoding="utf-8") as f:
+            baseline = json.load(f)
+        if compare(result, baseline, args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,439 @@
+# cache.py
+# Ограниченный LRU/TTL-кеш в памяти процесса с защитой от "стада" (single-flight)
+import json
+import sys
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Callable, Dict, Hashable, Iterable, Optional, Union
+
+from logs import get_logger
+
+logger = get_logger("cache")
+
+
+def estimate_size(obj, _seen=None) -> int:
+    """Приблизительный размер объекта в байтах (рекурсивно по контейнерам)"""
+    if _seen is None:
+        _seen = set()
+    obj_id = id(obj)
+    if obj_id in _seen:
+        return 0
+    _seen.add(obj_id)
+
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        for key, value in obj.items():
+            size += estimate_size(key, _seen) + estimate_size(value, _seen)
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        for item in obj:
+            size += estimate_size(item, _seen)
+    return size
+
+
+# Маркер отсутствия значения (None тоже может быть закешированным значением)
+_MISSING = object()
+
+
+class _Entry:
+    __slots__ = ("value", "expires_at", "size", "tags")
+
+    def __init__(self, value, expires_at: float, size: int, tags: tuple):
+        self.value = value
+        self.expires_at = expires_at
+        self.size = size
+        self.tags = tags
+
+
+class _Flight:
+    """Загрузка значения, которую ждут конкурирующие потоки"""
+    __slots__ = ("event", "value", "error", "epoch", "stale")
+
+    def __init__(self, epoch: int):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+        self.epoch = epoch
+        self.stale = False
+
+
+class TTLCache:
+    """LRU-кеш с TTL, лимитом по числу записей и по объему памяти.
+
+    Записи можно помечать тегами и инвалидировать все записи тега разом.
+    get_or_load гарантирует, что на один ключ одновременно выполняется
+    только одна загрузка, остальные потоки ждут ее результат.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        max_entries: int = 1024,
+        max_bytes: int = 8 * 1024 * 1024,
+        ttl: float = 60.0
+    ):
+        self.name = name
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+
+        self._data: "OrderedDict[Hashable, _Entry]" = OrderedDict()
+        self._tags: Dict[Hashable, set] = {}
+        self._inflight: Dict[Hashable, _Flight] = {}
+        # Эпоха последней инвалидации тега - нужна, чтобы не сохранить
+        # значение, загруженное до инвалидации его тега
+        self._epoch = 0
+        self._tag_epochs: Dict[Hashable, int] = {}
+        self._lock = threading.RLock()
+        self._bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self.loads = 0
+        self.coalesced = 0
+
+    # ================================
+    # Чтение и запись
+    # ================================
+
+    def get(self, key: Hashable, default=None):
+        """Получить значение из кеша (default, если нет или устарело)"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            if entry.expires_at <= time.monotonic():
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry.value
+
+    def set(self, key: Hashable, value, tags: Iterable[Hashable] = (), ttl: Optional[float] = None):
+        """Положить значение в кеш"""
+        tags = tuple(tags)
+        size = estimate_size(value)
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+
+            expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+            self._data[key] = _Entry(value, expires_at, size, tags)
+            self._bytes += size
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+
+            # Вытесняем самые старые записи, пока не уложимся в лимиты
+            while self._data and (len(self._data) > self.max_entries or self._bytes > self.max_bytes):
+                oldest_key = next(iter(self._data))
+                self._remove(oldest_key)
+                self.evictions += 1
+
+    def get_or_load(
+        self,
+        key: Hashable,
+        loader: Callable[[], Any],
+        tags: Union[Iterable[Hashable], Callable[[Any], Iterable[Hashable]]] = (),
+        ttl: Optional[float] = None,
+        cache_none: bool = False
+    ):
+        """Прочитать значение или загрузить его через loader (single-flight).
+
+        tags может быть функцией от загруженного значения, если теги
+        становятся известны только после загрузки.
+        """
+        value = self.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+
+        with self._lock:
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = _Flight(self._epoch)
+                self._inflight[key] = flight
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            self.loads += 1
+            flight.value = loader()
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+                if flight.error is None and (flight.value is not None or cache_none):
+                    entry_tags = tuple(tags(flight.value) if callable(tags) else tags)
+                    # Если во время загрузки ключ или его тег инвалидировали -
+                    # не сохраняем устаревшее значение
+                    stale = flight.stale or any(
+                        self._tag_epochs.get(tag, -1) >= flight.epoch for tag in entry_tags
+                    )
+                    if not stale:
+                        self.set(key, flight.value, entry_tags, ttl)
+                if not self._inflight:
+                    self._tag_epochs.clear()
+            flight.event.set()
+
+        return flight.value
+
+    # ================================
+    # Инвалидация
+    # ================================
+
+    def delete(self, key: Hashable):
+        """Удалить ключ"""
+        with self._lock:
+            flight = self._inflight.get(key)
+            if flight:
+                flight.stale = True
+            if key in self._data:
+                self._remove(key)
+                self.invalidations += 1
+
+    def invalidate_tag(self, tag: Hashable) -> list:
+        """Удалить все записи, помеченные тегом; вернуть их ключи"""
+        with self._lock:
+            if self._inflight:
+                self._tag_epochs[tag] = self._epoch
+                self._epoch += 1
+            keys = list(self._tags.get(tag, ()))
+            for key in keys:
+                self._remove(key)
+                self.invalidations += 1
+            return keys
+
+    def clear(self):
+        """Очистить кеш полностью"""
+        with self._lock:
+            for flight in self._inflight.values():
+                flight.stale = True
+            self._data.clear()
+            self._tags.clear()
+            self._bytes = 0
+
+    def _remove(self, key: Hashable):
+        """Удалить запись без учета в статистике (вызывается под блокировкой)"""
+        entry = self._data.pop(key)
+        self._bytes -= entry.size
+        for tag in entry.tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+    # ================================
+    # Статистика
+    # ================================
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        """Статистика кеша"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "name": self.name,
+                "entries": len(self._data),
+                "max_entries": self.max_entries,
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "loads": self.loads,
+                "coalesced": self.coalesced,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
+
+
+class Generations:
+    """Счетчики поколений для кешей, которые инвалидируются без перебора ключей.
+
+    Поколения нужных областей входят в ключ записи; запись сдвигает счетчики
+    своих областей, и старые записи просто перестают находиться (их вытеснит
+    LRU или TTL). Значение, загруженное во время сдвига, сохраняется под
+    старым ключом и поэтому тоже не будет отдано.
+    """
+
+    def __init__(self):
+        self._counters: Dict[Hashable, int] = {}
+        self._lock = threading.Lock()
+        self.bumps = 0
+
+    def get(self, scopes: Iterable[Hashable]) -> tuple:
+        """Текущие поколения областей (в порядке scopes)"""
+        with self._lock:
+            return tuple(self._counters.get(scope, 0) for scope in scopes)
+
+    def bump(self, scopes: Iterable[Hashable]):
+        """Сдвинуть поколения областей"""
+        with self._lock:
+            for scope in scopes:
+                self._counters[scope] = self._counters.get(scope, 0) + 1
+                self.bumps += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"scopes": len(self._counters), "bumps": self.bumps}
+
+
+# ================================
+# Общий (между воркерами) уровень кеша
+# ================================
+
+def _encode_default(value):
+    if isinstance(value, datetime):
+        return {"__dt__": value.isoformat()}
+    if isinstance(value, date):
+        return {"__date__": value.isoformat()}
+    if isinstance(value, Decimal):
+        return {"__dec__": str(value)}
+    if isinstance(value, bytes):
+        return {"__bytes__": value.decode("latin-1")}
+    raise TypeError(f"Нельзя сериализовать {type(value).__name__}")
+
+
+def _decode_hook(obj):
+    if len(obj) == 1:
+        if "__dt__" in obj:
+            return datetime.fromisoformat(obj["__dt__"])
+        if "__date__" in obj:
+            return date.fromisoformat(obj["__date__"])
+        if "__dec__" in obj:
+            return Decimal(obj["__dec__"])
+        if "__bytes__" in obj:
+            return obj["__bytes__"].encode("latin-1")
+    return obj
+
+
+def dumps_value(value) -> bytes:
+    """Сериализовать строку(и) БД для общего бэкенда"""
+    return json.dumps(value, default=_encode_default).encode()
+
+
+def loads_value(raw: bytes):
+    return json.loads(raw, object_hook=_decode_hook)
+
+
+class SharedCache:
+    """Двухуровневый кеш: локальный TTLCache + общий бэкенд (Redis и т.п.).
+
+    При промахе в памяти процесса значение ищется в общем бэкенде и только
+    потом загружается из БД. Если бэкенд не общий (память процесса),
+    второй уровень не используется. Рассылку инвалидаций другим воркерам
+    делает вызывающий код (см. CacheService).
+    """
+
+    def __init__(self, local: TTLCache, backend):
+        self.local = local
+        self.name = local.name
+        self.backend = backend
+        self.shared_hits = 0
+        self.shared_misses = 0
+        self.shared_errors = 0
+
+    def _key(self, key) -> str:
+        return f"barter:{self.name}:{json.dumps(key)}"
+
+    def _tag_key(self, tag) -> str:
+        return f"barter:{self.name}:tag:{json.dumps(tag)}"
+
+    def get_or_load(self, key, loader, tags=(), ttl: Optional[float] = None, cache_none: bool = False):
+        """Прочитать из памяти, затем из общего бэкенда, затем через loader"""
+        if not self.backend.shared:
+            return self.local.get_or_load(key, loader, tags, ttl, cache_none)
+
+        ttl = self.local.ttl if ttl is None else ttl
+        shared_key = self._key(key)
+
+        def load():
+            try:
+                raw = self.backend.get(shared_key)
+                if raw is not None:
+                    self.shared_hits += 1
+                    return loads_value(raw)
+                self.shared_misses += 1
+            except Exception as e:
+                self.shared_errors += 1
+                logger.warning("Общий кеш %s недоступен: %s", self.name, e)
+                return loader()
+
+            value = loader()
+            if value is not None or cache_none:
+                try:
+                    self.backend.set(shared_key, dumps_value(value), ttl)
+                    entry_tags = tags(value) if callable(tags) else tags
+                    for tag in entry_tags:
+                        tag_key = self._tag_key(tag)
+                        self.backend.sadd(tag_key, shared_key)
+                        self.backend.expire(tag_key, ttl)
+                except Exception as e:
+                    self.shared_errors += 1
+                    logger.warning("Не удалось записать в общий кеш %s: %s", self.name, e)
+            return value
+
+        return self.local.get_or_load(key, load, tags, ttl, cache_none)
+
+    def delete(self, key, local_only: bool = False):
+        """Удалить ключ локально и (если не local_only) в общем бэкенде"""
+        self.local.delete(key)
+        if local_only or not self.backend.shared:
+            return
+        try:
+            self.backend.delete(self._key(key))
+        except Exception as e:
+            self.shared_errors += 1
+            logger.warning("Не удалось удалить ключ из общего кеша %s: %s", self.name, e)
+
+    def invalidate_tag(self, tag, local_only: bool = False):
+        """Сбросить все записи тега локально и (если не local_only) в общем бэкенде"""
+        self.local.invalidate_tag(tag)
+        if local_only or not self.backend.shared:
+            return
+        try:
+            tag_key = self._tag_key(tag)
+            self.backend.delete(*self.backend.smembers(tag_key), tag_key)
+        except Exception as e:
+            self.shared_errors += 1
+            logger.warning("Не удалось сбросить тег в общем кеше %s: %s", self.name, e)
+
+    def clear(self):
+        self.local.clear()
+
+    def __len__(self) -> int:
+        return len(self.local)
+
+    def stats(self) -> Dict[str, Any]:
+        stats = self.local.stats()
+        stats.update({
+            "backend": type(self.backend).__name__,
+            "shared_hits": self.shared_hits,
+            "shared_misses": self.shared_misses,
+            "shared_errors": self.shared_errors,
+        })
+        return stats
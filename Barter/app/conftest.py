@@ -0,0 +1,11 @@
+# conftest.py
+# Тесты лежат рядом с модулями и импортируют их так же, как приложение
+# (from cache import ...), поэтому каталог app добавляется в sys.path.
+# БД и Redis тестам не нужны.
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# Диагностика БД (python test_connection.py), а не набор тестов
+collect_ignore = ["test_connection.py"]
@@ -1,45 +1,386 @@
 import mysql.connector
-from mysql.connector import Error
+from mysql.connector import Error, errors, pooling
+import asyncio
+import logging
 import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from logs import get_logger
+
+logger = get_logger("db")
+
+# Журнал запросов текущего HTTP-запроса: список (query, params, seconds) или None.
+# Включается только бенчмарком/профилировщиком, иначе стоит одно ContextVar.get()
+query_log = ContextVar("query_log", default=None)
+# Отметки об отказе БД из-за перегрузки для текущего HTTP-запроса (список или None).
+# Заполняется здесь, читается middleware ограничения нагрузки
+overload_log = ContextVar("overload_log", default=None)
+# Привязка текущего HTTP-запроса к основному серверу ({"until": время, "wrote": bool} или None).
+# Ставится middleware из cookie; запись продлевает привязку, и чтения того же
+# пользователя READ_PIN_SECONDS идут на основной сервер - он видит свои изменения
+read_pin = ContextVar("read_pin", default=None)
+
+# Реплики для чтения: BARTER_DB_REPLICAS="host1:3306,host2:3307" (пусто - только основной)
+PRIMARY = os.environ.get("BARTER_DB_PRIMARY", "localhost:3306")
+REPLICAS = os.environ.get("BARTER_DB_REPLICAS", "")
+# Привязка к основному после записи; должна быть не меньше допустимого отставания реплик
+READ_PIN_SECONDS = float(os.environ.get("BARTER_DB_READ_PIN_SECONDS", "5"))
+# Реплика с большим отставанием (или остановленной репликацией) выводится из работы
+REPLICA_MAX_LAG = float(os.environ.get("BARTER_DB_REPLICA_MAX_LAG", "5"))
+REPLICA_POOL_SIZE = int(os.environ.get("BARTER_DB_REPLICA_POOL_SIZE", os.environ.get("BARTER_DB_POOL_SIZE", "10")))
+
+
+def parse_hosts(value):
+    """'host:port,host' -> [(host, port)]"""
+    hosts = []
+    for item in value.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        host, _, port = item.rpartition(":") if ":" in item else (item, "", "3306")
+        hosts.append((host, int(port)))
+    return hosts
+
+
+def _on_event_loop() -> bool:
+    """Вызов идет из потока, в котором работает event loop"""
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
+class DatabaseOverloaded(Exception):
+    """Все слоты подключений к БД заняты дольше допустимого ожидания"""
+
+
+class ReplicaUnavailable(Exception):
+    """Реплика не принимает подключения - чтение повторяется на основном сервере"""
+
+class Replica:
+    """Реплика для чтения: свой пул, нагрузка и состояние по последней проверке"""
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.pool = None
+        self.in_flight = 0
+        self.queries = 0
+        self.failures = 0
+        self.healthy = True
+        self.lag = None
+        self.checked_at = None
+
+    @property
+    def name(self):
+        return f"{self.host}:{self.port}"
+
+    def stats(self):
+        return {
+            "host": self.name,
+            "healthy": self.healthy,
+            "lag": self.lag,
+            "in_flight": self.in_flight,
+            "queries": self.queries,
+            "failures": self.failures,
+        }
+
 
 class Database:
-    def __init__(self):
-        self.host = 'localhost'
+    def __init__(self, primary=PRIMARY, replicas=REPLICAS):
+        self.host, self.port = parse_hosts(primary)[0]
         self.database = 'exchange_db'
         self.user = 'exchange_user'
         self.password = 'exchange_password'
-        self.port = 3306
+        self.replicas = [Replica(host, port) for host, port in parse_hosts(replicas)]
+        self._replica_lock = threading.Lock()
+        # Размер пула соединений (0 - подключение на каждый запрос)
+        self.pool_size = int(os.environ.get("BARTER_DB_POOL_SIZE", "10"))
+        self.pool = None
+        # Сколько запросов процесс одновременно держит в MySQL и сколько ждет слота.
+        # Лишние получают отказ, а не новое соединение сверх max_connections
+        self.max_concurrency = int(
+            os.environ.get("BARTER_DB_MAX_CONCURRENCY", str(max(self.pool_size, 1)))
+        )
+        self.queue_timeout = float(os.environ.get("BARTER_DB_QUEUE_TIMEOUT", "2"))
+        self.admission = threading.BoundedSemaphore(self.max_concurrency)
+        self.in_flight = 0
+        self.shed = 0
     
-    def get_connection(self):
+    def connection_params(self, replica=None):
+        return {
+            "host": replica.host if replica else self.host,
+            "database": self.database,
+            "user": self.user,
+            "password": self.password,
+            "port": replica.port if replica else self.port,
+            "auth_plugin": 'mysql_native_password',
+        }
+    
+    def init_pool(self, pool_size=None):
+        """Создать пул соединений (все соединения открываются сразу)"""
+        size = pool_size or self.pool_size
+        if size <= 0:
+            return False
+        
         try:
-            print(f"Подключаюсь к MySQL...")
-            print(f"Хост: {self.host}:{self.port}")
-            print(f"База: {self.database}")
-            print(f"Пользователь: {self.user}")
-            
-            connection = mysql.connector.connect(
-                host=self.host,
-                database=self.database,
-                user=self.user,
-                password=self.password,
-                port=self.port,
-                auth_plugin='mysql_native_password'
+            self.pool = pooling.MySQLConnectionPool(
+                pool_name="barter_pool",
+                pool_size=size,
+                pool_reset_session=True,
+                **self.connection_params()
             )
-            print("Успешное подключение к БД!")
+            logger.info("Пул соединений создан", extra={"pool_size": size})
+        except Error as e:
+            logger.error("Ошибка создания пула соединений: %s", e)
+            self.pool = None
+            return False
+        
+        # Недоступная при старте реплика не мешает запуску: она выводится из работы
+        # до следующей проверки, а подключения к ней идут без пула
+        for i, replica in enumerate(self.replicas):
+            try:
+                replica.pool = pooling.MySQLConnectionPool(
+                    pool_name=f"barter_replica_{i}",
+                    pool_size=REPLICA_POOL_SIZE,
+                    pool_reset_session=True,
+                    **self.connection_params(replica)
+                )
+            except Error as e:
+                logger.error("Ошибка создания пула реплики: %s", e, extra={"host": replica.name})
+                replica.healthy = False
+        return True
+    
+    def close_pool(self):
+        """Закрыть соединения пулов (основного и реплик)"""
+        for owner in [self] + self.replicas:
+            if owner.pool is None:
+                continue
+            pool, owner.pool = owner.pool, None
+            try:
+                pool._remove_connections()
+            except Error as e:
+                logger.warning("Ошибка закрытия пула: %s", e)
+    
+    def get_connection(self, replica=None):
+        owner = replica or self
+        if owner.pool is not None:
+            try:
+                return owner.pool.get_connection()
+            except pooling.PoolError:
+                # Пул исчерпан - подключаемся напрямую
+                pass
+            except Error as e:
+                logger.warning("Ошибка получения соединения из пула: %s", e)
+        
+        params = self.connection_params(replica)
+        try:
+            connection = mysql.connector.connect(**params)
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Подключение к MySQL без пула", extra={"host": f"{params['host']}:{params['port']}"})
             return connection
         except Error as e:
-            print(f"Ошибка подключения: {e}")
-            print("Возможные проблемы:")
-            print("1. Неправильный пароль")
-            print("2. Пользователь не существует")
-            print("3. База данных не существует")
-            print("4. MySQL сервер не запущен")
+            logger.error(
+                "Ошибка подключения: %s", e,
+                extra={
+                    "host": f"{params['host']}:{params['port']}",
+                    "db_name": self.database,
+                    "db_user": self.user,
+                    "hint": "неправильный пароль, нет пользователя или базы, MySQL не запущен",
+                },
+            )
             return None
     
-    def execute_query(self, query, params=None, fetch=False):
-        connection = self.get_connection()
+    # ================================
+    # Маршрутизация чтений по репликам
+    # ================================
+    
+    def _pinned(self):
+        """Текущий запрос должен читать с основного сервера"""
+        pin = read_pin.get()
+        return pin is not None and pin["until"] > time.time()
+    
+    def _note_write(self):
+        """После записи пользователь READ_PIN_SECONDS читает с основного сервера"""
+        pin = read_pin.get()
+        if pin is not None:
+            pin["until"] = time.time() + READ_PIN_SECONDS
+            pin["wrote"] = True
+    
+    def _pick_replica(self):
+        """Наименее загруженная исправная реплика (None - читать с основного)"""
+        with self._replica_lock:
+            healthy = [replica for replica in self.replicas if replica.healthy]
+            if not healthy:
+                return None
+            replica = min(healthy, key=lambda r: (r.in_flight, r.queries))
+            replica.in_flight += 1
+            replica.queries += 1
+            return replica
+    
+    def _release_replica(self, replica, failed):
+        with self._replica_lock:
+            replica.in_flight -= 1
+            if failed:
+                # Выводим из работы до следующей проверки check_replicas
+                replica.failures += 1
+                replica.healthy = False
+        if failed:
+            logger.warning("Реплика выведена из работы после ошибки", extra={"host": replica.name})
+    
+    def check_replicas(self):
+        """Периодическая проверка реплик: доступность и отставание репликации.
+        
+        Сервер без настроенной репликации (локальная подмена реплики) считается
+        исправным с нулевым отставанием.
+        """
+        for replica in self.replicas:
+            healthy, lag = False, None
+            connection = self.get_connection(replica)
+            if connection is not None:
+                try:
+                    cursor = connection.cursor(dictionary=True)
+                    cursor.execute("SELECT 1")
+                    cursor.fetchall()
+                    try:
+                        cursor.execute("SHOW REPLICA STATUS")
+                    except Error:
+                        # MySQL до 8.0.22 и MariaDB
+                        cursor.execute("SHOW SLAVE STATUS")
+                    status = cursor.fetchall()
+                    cursor.close()
+                    if not status:
+                        lag = 0
+                    else:
+                        row = status[0]
+                        lag = row.get("Seconds_Behind_Source", row.get("Seconds_Behind_Master"))
+                    healthy = lag is not None and lag <= REPLICA_MAX_LAG
+                except Error as e:
+                    logger.warning("Ошибка проверки реплики: %s", e, extra={"host": replica.name})
+                finally:
+                    connection.close()
+            
+            if healthy != replica.healthy:
+                logger.warning(
+                    "Реплика %s", "возвращена в работу" if healthy else "выведена из работы",
+                    extra={"host": replica.name, "lag": lag},
+                )
+            with self._replica_lock:
+                replica.healthy, replica.lag = healthy, lag
+                replica.checked_at = time.time()
+        return all(replica.healthy for replica in self.replicas)
+    
+    def replica_stats(self):
+        """Состояние реплик для /health/ready и /api/cache_stats"""
+        with self._replica_lock:
+            return [replica.stats() for replica in self.replicas]
+    
+    def _admit(self, what):
+        """Занять слот БД или отказать с DatabaseOverloaded.
+        
+        Ждать слота можно только в рабочем потоке: в потоке event loop
+        ожидание остановило бы все запросы процесса, поэтому там отказ сразу.
+        """
+        if _on_event_loop():
+            admitted = self.admission.acquire(blocking=False)
+        else:
+            admitted = self.admission.acquire(timeout=self.queue_timeout)
+        if not admitted:
+            self.shed += 1
+            overloads = overload_log.get()
+            if overloads is not None:
+                overloads.append(what)
+            raise DatabaseOverloaded(f"Нет свободного слота БД за {self.queue_timeout} с")
+        self.in_flight += 1
+    
+    def execute_query(self, query, params=None, fetch=False, rowcount=False, primary=False):
+        """Выполнить запрос; primary=True - читать с основного сервера
+        (чтение, по которому сразу принимается решение о записи)"""
+        self._admit(query)
+        try:
+            log = query_log.get()
+            if log is not None:
+                start = time.perf_counter()
+                try:
+                    return self._route_query(query, params, fetch, rowcount, primary)
+                finally:
+                    log.append((query, params, time.perf_counter() - start))
+            return self._route_query(query, params, fetch, rowcount, primary)
+        finally:
+            self.in_flight -= 1
+            self.admission.release()
+    
+    def _route_query(self, query, params, fetch, rowcount, primary):
+        """Чтение - на реплику (если есть и запрос не привязан), запись - на основной"""
+        if not fetch:
+            self._note_write()
+        elif self.replicas and not primary and not self._pinned():
+            replica = self._pick_replica()
+            if replica is not None:
+                failed = False
+                try:
+                    result = self._execute_query(query, params, fetch, rowcount, replica)
+                except ReplicaUnavailable:
+                    failed, result = True, None
+                finally:
+                    self._release_replica(replica, failed)
+                if result is not None:
+                    return result
+                # Реплика недоступна или еще не получила изменение схемы - повторяем на основном
+        return self._execute_query(query, params, fetch, rowcount)
+    
+    @contextmanager
+    def transaction(self):
+        """Несколько запросов в одной транзакции на одном соединении.
+        
+        Отдает курсор (dictionary=True); commit - при выходе, rollback - при
+        исключении. В отличие от execute_query, ошибки пробрасываются.
+        Транзакции всегда идут на основной сервер и считаются записью.
+        """
+        self._admit("transaction")
+        self._note_write()
+        connection = None
+        try:
+            connection = self.get_connection()
+            if connection is None:
+                raise Error("Нет подключения к БД")
+            cursor = connection.cursor(dictionary=True)
+            try:
+                connection.start_transaction()
+                yield cursor
+                connection.commit()
+            except BaseException:
+                connection.rollback()
+                raise
+            finally:
+                cursor.close()
+        finally:
+            if connection is not None and (
+                isinstance(connection, pooling.PooledMySQLConnection) or connection.is_connected()
+            ):
+                connection.close()
+            self.in_flight -= 1
+            self.admission.release()
+    
+    def admission_stats(self):
+        """Счетчики ограничителя одновременных запросов к БД"""
+        return {
+            "max_concurrency": self.max_concurrency,
+            "queue_timeout": self.queue_timeout,
+            "in_flight": self.in_flight,
+            "shed": self.shed,
+        }
+    
+    def _execute_query(self, query, params=None, fetch=False, rowcount=False, replica=None):
+        connection = self.get_connection(replica)
         if connection is None:
-            print("Не могу выполнить запрос - нет подключения")
+            if replica is not None:
+                raise ReplicaUnavailable(replica.name)
+            logger.error("Не могу выполнить запрос - нет подключения")
             return None
         
         try:
@@ -48,20 +389,43 @@ class Database:
             
             if fetch:
                 result = cursor.fetchall()
-                print(f"Запрос выполнен, строк: {len(result)}")
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug("Запрос выполнен", extra={"rows": len(result)})
             else:
                 connection.commit()
-                result = cursor.lastrowid
-                print(f"Запрос выполнен, ID: {result}")
+                # rowcount=True - вернуть число затронутых строк вместо ID
+                result = cursor.rowcount if rowcount else cursor.lastrowid
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug("Запрос выполнен", extra={"rows" if rowcount else "last_id": result})
             
             cursor.close()
             return result
         except Error as e:
-            print(f"Ошибка выполнения запроса: {e}")
-            print(f"Запрос: {query}")
+            if replica is not None and isinstance(e, (errors.InterfaceError, errors.OperationalError)):
+                raise ReplicaUnavailable(replica.name) from e
+            logger.error("Ошибка выполнения запроса: %s", e, extra={"query": query})
             return None
         finally:
-            if connection.is_connected():
+            # Соединение из пула возвращаем в пул всегда, даже если оно оборвалось
+            if isinstance(connection, pooling.PooledMySQLConnection) or connection.is_connected():
                 connection.close()
+    
+    def health(self):
+        """Проверка БД для readiness: SELECT 1 и состояние пула"""
+        start = time.perf_counter()
+        result = self.execute_query("SELECT 1 AS ok", fetch=True)
+        status = {
+            "ok": bool(result),
+            "latency_ms": round((time.perf_counter() - start) * 1000, 2),
+            "pooled": self.pool is not None,
+        }
+        if self.pool is not None:
+            status["pool_size"] = self.pool.pool_size
+            queue = getattr(self.pool, "_cnx_queue", None)
+            if queue is not None:
+                status["pool_available"] = queue.qsize()
+        if self.replicas:
+            status["replicas"] = self.replica_stats()
+        return status
 
 db = Database()
\ No newline at end of file
@@ -0,0 +1,167 @@
+# events.py
+# События между воркерами: сброс кешей, новые сообщения мессенджера, изменения объявлений.
+# Публикация идет через общий бэкенд, поэтому событие видят все процессы.
+import asyncio
+import itertools
+import json
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Optional
+
+from backend import backend, WORKER_ID
+from logs import get_logger
+
+logger = get_logger("events")
+
+INVALIDATE_CHANNEL = "barter:invalidate"
+MESSAGES_CHANNEL = "barter:messages"
+UNREAD_CHANNEL = "barter:unread"
+OFFERS_CHANNEL = "barter:offers"
+# Для скольких тем помнить номер последнего события (давние вытесняются)
+MAX_TOPIC_VERSIONS = 100_000
+
+
+class EventHub:
+    """Локальные ожидающие корутины по темам (например, диалог или пользователь).
+
+    notify можно вызывать из любого потока - в том числе из потока pub/sub.
+    У каждой темы есть номер последнего события: long polling берет его
+    (version) до проверки в БД и передает в wait, поэтому событие, пришедшее
+    между проверкой и ожиданием, не теряется - wait сразу возвращает True.
+    """
+
+    def __init__(self):
+        self._waiters: Dict[Hashable, List[tuple]] = {}
+        self._versions: "OrderedDict[Hashable, int]" = OrderedDict()
+        self._counter = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def version(self, topic: Hashable) -> int:
+        """Номер последнего события темы (0 - событий не было или тема вытеснена)"""
+        with self._lock:
+            return self._versions.get(topic, 0)
+
+    async def wait(self, topic: Hashable, timeout: float, since: Optional[int] = None) -> bool:
+        """Дождаться события по теме; False - если истек таймаут.
+
+        since - номер из version(): если с тех пор событие уже было, ждать не нужно.
+        """
+        loop = asyncio.get_running_loop()
+        event = asyncio.Event()
+        waiter = (loop, event)
+
+        with self._lock:
+            if since is not None and self._versions.get(topic, 0) != since:
+                return True
+            self._waiters.setdefault(topic, []).append(waiter)
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            with self._lock:
+                waiters = self._waiters.get(topic)
+                if waiters and waiter in waiters:
+                    waiters.remove(waiter)
+                    if not waiters:
+                        del self._waiters[topic]
+
+    def notify(self, topic: Hashable):
+        """Разбудить всех, кто ждет тему"""
+        with self._lock:
+            self._versions[topic] = next(self._counter)
+            self._versions.move_to_end(topic)
+            if len(self._versions) > MAX_TOPIC_VERSIONS:
+                self._versions.popitem(last=False)
+            waiters = list(self._waiters.get(topic, ()))
+        for loop, event in waiters:
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                # Цикл событий уже закрыт
+                pass
+
+    def waiting_count(self) -> int:
+        with self._lock:
+            return sum(len(waiters) for waiters in self._waiters.values())
+
+
+hub = EventHub()
+
+
+def _to_hashable(value):
+    """JSON превращает кортежи в списки - возвращаем их обратно"""
+    if isinstance(value, list):
+        return tuple(_to_hashable(item) for item in value)
+    return value
+
+
+def publish(channel: str, payload: Dict[str, Any]):
+    """Опубликовать событие для всех воркеров (ошибки бэкенда не ломают запрос)"""
+    payload = dict(payload, origin=WORKER_ID)
+    try:
+        backend.publish(channel, json.dumps(payload).encode())
+    except Exception as e:
+        logger.warning("Не удалось опубликовать событие в %s: %s", channel, e)
+
+
+def subscribe(channel: str, handler: Callable[[Dict[str, Any]], None], skip_own: bool = False):
+    """Подписаться на канал; handler получает разобранный payload"""
+    def on_message(raw: bytes):
+        payload = json.loads(raw)
+        if skip_own and payload.get("origin") == WORKER_ID:
+            return
+        handler({key: _to_hashable(value) for key, value in payload.items()})
+
+    backend.subscribe(channel, on_message)
+
+
+# ================================
+# Мессенджер
+# ================================
+
+def dialog_topic(user1_id: int, user2_id: int) -> tuple:
+    """Тема диалога не зависит от порядка собеседников"""
+    return ("dialog", min(user1_id, user2_id), max(user1_id, user2_id))
+
+
+def user_topic(user_id: int) -> tuple:
+    return ("user", user_id)
+
+
+def unread_topic(user_id: int) -> tuple:
+    return ("unread", user_id)
+
+
+def publish_message_event(sender_id: int, recipient_id: int):
+    """Сообщить всем воркерам о новом сообщении"""
+    publish(MESSAGES_CHANNEL, {"sender_id": sender_id, "recipient_id": recipient_id})
+
+
+def publish_unread_event(user_id: int):
+    """Сообщить, что счетчик непрочитанных пользователя изменился"""
+    publish(UNREAD_CHANNEL, {"user_id": user_id})
+
+
+def publish_offer_created(offer: Dict[str, Any]):
+    """Сообщить всем воркерам о новом объявлении (payload - поля объявления)"""
+    publish(OFFERS_CHANNEL, {"op": "created", "offer": offer})
+
+
+def publish_offer_deactivated(offer_id: int):
+    publish(OFFERS_CHANNEL, {"op": "deactivated", "offer_id": offer_id})
+
+
+def _on_message_event(payload: Dict[str, Any]):
+    hub.notify(dialog_topic(payload["sender_id"], payload["recipient_id"]))
+    hub.notify(user_topic(payload["recipient_id"]))
+    hub.notify(unread_topic(payload["recipient_id"]))
+
+
+def _on_unread_event(payload: Dict[str, Any]):
+    hub.notify(unread_topic(payload["user_id"]))
+
+
+subscribe(MESSAGES_CHANNEL, _on_message_event)
+subscribe(UNREAD_CHANNEL, _on_unread_event)
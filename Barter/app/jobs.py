@@ -0,0 +1,357 @@
+# jobs.py
+# Фоновые задачи: обработчик кладет задачу в таблицу jobs и сразу отвечает,
+# а пул воркеров процесса забирает задачи (FOR UPDATE SKIP LOCKED - задачу
+# получает ровно один процесс), выполняет их в потоках и при ошибке повторяет
+# с экспоненциальной задержкой. Периодические задачи (job_schedules) ставит в
+# очередь тот процесс, который первым сдвинул время следующего запуска.
+import asyncio
+import json
+import os
+import random
+import socket
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+from database import db
+from logs import get_logger
+
+logger = get_logger("jobs")
+
+# Сколько задач процесс выполняет одновременно (0 - процесс только ставит задачи)
+CONCURRENCY = int(os.environ.get("BARTER_JOB_WORKERS", "4"))
+# Как часто смотреть в очередь, если никто не разбудил раньше
+POLL_SECONDS = float(os.environ.get("BARTER_JOB_POLL_SECONDS", "1"))
+# Повтор после ошибки: BACKOFF_BASE * 2^(попытка-1) с разбросом, не больше BACKOFF_MAX
+BACKOFF_BASE = float(os.environ.get("BARTER_JOB_BACKOFF_SECONDS", "5"))
+BACKOFF_MAX = 3600
+DEFAULT_MAX_ATTEMPTS = 5
+# Задача в статусе running дольше этого - воркер умер, задача возвращается в очередь
+LOCK_TIMEOUT = int(os.environ.get("BARTER_JOB_LOCK_TIMEOUT", "600"))
+# Выполненные задачи хранятся неделю (для разбора), потом удаляются
+KEEP_DONE_SECONDS = 7 * 24 * 3600
+# Сколько ждать выполняющиеся задачи при остановке
+DRAIN_SECONDS = 10
+
+@dataclass
+class Task:
+    name: str
+    func: Callable[..., Any]
+    max_attempts: int = DEFAULT_MAX_ATTEMPTS
+
+
+@dataclass
+class Schedule:
+    name: str
+    interval: int
+    task: str
+    payload: Dict[str, Any]
+
+
+_tasks: Dict[str, Task] = {}
+_schedules: Dict[str, Schedule] = {}
+
+
+def register(name: str, func: Callable[..., Any], max_attempts: int = DEFAULT_MAX_ATTEMPTS):
+    """Зарегистрировать обработчик задачи: func(**payload), выполняется в потоке"""
+    _tasks[name] = Task(name, func, max_attempts)
+
+
+def schedule(name: str, interval: int, task: str, **payload):
+    """Ставить задачу раз в interval секунд (один раз на все процессы)"""
+    _schedules[name] = Schedule(name, int(interval), task, payload)
+
+
+def ensure_tables():
+    """Создать таблицы очереди и расписаний, если их нет"""
+    db.execute_query(
+        """CREATE TABLE IF NOT EXISTS jobs (
+               id BIGINT AUTO_INCREMENT PRIMARY KEY,
+               task VARCHAR(64) NOT NULL,
+               payload TEXT NOT NULL,
+               status VARCHAR(16) NOT NULL DEFAULT 'queued',
+               attempts INT NOT NULL DEFAULT 0,
+               max_attempts INT NOT NULL DEFAULT 5,
+               run_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+               locked_by VARCHAR(128) NULL,
+               locked_at DATETIME NULL,
+               last_error TEXT NULL,
+               created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+               finished_at DATETIME NULL,
+               INDEX idx_jobs_due (status, run_at)
+           )"""
+    )
+    db.execute_query(
+        """CREATE TABLE IF NOT EXISTS job_schedules (
+               name VARCHAR(64) NOT NULL PRIMARY KEY,
+               next_run_at DATETIME NOT NULL
+           )"""
+    )
+    return True
+
+
+def enqueue(task: str, delay: float = 0, max_attempts: Optional[int] = None, **payload) -> Optional[int]:
+    """Поставить задачу в очередь; ID задачи или None, если БД недоступна"""
+    if task not in _tasks:
+        raise KeyError(f"Неизвестная задача '{task}'")
+    attempts = max_attempts or _tasks[task].max_attempts
+    job_id = db.execute_query(
+        """INSERT INTO jobs (task, payload, max_attempts, run_at)
+           VALUES (%s, %s, %s, NOW() + INTERVAL %s SECOND)""",
+        (task, json.dumps(payload, ensure_ascii=False, default=str), attempts, int(delay)),
+    )
+    if job_id is None:
+        logger.error("Не удалось поставить задачу '%s' в очередь", task)
+        return None
+    runner.metric(task, "enqueued")
+    if not delay:
+        runner.wake()
+    return job_id
+
+
+def backoff(attempt: int) -> int:
+    """Задержка перед повтором: экспонента с разбросом 50-100%"""
+    delay = min(BACKOFF_BASE * 2 ** (attempt - 1), BACKOFF_MAX)
+    return max(1, int(delay * random.uniform(0.5, 1.0)))
+
+
+class JobRunner:
+    """Пул воркеров процесса: забирает задачи пачкой по числу свободных слотов"""
+
+    def __init__(self, concurrency: int = CONCURRENCY, poll_seconds: float = POLL_SECONDS):
+        self.concurrency = concurrency
+        self.poll_seconds = poll_seconds
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self.running: Dict[int, asyncio.Task] = {}
+        self.metrics: Dict[str, Dict[str, float]] = {}
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._stopping = False
+        self._tasks: List[asyncio.Task] = []
+
+    # --- метрики ---
+
+    def metric(self, task: str, name: str, value: float = 1):
+        with self._lock:
+            counters = self.metrics.setdefault(task, {
+                "enqueued": 0, "succeeded": 0, "retried": 0, "failed": 0, "seconds": 0.0, "max_seconds": 0.0,
+            })
+            if name == "seconds":
+                counters["seconds"] += value
+                counters["max_seconds"] = max(counters["max_seconds"], value)
+            else:
+                counters[name] += value
+
+    def wake(self):
+        """Разбудить опрос очереди (можно звать из любого потока)"""
+        if self._loop is not None and self._wake is not None:
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    # --- запуск и остановка ---
+
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        self._stopping = False
+        if _schedules:
+            await asyncio.to_thread(self._init_schedules)
+        self._tasks = [asyncio.create_task(self._maintenance_loop())]
+        if self.concurrency > 0:
+            self._tasks.append(asyncio.create_task(self._poll_loop()))
+        logger.info("Фоновые задачи запущены", extra={"concurrency": self.concurrency, "worker": self.worker_id})
+        return True
+
+    async def stop(self):
+        """Перестать брать задачи и дождаться выполняющихся (не дольше DRAIN_SECONDS)"""
+        self._stopping = True
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self.running:
+            done, pending = await asyncio.wait(list(self.running.values()), timeout=DRAIN_SECONDS)
+            if pending:
+                # Незавершенные задачи вернутся в очередь по LOCK_TIMEOUT
+                logger.warning("Задачи не завершились при остановке", extra={"jobs": len(pending)})
+
+    # --- очередь ---
+
+    def _claim(self, limit: int) -> List[Dict[str, Any]]:
+        """Забрать до limit готовых задач в этот процесс"""
+        with db.transaction() as cursor:
+            cursor.execute(
+                """SELECT id, task, payload, attempts, max_attempts FROM jobs
+                   WHERE status = 'queued' AND run_at <= NOW()
+                   ORDER BY run_at, id
+                   LIMIT %s
+                   FOR UPDATE SKIP LOCKED""",
+                (limit,),
+            )
+            jobs = cursor.fetchall()
+            if jobs:
+                placeholders = ", ".join(["%s"] * len(jobs))
+                cursor.execute(
+                    f"""UPDATE jobs
+                        SET status = 'running', attempts = attempts + 1, locked_by = %s, locked_at = NOW()
+                        WHERE id IN ({placeholders})""",
+                    [self.worker_id] + [job["id"] for job in jobs],
+                )
+        return jobs
+
+    async def _poll_loop(self):
+        while not self._stopping:
+            free = self.concurrency - len(self.running)
+            claimed = []
+            if free > 0:
+                try:
+                    claimed = await asyncio.to_thread(self._claim, free)
+                except Exception as e:
+                    logger.warning("Ошибка выборки задач: %s", e)
+            for job in claimed:
+                self.running[job["id"]] = asyncio.create_task(self._run(job))
+
+            # Забрали полную пачку - в очереди, вероятно, есть еще
+            if claimed and len(claimed) == free:
+                continue
+            self._wake.clear()
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.poll_seconds)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _run(self, job: Dict[str, Any]):
+        name = job["task"]
+        attempt = job["attempts"] + 1
+        start = time.perf_counter()
+        try:
+            task = _tasks.get(name)
+            if task is None:
+                raise KeyError(f"Неизвестная задача '{name}'")
+            payload = json.loads(job["payload"] or "{}")
+            await asyncio.to_thread(task.func, **payload)
+            error = None
+        except Exception as e:
+            error = e
+        self.metric(name, "seconds", time.perf_counter() - start)
+        try:
+            if error is None:
+                self.metric(name, "succeeded")
+                await asyncio.to_thread(
+                    db.execute_query,
+                    "UPDATE jobs SET status = 'done', locked_by = NULL, finished_at = NOW() WHERE id = %s",
+                    (job["id"],),
+                )
+            else:
+                await asyncio.to_thread(self._failed, job, attempt, error)
+        except Exception as e:
+            # Статус не записан - задача вернется в очередь по LOCK_TIMEOUT
+            logger.error("Не удалось обновить статус задачи %s: %s", job["id"], e)
+        finally:
+            self.running.pop(job["id"], None)
+            # Освободился слот - можно брать следующую задачу
+            if self._wake is not None:
+                self._wake.set()
+
+    def _failed(self, job: Dict[str, Any], attempt: int, error: Exception):
+        error_text = f"{type(error).__name__}: {error}"[:2000]
+        if attempt < job["max_attempts"]:
+            delay = backoff(attempt)
+            self.metric(job["task"], "retried")
+            logger.warning(
+                "Задача '%s' упала, повтор через %s с", job["task"], delay,
+                extra={"job_id": job["id"], "attempt": attempt, "error": error_text},
+            )
+            db.execute_query(
+                """UPDATE jobs
+                   SET status = 'queued', locked_by = NULL, last_error = %s,
+                       run_at = NOW() + INTERVAL %s SECOND
+                   WHERE id = %s""",
+                (error_text, delay, job["id"]),
+            )
+        else:
+            self.metric(job["task"], "failed")
+            logger.error(
+                "Задача '%s' не выполнена за %s попыток", job["task"], attempt,
+                extra={"job_id": job["id"], "error": error_text},
+            )
+            db.execute_query(
+                """UPDATE jobs
+                   SET status = 'failed', locked_by = NULL, last_error = %s, finished_at = NOW()
+                   WHERE id = %s""",
+                (error_text, job["id"]),
+            )
+
+    # --- расписания и обслуживание ---
+
+    def _init_schedules(self):
+        for item in _schedules.values():
+            db.execute_query(
+                """INSERT IGNORE INTO job_schedules (name, next_run_at)
+                   VALUES (%s, NOW() + INTERVAL %s SECOND)""",
+                (item.name, item.interval),
+            )
+
+    def _run_schedules(self):
+        for item in _schedules.values():
+            # Время сдвигает только один процесс - он и ставит задачу
+            moved = db.execute_query(
+                """UPDATE job_schedules SET next_run_at = NOW() + INTERVAL %s SECOND
+                   WHERE name = %s AND next_run_at <= NOW()""",
+                (item.interval, item.name),
+                rowcount=True,
+            )
+            if moved:
+                enqueue(item.task, **item.payload)
+
+    def _reclaim(self):
+        """Вернуть в очередь задачи умерших воркеров и удалить старые выполненные"""
+        reclaimed = db.execute_query(
+            """UPDATE jobs SET status = 'queued', locked_by = NULL
+               WHERE status = 'running' AND locked_at < NOW() - INTERVAL %s SECOND""",
+            (LOCK_TIMEOUT,),
+            rowcount=True,
+        )
+        if reclaimed:
+            logger.warning("Задачи возвращены в очередь по таймауту", extra={"jobs": reclaimed})
+        db.execute_query(
+            """DELETE FROM jobs
+               WHERE status = 'done' AND finished_at < NOW() - INTERVAL %s SECOND
+               LIMIT 10000""",
+            (KEEP_DONE_SECONDS,),
+        )
+
+    async def _maintenance_loop(self):
+        last_reclaim = 0.0
+        while not self._stopping:
+            try:
+                if _schedules:
+                    await asyncio.to_thread(self._run_schedules)
+                if time.monotonic() - last_reclaim > LOCK_TIMEOUT / 10:
+                    last_reclaim = time.monotonic()
+                    await asyncio.to_thread(self._reclaim)
+            except Exception as e:
+                logger.warning("Ошибка обслуживания очереди: %s", e)
+            await asyncio.sleep(max(self.poll_seconds, 1))
+
+    def stats(self) -> Dict[str, Any]:
+        rows = db.execute_query(
+            "SELECT status, COUNT(*) AS count FROM jobs GROUP BY status", fetch=True
+        ) or []
+        with self._lock:
+            metrics = {
+                name: dict(counters, seconds=round(counters["seconds"], 3), max_seconds=round(counters["max_seconds"], 3))
+                for name, counters in self.metrics.items()
+            }
+        return {
+            "worker": self.worker_id,
+            "concurrency": self.concurrency,
+            "running": len(self.running),
+            "queue": {row["status"]: int(row["count"]) for row in rows},
+            "tasks": metrics,
+            "schedules": {name: item.interval for name, item in _schedules.items()},
+        }
+
+
+runner = JobRunner()
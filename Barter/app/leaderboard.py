@@ -0,0 +1,427 @@
+# leaderboard.py
+# Таблица лидеров мини-игры: лучшие результаты за все время и по дням.
+#
+# Рейтинг живет в памяти процесса в упорядоченной структуре из блоков
+# (как sortedcontainers): вставка, удаление, место игрока и выборка по месту -
+# за O(log n), без ORDER BY score на каждый просмотр. Результаты, принятые
+# этим процессом, периодически сбрасываются в MySQL (game_scores), остальные
+# воркеры узнают о них через событие и применяют у себя. При старте рейтинг
+# загружается из таблицы.
+#
+# Результат принимается только для игры, начатой на сервере: при старте
+# игрок получает одноразовый номер игры, а очков не может быть больше,
+# чем успел бы набрать за время с начала этой игры.
+import hmac
+import os
+import secrets
+import threading
+import time
+from bisect import bisect_left, insort
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from backend import backend
+from database import db
+import events
+from logs import get_logger
+
+logger = get_logger("leaderboard")
+
+SCORES_CHANNEL = "barter:scores"
+ALL_TIME = "all"
+# Больше набрать в текущей игре нельзя: 8 пар по 100 очков и до 50 за скорость
+MAX_SCORE = int(os.environ.get("BARTER_MINIGAME_MAX_SCORE", "1200"))
+GAME_PAIRS = 8
+PAIR_POINTS = 150
+# Отсчет перед игрой (3 с и "Старт!"), секунда оставлена на задержку сети
+GAME_COUNTDOWN_SECONDS = 3
+# После проверки пары выбор заблокирован на секунду - быстрее пару не найти
+MIN_PAIR_SECONDS = 1.0
+# Сколько ждать результат начатой игры (сама игра - 60 с)
+GAME_SESSION_TTL = 600
+GAME_KEY_PREFIX = "barter:game:"
+# Сколько последних дней держать в памяти (таблица хранит все)
+DAYS_KEPT = 7
+# Размер блока упорядоченной структуры: блоки делятся при 2 * BLOCK_SIZE
+BLOCK_SIZE = 512
+
+
+class RankedIndex:
+    """Упорядоченное множество ключей с доступом по месту.
+
+    Ключи лежат в отсортированных блоках; над размерами блоков - дерево
+    Фенвика, поэтому место ключа и ключ на месте находятся за O(log n).
+    Дерево перестраивается только при делении или удалении блока.
+    """
+
+    def __init__(self):
+        self._blocks: List[list] = []
+        self._maxes: list = []
+        self._tree: List[int] = []
+        self._len = 0
+
+    def __len__(self) -> int:
+        return self._len
+
+    def _rebuild_tree(self):
+        tree = [len(block) for block in self._blocks]
+        for i in range(len(tree)):
+            parent = i | (i + 1)
+            if parent < len(tree):
+                tree[parent] += tree[i]
+        self._tree = tree
+
+    def _tree_add(self, position: int, delta: int):
+        while position < len(self._tree):
+            self._tree[position] += delta
+            position |= position + 1
+
+    def _before_block(self, position: int) -> int:
+        """Сколько ключей в блоках до position"""
+        total = 0
+        position -= 1
+        while position >= 0:
+            total += self._tree[position]
+            position = (position & (position + 1)) - 1
+        return total
+
+    def add(self, key):
+        if not self._blocks:
+            self._blocks.append([key])
+            self._maxes.append(key)
+            self._rebuild_tree()
+            self._len = 1
+            return
+
+        position = min(bisect_left(self._maxes, key), len(self._blocks) - 1)
+        block = self._blocks[position]
+        insort(block, key)
+        self._maxes[position] = block[-1]
+        self._len += 1
+
+        if len(block) > 2 * BLOCK_SIZE:
+            self._blocks[position:position + 1] = [block[:BLOCK_SIZE], block[BLOCK_SIZE:]]
+            self._maxes[position:position + 1] = [block[BLOCK_SIZE - 1], block[-1]]
+            self._rebuild_tree()
+        else:
+            self._tree_add(position, 1)
+
+    def remove(self, key) -> bool:
+        position = bisect_left(self._maxes, key)
+        if position == len(self._blocks):
+            return False
+        block = self._blocks[position]
+        offset = bisect_left(block, key)
+        if offset == len(block) or block[offset] != key:
+            return False
+
+        del block[offset]
+        self._len -= 1
+        if block:
+            self._maxes[position] = block[-1]
+            self._tree_add(position, -1)
+        else:
+            del self._blocks[position]
+            del self._maxes[position]
+            self._rebuild_tree()
+        return True
+
+    def index(self, key) -> int:
+        """Место ключа (с нуля); ключ должен быть в множестве"""
+        position = bisect_left(self._maxes, key)
+        return self._before_block(position) + bisect_left(self._blocks[position], key)
+
+    def _locate(self, index: int) -> Tuple[int, int]:
+        """(блок, смещение) ключа на месте index - спуск по дереву Фенвика"""
+        position = -1
+        step = 1 << max(len(self._tree).bit_length() - 1, 0)
+        while step:
+            nxt = position + step
+            if nxt < len(self._tree) and self._tree[nxt] <= index:
+                position = nxt
+                index -= self._tree[nxt]
+            step >>= 1
+        return position + 1, index
+
+    def slice(self, start: int, count: int) -> list:
+        """Ключи с мест start .. start + count - 1"""
+        start = max(start, 0)
+        if count <= 0 or start >= self._len:
+            return []
+        position, offset = self._locate(start)
+        result = []
+        while position < len(self._blocks) and len(result) < count:
+            block = self._blocks[position]
+            result.extend(block[offset:offset + count - len(result)])
+            position, offset = position + 1, 0
+        return result
+
+
+class Board:
+    """Одна таблица: лучший результат каждого игрока и рейтинг по ним"""
+
+    def __init__(self):
+        self.best: Dict[int, tuple] = {}
+        self.index = RankedIndex()
+
+    @staticmethod
+    def key(user_id: int, score: int, achieved_at: float) -> tuple:
+        # Больше очков - выше; при равенстве выше тот, кто набрал раньше
+        return (-score, achieved_at, user_id)
+
+    def submit(self, user_id: int, score: int, achieved_at: float) -> bool:
+        """Учесть результат; False - у игрока уже есть не хуже"""
+        old = self.best.get(user_id)
+        new = self.key(user_id, score, achieved_at)
+        if old is not None and old <= new:
+            return False
+        if old is not None:
+            self.index.remove(old)
+        self.best[user_id] = new
+        self.index.add(new)
+        return True
+
+    def rank(self, user_id: int) -> Optional[int]:
+        key = self.best.get(user_id)
+        return None if key is None else self.index.index(key) + 1
+
+    def entries(self, start: int, count: int) -> List[Dict[str, Any]]:
+        return [
+            {
+                "rank": start + i + 1,
+                "user_id": user_id,
+                "score": -neg_score,
+                "achieved_at": datetime.fromtimestamp(achieved_at).isoformat(timespec="seconds"),
+            }
+            for i, (neg_score, achieved_at, user_id) in enumerate(self.index.slice(start, count))
+        ]
+
+
+class Leaderboard:
+    """Таблицы за все время и за последние DAYS_KEPT дней"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.boards: Dict[str, Board] = {ALL_TIME: Board()}
+        # Результаты, принятые этим процессом и еще не записанные в БД
+        self._dirty: Dict[Tuple[str, int], Tuple[int, float]] = {}
+        self.submissions = 0
+        self.snapshots = 0
+        self.loaded_at: Optional[float] = None
+
+    @staticmethod
+    def day_board(day: date) -> str:
+        return day.isoformat()
+
+    def _apply(self, user_id: int, score: int, achieved_at: float) -> List[str]:
+        """Учесть результат во всех таблицах (под блокировкой); вернуть улучшенные"""
+        day = self.day_board(date.fromtimestamp(achieved_at))
+        if day not in self.boards:
+            self.boards[day] = Board()
+            self._drop_old_days()
+        return [
+            name for name in (ALL_TIME, day)
+            if name in self.boards and self.boards[name].submit(user_id, score, achieved_at)
+        ]
+
+    def _drop_old_days(self):
+        oldest = self.day_board(date.today() - timedelta(days=DAYS_KEPT - 1))
+        for name in [name for name in self.boards if name != ALL_TIME and name < oldest]:
+            del self.boards[name]
+
+    def submit(self, user_id: int, score: int) -> Dict[str, Any]:
+        """Принять результат игрока и сообщить остальным воркерам"""
+        achieved_at = round(time.time(), 3)
+        with self._lock:
+            improved = self._apply(user_id, score, achieved_at)
+            for name in improved:
+                self._dirty[(name, user_id)] = (score, achieved_at)
+            self.submissions += 1
+        if improved:
+            events.publish(SCORES_CHANNEL, {"user_id": user_id, "score": score, "achieved_at": achieved_at})
+        return self.position(user_id)
+
+    def apply_remote(self, payload: Dict[str, Any]):
+        """Результат, принятый другим воркером (он же запишет его в БД)"""
+        with self._lock:
+            self._apply(payload["user_id"], payload["score"], payload["achieved_at"])
+
+    def position(self, user_id: int) -> Dict[str, Any]:
+        """Лучшие результаты и места игрока за все время и сегодня"""
+        today = self.day_board(date.today())
+        result = {}
+        with self._lock:
+            for label, name in (("all", ALL_TIME), ("today", today)):
+                board = self.boards.get(name)
+                key = board.best.get(user_id) if board else None
+                result[label] = {
+                    "score": -key[0] if key else None,
+                    "rank": board.rank(user_id) if board else None,
+                    "players": len(board.index) if board else 0,
+                }
+        return result
+
+    def top(self, board: str = ALL_TIME, limit: int = 10, offset: int = 0) -> List[Dict[str, Any]]:
+        with self._lock:
+            table = self.boards.get(board)
+            return table.entries(offset, limit) if table else []
+
+    def around(self, user_id: int, board: str = ALL_TIME, radius: int = 5) -> List[Dict[str, Any]]:
+        """Соседи игрока по таблице (radius выше и ниже)"""
+        with self._lock:
+            table = self.boards.get(board)
+            rank = table.rank(user_id) if table else None
+            if rank is None:
+                return []
+            start = max(rank - 1 - radius, 0)
+            return table.entries(start, rank - 1 - start + radius + 1)
+
+    # ================================
+    # Хранение в MySQL
+    # ================================
+
+    @staticmethod
+    def ensure_table():
+        db.execute_query(
+            """CREATE TABLE IF NOT EXISTS game_scores (
+                   board VARCHAR(10) NOT NULL,
+                   user_id INT NOT NULL,
+                   score INT NOT NULL,
+                   achieved_at DOUBLE NOT NULL,
+                   PRIMARY KEY (board, user_id)
+               )"""
+        )
+
+    def load(self) -> int:
+        """Загрузить таблицу за все время и последние дни из БД"""
+        self.ensure_table()
+        oldest = self.day_board(date.today() - timedelta(days=DAYS_KEPT - 1))
+        rows = db.execute_query(
+            "SELECT board, user_id, score, achieved_at FROM game_scores WHERE board = %s OR board >= %s",
+            (ALL_TIME, oldest),
+            fetch=True,
+        )
+        if rows is None:
+            return 0
+
+        boards: Dict[str, Board] = {ALL_TIME: Board()}
+        for row in rows:
+            board = boards.setdefault(row["board"], Board())
+            board.submit(row["user_id"], row["score"], row["achieved_at"])
+        with self._lock:
+            # Результаты, пришедшие во время загрузки, не теряем
+            for (name, user_id), (score, achieved_at) in self._dirty.items():
+                boards.setdefault(name, Board()).submit(user_id, score, achieved_at)
+            self.boards = boards
+            self.loaded_at = time.time()
+        logger.info("Таблица лидеров загружена", extra={"rows": len(rows), "boards": len(boards)})
+        return len(rows)
+
+    def snapshot(self) -> int:
+        """Записать в БД результаты, принятые с прошлого снимка"""
+        with self._lock:
+            dirty, self._dirty = self._dirty, {}
+        if not dirty:
+            return 0
+
+        rows = [(name, user_id, score, achieved_at) for (name, user_id), (score, achieved_at) in dirty.items()]
+        try:
+            with db.transaction() as cursor:
+                # achieved_at обновляется раньше score - сравнение идет со старым результатом
+                cursor.executemany(
+                    """INSERT INTO game_scores (board, user_id, score, achieved_at)
+                       VALUES (%s, %s, %s, %s)
+                       ON DUPLICATE KEY UPDATE
+                           achieved_at = IF(VALUES(score) > score, VALUES(achieved_at), achieved_at),
+                           score = GREATEST(score, VALUES(score))""",
+                    rows,
+                )
+        except Exception as e:
+            logger.error("Не удалось сохранить таблицу лидеров: %s", e)
+            with self._lock:
+                # Вернуть несохраненное, не затирая более свежие результаты
+                for item, value in dirty.items():
+                    self._dirty.setdefault(item, value)
+            return 0
+        self.snapshots += 1
+        return len(rows)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "boards": {name: len(board.index) for name, board in self.boards.items()},
+                "submissions": self.submissions,
+                "pending": len(self._dirty),
+                "snapshots": self.snapshots,
+                "loaded_at": self.loaded_at,
+            }
+
+
+def max_score_for(elapsed: float) -> int:
+    """Больше очков за elapsed секунд с начала игры набрать нельзя"""
+    played = elapsed - GAME_COUNTDOWN_SECONDS
+    if played < 0:
+        return 0
+    pairs = min(GAME_PAIRS, int(played // MIN_PAIR_SECONDS) + 1)
+    return min(MAX_SCORE, pairs * PAIR_POINTS)
+
+
+class GameSessions:
+    """Игры, начатые на сервере: у игрока одна текущая игра в общем бэкенде.
+
+    Новая игра заменяет прежнюю, номер игры одноразовый - результат
+    принимается один раз и только от того, кто ее начал.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    @staticmethod
+    def _key(user_id: int) -> str:
+        return f"{GAME_KEY_PREFIX}{user_id}"
+
+    def start(self, user_id: int) -> str:
+        game = secrets.token_urlsafe(16)
+        value = f"{game}:{time.time():.3f}".encode()
+        self.backend.set(self._key(user_id), value, GAME_SESSION_TTL)
+        return game
+
+    def finish(self, user_id: int, game: str, score: int) -> bool:
+        """Закрыть игру; False - игры нет, она чужая или очков слишком много"""
+        key = self._key(user_id)
+        raw = self.backend.get(key)
+        if raw is None or not game:
+            return False
+        current, started_at = raw.decode().split(":")
+        if not hmac.compare_digest(current, game):
+            return False
+        # Из двух одновременных отправок засчитывается одна
+        if not self.backend.delete(key):
+            return False
+        return score <= max_score_for(time.time() - float(started_at))
+
+
+def attach_usernames(entries: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Добавить имена и аватары игроков (один запрос по первичному ключу)"""
+    user_ids = sorted({entry["user_id"] for entry in entries})
+    if not user_ids:
+        return entries
+    placeholders = ", ".join(["%s"] * len(user_ids))
+    rows = db.execute_query(
+        f"SELECT id, username, avatar_url FROM users WHERE id IN ({placeholders})",
+        user_ids,
+        fetch=True,
+    ) or []
+    users = {row["id"]: row for row in rows}
+    for entry in entries:
+        user = users.get(entry["user_id"], {})
+        entry["username"] = user.get("username")
+        entry["avatar_url"] = user.get("avatar_url")
+    return entries
+
+
+leaderboard = Leaderboard()
+game_sessions = GameSessions(backend)
+
+# Результаты от других воркеров (свои уже учтены в submit)
+events.subscribe(SCORES_CHANNEL, leaderboard.apply_remote, skip_own=True)
@@ -0,0 +1,118 @@
+# lifecycle.py
+# Жизненный цикл приложения: прогрев перед приемом трафика и корректная остановка
+import asyncio
+import inspect
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Callable, Dict
+
+from logs import get_logger
+
+logger = get_logger("lifecycle")
+
+
+class AppState:
+    """Состояние процесса для проверок liveness/readiness"""
+
+    def __init__(self):
+        self.started = False
+        self.draining = False
+        self.started_at = None
+        self.warmup: Dict[str, Any] = {}
+
+
+state = AppState()
+
+# Хуки хранятся по имени, чтобы повторный create_app не дублировал их
+_startup_hooks: Dict[str, Callable] = {}
+_shutdown_hooks: Dict[str, Callable] = {}
+_periodic: Dict[str, tuple] = {}
+_tasks: Dict[str, asyncio.Task] = {}
+
+
+def on_startup(name: str, func: Callable):
+    """Зарегистрировать прогрев, который выполнится до приема трафика"""
+    _startup_hooks[name] = func
+
+
+def on_shutdown(name: str, func: Callable):
+    """Зарегистрировать действие при остановке процесса"""
+    _shutdown_hooks[name] = func
+
+
+def every(name: str, interval: float, func: Callable):
+    """Зарегистрировать периодическую задачу процесса (стартует после прогрева)"""
+    _periodic[name] = (interval, func)
+
+
+async def _call(func: Callable):
+    """Вызвать хук: корутину - напрямую, обычную функцию - в пуле потоков"""
+    if inspect.iscoroutinefunction(func):
+        return await func()
+    return await asyncio.to_thread(func)
+
+
+async def run_startup():
+    """Выполнить все хуки прогрева; ошибка одного не останавливает остальные"""
+    for name, func in list(_startup_hooks.items()):
+        start = time.perf_counter()
+        try:
+            result = await _call(func)
+            state.warmup[name] = {
+                "ok": result is not False,
+                "seconds": round(time.perf_counter() - start, 3),
+            }
+        except Exception as e:
+            logger.exception("Ошибка прогрева '%s': %s", name, e)
+            state.warmup[name] = {"ok": False, "error": str(e)}
+
+
+async def _run_periodic(name: str, interval: float, func: Callable):
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await _call(func)
+        except Exception as e:
+            logger.exception("Ошибка периодической задачи '%s': %s", name, e)
+
+
+def start_periodic():
+    for name, (interval, func) in _periodic.items():
+        if name not in _tasks:
+            _tasks[name] = asyncio.create_task(_run_periodic(name, interval, func))
+
+
+async def stop_periodic():
+    tasks = list(_tasks.values())
+    _tasks.clear()
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def run_shutdown():
+    await stop_periodic()
+    for name, func in list(_shutdown_hooks.items()):
+        try:
+            await _call(func)
+        except Exception as e:
+            logger.exception("Ошибка при остановке '%s': %s", name, e)
+
+
+def begin_drain():
+    """Перестать считаться готовым: балансировщик уберет процесс из ротации"""
+    state.draining = True
+
+
+@asynccontextmanager
+async def lifespan(app):
+    """Lifespan для FastAPI: прогрев -> работа -> остановка"""
+    await run_startup()
+    start_periodic()
+    state.started = True
+    state.started_at = time.time()
+    try:
+        yield
+    finally:
+        state.draining = True
+        await run_shutdown()
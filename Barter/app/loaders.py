@@ -0,0 +1,237 @@
+# loaders.py
+# Загрузчики данных страниц. Вместо цепочки последовательных запросов:
+# сводные данные - одним запросом (подзапросы в SELECT), списки - параллельно
+# на соединениях пула, пока цикл событий обслуживает другие запросы.
+import asyncio
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+from database import db
+from services import (
+    OfferService, RatingService, MessageService, UserService,
+    CONVERSATION_PAGE, RATING_STATS_COLUMNS, USER_COLUMNS, offer_cache, _copy_result,
+)
+
+
+async def run_parallel(*calls: Callable[[], Any]) -> List[Any]:
+    """Выполнить синхронные загрузки одновременно в пуле потоков"""
+    return list(await asyncio.gather(*(asyncio.to_thread(call) for call in calls)))
+
+
+# ================================
+# Профиль пользователя
+# ================================
+
+@dataclass
+class ProfileData:
+    """Все данные страниц /profile и /user/{id}"""
+
+    user: Dict[str, Any]
+    offers: List[Dict[str, Any]] = field(default_factory=list)
+    offers_count: int = 0
+    successful_exchanges: int = 0
+    rating_stats: Dict[str, Any] = field(default_factory=lambda: RatingService.stats_from_row(None))
+    recent_reviews: List[Dict[str, Any]] = field(default_factory=list)
+    # Оценка, которую зритель уже поставил этому пользователю
+    viewer_rating: Optional[int] = None
+    viewer_comment: Optional[str] = None
+
+    @property
+    def has_rated(self) -> bool:
+        return self.viewer_rating is not None
+
+
+# Пользователь, счетчики, агрегаты рейтинга и оценка зрителя - одна строка
+PROFILE_SUMMARY_QUERY = f"""
+    SELECT
+        {", ".join("u." + column for column in USER_COLUMNS)},
+        (SELECT COUNT(*) FROM offers
+           WHERE user_id = u.id AND is_active = TRUE) AS _offers_count,
+        COALESCE((SELECT completed FROM user_exchange_counts
+           WHERE user_id = u.id), 0) AS _successful_exchanges,
+        v.rating AS _viewer_rating,
+        v.comment AS _viewer_comment,
+        r.*
+    FROM users u
+    CROSS JOIN (
+        SELECT {RATING_STATS_COLUMNS}
+        FROM ratings
+        WHERE target_user_id = %s
+    ) r
+    LEFT JOIN ratings v ON v.target_user_id = u.id AND v.rater_user_id = %s
+    WHERE u.id = %s
+"""
+
+_RATING_FIELDS = (
+    "avg_rating", "total_ratings", "five_star", "four_star", "three_star", "two_star", "one_star",
+)
+
+
+def load_profile_summary(user_id: int, viewer_id: Optional[int] = None) -> Optional[ProfileData]:
+    """Пользователь со счетчиками и рейтингом за один запрос (без списков)"""
+    rows = db.execute_query(PROFILE_SUMMARY_QUERY, (user_id, viewer_id or 0, user_id), fetch=True)
+    if not rows:
+        return None
+
+    row = dict(rows[0])
+    rating_row = {name: row.pop(name) for name in _RATING_FIELDS}
+    return ProfileData(
+        user={key: value for key, value in row.items() if not key.startswith("_")},
+        offers_count=int(row["_offers_count"]),
+        successful_exchanges=int(row["_successful_exchanges"]),
+        rating_stats=RatingService.stats_from_row(rating_row),
+        viewer_rating=row["_viewer_rating"],
+        viewer_comment=row["_viewer_comment"],
+    )
+
+
+def _profile_calls(user_id: int, viewer_id: Optional[int], offers_limit: Optional[int], reviews_limit: int):
+    return (
+        lambda: load_profile_summary(user_id, viewer_id),
+        lambda: OfferService.get_user_offers(user_id, offers_limit),
+        lambda: RatingService.get_recent_reviews(user_id, reviews_limit) if reviews_limit else [],
+    )
+
+
+def _assemble_profile(summary: Optional[ProfileData], offers, reviews) -> Optional[ProfileData]:
+    if summary is None:
+        return None
+
+    summary.offers = offers
+    summary.recent_reviews = reviews
+    return summary
+
+
+async def load_profile(
+    user_id: int,
+    viewer_id: Optional[int] = None,
+    offers_limit: Optional[int] = None,
+    reviews_limit: int = 5,
+) -> Optional[ProfileData]:
+    """Профиль целиком: сводка, объявления и отзывы - три запроса одновременно"""
+    return _assemble_profile(
+        *await run_parallel(*_profile_calls(user_id, viewer_id, offers_limit, reviews_limit))
+    )
+
+
+def load_profile_sync(
+    user_id: int,
+    viewer_id: Optional[int] = None,
+    offers_limit: Optional[int] = None,
+    reviews_limit: int = 5,
+) -> Optional[ProfileData]:
+    """То же, что load_profile, последовательно - для кода вне цикла событий (снимки страниц)"""
+    return _assemble_profile(
+        *(call() for call in _profile_calls(user_id, viewer_id, offers_limit, reviews_limit))
+    )
+
+
+# ================================
+# Рейтинги авторов для списков
+# ================================
+
+def load_rating_summaries(user_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+    """Средняя оценка и число оценок сразу для многих пользователей - один GROUP BY"""
+    user_ids = sorted({user_id for user_id in user_ids if user_id})
+    summaries = {user_id: {"avg_rating": 0, "total_ratings": 0} for user_id in user_ids}
+    if not user_ids:
+        return summaries
+
+    placeholders = ", ".join(["%s"] * len(user_ids))
+    rows = db.execute_query(
+        f"""SELECT target_user_id, AVG(rating) AS avg_rating, COUNT(*) AS total_ratings
+            FROM ratings
+            WHERE target_user_id IN ({placeholders})
+            GROUP BY target_user_id""",
+        user_ids,
+        fetch=True,
+    ) or []
+    for row in rows:
+        summaries[row["target_user_id"]] = {
+            "avg_rating": round(float(row["avg_rating"]), 1),
+            "total_ratings": int(row["total_ratings"]),
+        }
+    return summaries
+
+
+# ================================
+# Карточка объявления
+# ================================
+
+@dataclass
+class OfferCardData:
+    """Объявление с автором и его рейтингом"""
+
+    offer: Dict[str, Any]
+    author_rating: float = 0
+    author_total_ratings: int = 0
+
+
+OFFER_CARD_QUERY = """
+    SELECT o.*, u.username, u.email, u.phone, u.avatar_url,
+        (SELECT COALESCE(AVG(rating), 0) FROM ratings WHERE target_user_id = o.user_id) AS _author_rating,
+        (SELECT COUNT(*) FROM ratings WHERE target_user_id = o.user_id) AS _author_total_ratings
+    FROM offers o
+    JOIN users u ON o.user_id = u.id
+    WHERE o.id = %s AND o.is_active = TRUE
+"""
+
+
+def load_offer_card(offer_id: int) -> Optional[OfferCardData]:
+    """Объявление, автор и рейтинг автора - один запрос, результат кешируется.
+
+    Кеш сбрасывается при снятии объявления, изменении профиля автора
+    и новой оценке автору (тег ("user", user_id)).
+    """
+    def load():
+        rows = db.execute_query(OFFER_CARD_QUERY, (offer_id,), fetch=True)
+        return rows[0] if rows else None
+
+    row = _copy_result(offer_cache.get_or_load(
+        ("card", offer_id), load, tags=lambda row: [("user", row["user_id"])]
+    ))
+    if not row:
+        return None
+
+    return OfferCardData(
+        offer={key: value for key, value in row.items() if not key.startswith("_")},
+        author_rating=round(float(row["_author_rating"]), 1),
+        author_total_ratings=int(row["_author_total_ratings"]),
+    )
+
+
+# ================================
+# Шапка диалога
+# ================================
+
+@dataclass
+class DialogData:
+    """Собеседник, сообщения и их общее число"""
+
+    other_user: Dict[str, Any]
+    messages: List[Dict[str, Any]] = field(default_factory=list)
+    total_messages: int = 0
+
+
+def count_dialog_messages(user_id: int, other_user_id: int) -> int:
+    """Число сообщений переписки вместе с архивом"""
+    return (
+        MessageService.count_conversation(user_id, other_user_id)
+        + MessageService.count_conversation(user_id, other_user_id, table="messages_archive")
+    )
+
+
+async def load_dialog(user_id: int, other_user_id: int, page: int = 1) -> Optional[DialogData]:
+    """Собеседник (из кеша), переписка и счетчик - одновременно.
+
+    page=1 - последние сообщения, следующие страницы - более ранние.
+    """
+    offset = (page - 1) * CONVERSATION_PAGE
+    other_user, messages, total = await run_parallel(
+        lambda: UserService.get_user_by_id(other_user_id),
+        lambda: MessageService.get_conversation(user_id, other_user_id, offset=offset),
+        lambda: count_dialog_messages(user_id, other_user_id),
+    )
+    if not other_user:
+        return None
+    return DialogData(other_user=other_user, messages=messages, total_messages=total)
@@ -0,0 +1,193 @@
+# logs.py
+# Логирование без блокировок в обработчиках: записи кладутся в очередь,
+# а форматирует и пишет их в stdout отдельный поток (QueueListener).
+# Формат - JSON-строка на запись с request_id; DEBUG-события можно сэмплировать.
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import time
+import uuid
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Optional
+
+# ID текущего HTTP-запроса (из X-Request-ID или сгенерированный)
+request_id = ContextVar("request_id", default=None)
+
+LOG_LEVEL = os.environ.get("BARTER_LOG_LEVEL", "info").upper()
+# json - для сборщиков логов, text - для чтения глазами при разработке
+LOG_FORMAT = os.environ.get("BARTER_LOG_FORMAT", "json")
+# Доля DEBUG-записей, которые попадают в лог (по записи на SQL-запрос - это много)
+DEBUG_SAMPLE_RATE = float(os.environ.get("BARTER_LOG_DEBUG_SAMPLE", "1"))
+# Если поток записи не успевает, новые записи отбрасываются, а не блокируют запрос
+QUEUE_SIZE = 10000
+
+# Стандартные поля LogRecord; все остальное пришло через extra= и попадает в JSON
+_RECORD_FIELDS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+class ContextFilter(logging.Filter):
+    """Добавить request_id к записи (выполняется в потоке, где пишется лог)"""
+
+    def filter(self, record):
+        record.request_id = request_id.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Пропускать только долю DEBUG-записей; записи уровнем выше - всегда"""
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        if record.levelno > logging.DEBUG or self.rate >= 1:
+            return True
+        return random.random() < self.rate
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        data = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "msg": record.getMessage(),
+            "pid": record.process,
+        }
+        if getattr(record, "request_id", None):
+            data["request_id"] = record.request_id
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_FIELDS and key != "request_id":
+                data[key] = value
+        if record.exc_info:
+            data["exc"] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s")
+
+    def format(self, record):
+        text = super().format(record)
+        extra = {k: v for k, v in record.__dict__.items() if k not in _RECORD_FIELDS and k != "request_id"}
+        return f"{text} {extra}" if extra else text
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler, который не форматирует запись в потоке запроса и не ждет очередь"""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Очередь внутри процесса: запись передается как есть, форматирует поток записи
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class _Logging:
+    handler: Optional[NonBlockingQueueHandler] = None
+    listener: Optional[logging.handlers.QueueListener] = None
+
+
+def setup_logging(level: str = LOG_LEVEL, fmt: str = LOG_FORMAT, sample_rate: float = DEBUG_SAMPLE_RATE):
+    """Настроить логгер "barter" (повторный вызов меняет только уровень)"""
+    root = logging.getLogger("barter")
+    root.setLevel(level.upper())
+    if _Logging.handler is not None:
+        return root
+
+    log_queue = queue.Queue(QUEUE_SIZE)
+    handler = NonBlockingQueueHandler(log_queue)
+    handler.addFilter(ContextFilter())
+    handler.addFilter(SamplingFilter(sample_rate))
+
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(JsonFormatter() if fmt == "json" else TextFormatter())
+    listener = logging.handlers.QueueListener(log_queue, output)
+    listener.start()
+    atexit.register(listener.stop)
+
+    root.addHandler(handler)
+    root.propagate = False
+    _Logging.handler, _Logging.listener = handler, listener
+    return root
+
+
+def get_logger(name: str) -> logging.Logger:
+    """Логгер модуля: barter.<name>"""
+    return logging.getLogger(f"barter.{name}")
+
+
+def stats():
+    handler = _Logging.handler
+    return {
+        "level": logging.getLevelName(logging.getLogger("barter").level),
+        "queued": handler.queue.qsize() if handler else 0,
+        "dropped": handler.dropped if handler else 0,
+    }
+
+
+access_logger = get_logger("access")
+
+
+class RequestLogMiddleware:
+    """ASGI middleware: request_id на время запроса, заголовок X-Request-ID и access-лог"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        incoming = None
+        for key, value in scope.get("headers", ()):
+            if key == b"x-request-id":
+                incoming = value.decode("latin-1")[:64]
+                break
+        rid = incoming or uuid.uuid4().hex[:16]
+        token = request_id.set(rid)
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_id(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message = dict(message, headers=list(message.get("headers", [])) + [(b"x-request-id", rid.encode())])
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            if access_logger.isEnabledFor(logging.INFO):
+                access_logger.info(
+                    "%s %s %s", scope["method"], scope["path"], status,
+                    extra={
+                        "method": scope["method"],
+                        "path": scope["path"],
+                        "status": status,
+                        "duration_ms": round((time.perf_counter() - start) * 1000, 2),
+                        "client": scope["client"][0] if scope.get("client") else None,
+                    },
+                )
+            request_id.reset(token)
+
+
+setup_logging()
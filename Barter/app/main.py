@@ -1,10 +1,120 @@
 # main.py
 from routes import create_app
+import argparse
+import importlib.util
+import os
+import threading
 import uvicorn
 
-# Создание приложения
-app = create_app()
+import lifecycle
+from logs import get_logger, setup_logging
+
+logger = get_logger("main")
+
+
+def __getattr__(name):
+    """main.app создается при первом обращении (uvicorn main:app).
+
+    run() сам приложение на уровне модуля не создает: воркеры собирают его
+    через фабрику routes:create_app ровно один раз, а родительский процесс
+    (который только раздает сокет) не собирает вовсе.
+    """
+    if name == "app":
+        global app
+        app = create_app()
+        return app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+class DrainingServer(uvicorn.Server):
+    """Сервер uvicorn с паузой перед остановкой.
+
+    По первому SIGTERM процесс перестает быть готовым (/health/ready -> 503),
+    ждет drain_seconds, чтобы балансировщик убрал его из ротации, и только
+    потом начинает штатную остановку: новые соединения не принимаются,
+    текущие запросы дорабатывают. Повторный сигнал останавливает сразу.
+    """
+
+    drain_seconds = 0.0
+
+    def handle_exit(self, sig, frame):
+        if self.drain_seconds > 0 and not lifecycle.state.draining:
+            lifecycle.begin_drain()
+            logger.warning("Получен сигнал %s: вывод из ротации на %s с", sig, self.drain_seconds)
+            timer = threading.Timer(self.drain_seconds, super().handle_exit, (sig, frame))
+            timer.daemon = True
+            timer.start()
+            return
+        super().handle_exit(sig, frame)
+
+
+def detect_impl():
+    """Выбрать uvloop/httptools, если они установлены"""
+    loop = "uvloop" if importlib.util.find_spec("uvloop") else "asyncio"
+    http = "httptools" if importlib.util.find_spec("httptools") else "h11"
+    return loop, http
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Запуск Swap Space")
+    parser.add_argument("--host", default=os.environ.get("BARTER_HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(os.environ.get("BARTER_PORT", "8000")))
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("BARTER_WORKERS", "1")))
+    parser.add_argument(
+        "--drain", type=float, default=float(os.environ.get("BARTER_DRAIN_SECONDS", "0")),
+        help="секунд ожидания после SIGTERM до остановки приема соединений",
+    )
+    parser.add_argument(
+        "--graceful-timeout", type=int,
+        default=int(os.environ.get("BARTER_GRACEFUL_TIMEOUT", "30")),
+        help="сколько ждать завершения текущих запросов",
+    )
+    parser.add_argument("--log-level", default=os.environ.get("BARTER_LOG_LEVEL", "info"))
+    return parser.parse_args(argv)
+
+
+def run(argv=None):
+    """Запуск: один процесс или несколько воркеров на общем сокете"""
+    args = parse_args(argv)
+    # Воркеры - новые процессы: уровень логирования передается им через окружение
+    os.environ["BARTER_LOG_LEVEL"] = args.log_level
+    setup_logging(args.log_level)
+    loop, http = detect_impl()
+    logger.info(
+        "Запуск на %s:%s", args.host, args.port,
+        extra={"workers": args.workers, "loop": loop, "http": http},
+    )
+
+    config = uvicorn.Config(
+        # Воркер импортирует фабрику и вызывает ее сам; один процесс - приложение сразу
+        "routes:create_app" if args.workers > 1 else create_app(),
+        factory=args.workers > 1,
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        loop=loop,
+        http=http,
+        log_level=args.log_level,
+        # Access-лог пишет RequestLogMiddleware (JSON с request_id)
+        access_log=False,
+        # Параметр поддерживается uvicorn 0.24.0 из requirements.txt
+        timeout_graceful_shutdown=args.graceful_timeout,
+        proxy_headers=True,
+    )
+    server = DrainingServer(config=config)
+    # Атрибут экземпляра: сервер передается воркерам вместе со своим состоянием
+    server.drain_seconds = args.drain
+
+    if args.workers > 1:
+        from uvicorn.supervisors import Multiprocess
+
+        # Сокет открывается один раз и наследуется воркерами
+        sock = config.bind_socket()
+        Multiprocess(config, target=server.run, sockets=[sock]).run()
+    else:
+        server.run()
+
 
 # Запуск приложения
 if __name__ == "__main__":
-    uvicorn.run(app, host="127.0.0.1", port=8000)
\ No newline at end of file
+    run()
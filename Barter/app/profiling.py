@@ -0,0 +1,310 @@
+# profiling.py
+# Профилирование отдельных запросов по требованию: админский заголовок
+# X-Profile: <BARTER_PROFILE_TOKEN> или доля случайных запросов (BARTER_PROFILE_SAMPLE).
+# Для запроса пишутся стеки в collapsed-формате (flamegraph.pl, speedscope),
+# таймлайн SQL-запросов, рендера шаблонов и сериализации JSON (формат Chrome
+# trace - chrome://tracing, Perfetto) и сводка по маршрутам.
+# Если ни токен, ни доля не заданы, middleware и обертки не устанавливаются вовсе.
+import asyncio
+import hmac
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+from typing import Any, Dict
+
+from database import query_log
+from logs import get_logger, request_id
+
+logger = get_logger("profiling")
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+PROFILE_TOKEN = os.environ.get("BARTER_PROFILE_TOKEN", "")
+SAMPLE_RATE = float(os.environ.get("BARTER_PROFILE_SAMPLE", "0"))
+# Случайная выборка только для подходящих путей, например ^/(offer|messages)
+ROUTES_RE = re.compile(os.environ.get("BARTER_PROFILE_ROUTES", ""))
+PROFILE_DIR = os.environ.get("BARTER_PROFILE_DIR", os.path.join(BASE_DIR, "profiles"))
+# Период снятия стека. Пока обработчик занят CPU, сэмплер получает GIL не чаще
+# sys.getswitchinterval() (5 мс), так что меньшие значения мало что дают
+INTERVAL = float(os.environ.get("BARTER_PROFILE_INTERVAL_MS", "5")) / 1000
+# Сколько самых "горячих" функций хранить в сводке маршрута
+TOP_FRAMES = 15
+
+HEADER = b"x-profile"
+
+# Таймлайн профилируемого запроса (или None - запрос не профилируется)
+timeline = ContextVar("profile_timeline", default=None)
+
+
+def enabled() -> bool:
+    return bool(PROFILE_TOKEN) or SAMPLE_RATE > 0
+
+
+class Timeline(list):
+    """События запроса: (категория, имя, начало, длительность) в секундах от старта.
+
+    Передается в database.query_log - база добавляет (query, params, seconds)
+    по завершении запроса, начало вычисляется из момента добавления.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.start = time.perf_counter()
+
+    def append(self, item):
+        if len(item) == 3:
+            query, _, seconds = item
+            end = time.perf_counter() - self.start
+            item = ("db", " ".join(str(query).split())[:200], end - seconds, seconds)
+        super().append(item)
+
+    def add(self, category: str, name: str, started: float):
+        now = time.perf_counter()
+        super().append((category, name, started - self.start, now - started))
+
+    def totals(self) -> Dict[str, Dict[str, float]]:
+        result: Dict[str, Dict[str, float]] = {}
+        for category, _, _, seconds in self:
+            total = result.setdefault(category, {"count": 0, "ms": 0.0})
+            total["count"] += 1
+            total["ms"] += seconds * 1000
+        return result
+
+
+class StackSampler(threading.Thread):
+    """Снимает стек потока цикла событий каждые INTERVAL секунд.
+
+    В стеки попадают и параллельные запросы на том же цикле событий;
+    синхронная работа в пуле потоков видна только через таймлайн.
+    """
+
+    def __init__(self, thread_id: int, interval: float = INTERVAL):
+        super().__init__(name="profile-sampler", daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop_event = threading.Event()
+
+    def run(self):
+        own_file = __file__
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                if code.co_filename != own_file:
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+                self.samples += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+class RouteSummary:
+    """Накопленная статистика профилей по маршрутам (в пределах процесса)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.routes: Dict[str, Dict[str, Any]] = {}
+
+    def add(self, route: str, wall_ms: float, totals: Dict[str, Dict[str, float]], stacks: Counter):
+        with self._lock:
+            summary = self.routes.setdefault(route, {
+                "profiles": 0, "wall_ms": 0.0, "max_ms": 0.0, "categories": {}, "self_samples": Counter(),
+            })
+            summary["profiles"] += 1
+            summary["wall_ms"] += wall_ms
+            summary["max_ms"] = max(summary["max_ms"], wall_ms)
+            for category, total in totals.items():
+                acc = summary["categories"].setdefault(category, {"count": 0, "ms": 0.0})
+                acc["count"] += total["count"]
+                acc["ms"] += total["ms"]
+            for stack, count in stacks.items():
+                summary["self_samples"][stack.rsplit(";", 1)[-1]] += count
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            result = {}
+            for route, summary in self.routes.items():
+                profiles = summary["profiles"]
+                result[route] = {
+                    "profiles": profiles,
+                    "avg_ms": round(summary["wall_ms"] / profiles, 2),
+                    "max_ms": round(summary["max_ms"], 2),
+                    "avg_by_category": {
+                        category: {
+                            "count": round(acc["count"] / profiles, 1),
+                            "ms": round(acc["ms"] / profiles, 2),
+                        }
+                        for category, acc in summary["categories"].items()
+                    },
+                    "top_frames": summary["self_samples"].most_common(TOP_FRAMES),
+                }
+            return result
+
+
+summary = RouteSummary()
+# Один профиль за раз: сэмплер и таймлайн привязаны к потоку цикла событий
+_busy = threading.Lock()
+
+
+def is_admin(scope) -> bool:
+    """Запрос с правильным X-Profile (токен сравнивается за постоянное время)"""
+    if not PROFILE_TOKEN:
+        return False
+    for key, value in scope.get("headers", ()):
+        if key == HEADER:
+            return hmac.compare_digest(value.decode("latin-1"), PROFILE_TOKEN)
+    return False
+
+
+def route_name(scope) -> str:
+    route = scope.get("route")
+    if route is not None and getattr(route, "path", None):
+        return f"{scope['method']} {route.path}"
+    path = re.sub(r"/\d+", "/{id}", scope["path"])
+    return f"{scope['method']} {path}"
+
+
+def _slug(text: str) -> str:
+    return re.sub(r"[^A-Za-z0-9]+", "_", text).strip("_")[:60] or "root"
+
+
+def write_profile(profile_id: str, route: str, wall_ms: float, events: Timeline, sampler: StackSampler):
+    """Файлы профиля: .folded (стеки), .trace.json (таймлайн) и summary.json"""
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    base = os.path.join(PROFILE_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-{_slug(route)}-{_slug(profile_id)}")
+
+    with open(base + ".folded", "w", encoding="utf-8") as f:
+        for stack, count in sampler.stacks.most_common():
+            f.write(f"{stack} {count}\n")
+
+    trace = [{
+        "name": route, "cat": "request", "ph": "X", "ts": 0, "dur": round(wall_ms * 1000), "pid": 1, "tid": 1,
+    }]
+    for category, name, started, seconds in events:
+        trace.append({
+            "name": name, "cat": category, "ph": "X",
+            "ts": round(started * 1e6), "dur": round(seconds * 1e6), "pid": 1, "tid": 2 if category == "db" else 1,
+        })
+    with open(base + ".trace.json", "w", encoding="utf-8") as f:
+        json.dump({"traceEvents": trace, "displayTimeUnit": "ms"}, f, ensure_ascii=False)
+
+    with open(os.path.join(PROFILE_DIR, "summary.json"), "w", encoding="utf-8") as f:
+        json.dump(summary.snapshot(), f, ensure_ascii=False, indent=2)
+    return base
+
+
+class ProfilingMiddleware:
+    """ASGI middleware: профиль запроса с X-Profile или попавшего в выборку.
+
+    В ответ добавляется X-Profile-Id; файлы - в BARTER_PROFILE_DIR.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    def _wanted(self, scope) -> bool:
+        if is_admin(scope):
+            return True
+        return SAMPLE_RATE > 0 and ROUTES_RE.search(scope["path"]) is not None and random.random() < SAMPLE_RATE
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self._wanted(scope) or not _busy.acquire(blocking=False):
+            await self.app(scope, receive, send)
+            return
+
+        profile_id = request_id.get() or f"{random.getrandbits(48):012x}"
+        events = Timeline()
+        timeline_token = timeline.set(events)
+        log_token = query_log.set(events)
+        sampler = StackSampler(threading.get_ident())
+        sampler.start()
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                message = dict(message, headers=list(message.get("headers", [])) + [
+                    (b"x-profile-id", profile_id.encode()),
+                ])
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            sampler.stop()
+            wall_ms = (time.perf_counter() - events.start) * 1000
+            query_log.reset(log_token)
+            timeline.reset(timeline_token)
+            _busy.release()
+
+            route = route_name(scope)
+            totals = events.totals()
+            summary.add(route, wall_ms, totals, sampler.stacks)
+            try:
+                path = await asyncio.to_thread(write_profile, profile_id, route, wall_ms, events, sampler)
+                logger.info(
+                    "Профиль запроса %s", route,
+                    extra={"profile": path, "wall_ms": round(wall_ms, 2), "samples": sampler.samples, "totals": totals},
+                )
+            except OSError as e:
+                logger.error("Не удалось записать профиль: %s", e)
+
+
+def instrument_templates(env):
+    """Отмечать в таймлайне рендер шаблонов (устанавливается, только если профилирование включено)"""
+    base_class = env.template_class
+
+    class TimedTemplate(base_class):
+        def render(self, *args, **kwargs):
+            events = timeline.get()
+            if events is None:
+                return super().render(*args, **kwargs)
+            started = time.perf_counter()
+            try:
+                return super().render(*args, **kwargs)
+            finally:
+                events.add("template", self.name or "<string>", started)
+
+    env.template_class = TimedTemplate
+
+
+def instrument_json():
+    """Отмечать в таймлайне сериализацию JSONResponse (только при включенном профилировании)"""
+    from starlette.responses import JSONResponse
+
+    original = JSONResponse.render
+    if getattr(original, "_profiled", False):
+        return
+
+    def render(self, content):
+        events = timeline.get()
+        if events is None:
+            return original(self, content)
+        started = time.perf_counter()
+        try:
+            return original(self, content)
+        finally:
+            events.add("serialize", type(self).__name__, started)
+
+    render._profiled = True
+    JSONResponse.render = render
+
+
+def stats() -> Dict[str, Any]:
+    return {
+        "enabled": enabled(),
+        "sample_rate": SAMPLE_RATE,
+        "profile_dir": PROFILE_DIR,
+        "routes": summary.snapshot(),
+    }
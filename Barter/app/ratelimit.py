@@ -0,0 +1,211 @@
+# ratelimit.py
+# Защита MySQL от "штормов" опроса: token bucket на клиента и класс маршрута,
+# плюс перевод отказов ограничителя БД (DatabaseOverloaded) в 429 Retry-After.
+import json
+import math
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from starlette.requests import HTTPConnection
+
+from database import db, overload_log, DatabaseOverloaded
+from services import AuthService
+from logs import get_logger
+
+logger = get_logger("ratelimit")
+
+# Лимиты по умолчанию: (запросов в секунду, размер всплеска).
+# Переопределяются переменными окружения BARTER_RATE_<КЛАСС>="rate:burst"
+DEFAULT_LIMITS = {
+    # Опрос новых сообщений и счетчика - несколько открытых вкладок
+    "poll": (1.0, 20),
+    # Поиск пользователей на каждое нажатие клавиши
+    "search": (3.0, 15),
+    # Любые POST: вход, регистрация, сообщения, объявления
+    "write": (1.0, 20),
+    "default": (10.0, 60),
+}
+
+# Классы маршрутов проверяются по порядку, первый подходящий выигрывает
+ROUTE_CLASSES: List[Tuple[str, Optional[set], re.Pattern]] = [
+    ("poll", None, re.compile(r"^/messages/\d+/new$|^/api/unread_count$")),
+    ("search", None, re.compile(r"^/api/search_users$")),
+    ("write", {"POST", "PUT", "PATCH", "DELETE"}, re.compile(r"")),
+]
+
+# Что не ограничиваем: статика и проверки балансировщика
+EXEMPT_RE = re.compile(r"^/(static|health)/")
+
+# Сколько клиентов помнить (самые давние вытесняются)
+MAX_CLIENTS = 100_000
+
+# Сколько советовать подождать, если отказал ограничитель БД
+OVERLOAD_RETRY_AFTER = 1
+
+
+def _parse_limit(value: str, default: Tuple[float, int]) -> Tuple[float, int]:
+    try:
+        rate, burst = value.split(":")
+        return float(rate), int(burst)
+    except ValueError:
+        logger.warning("Некорректный лимит '%s', используется %s", value, default)
+        return default
+
+
+def load_limits() -> Dict[str, Tuple[float, int]]:
+    limits = {}
+    for name, default in DEFAULT_LIMITS.items():
+        value = os.environ.get(f"BARTER_RATE_{name.upper()}")
+        limits[name] = _parse_limit(value, default) if value else default
+    return limits
+
+
+def route_class(method: str, path: str) -> Optional[str]:
+    """Класс маршрута для лимита; None - запрос не ограничивается"""
+    if EXEMPT_RE.match(path):
+        return None
+    for name, methods, pattern in ROUTE_CLASSES:
+        if (methods is None or method in methods) and pattern.match(path):
+            return name
+    return "default"
+
+
+class RateLimiter:
+    """Token bucket на пару (класс маршрута, клиент).
+
+    Корзины хранятся в LRU-словаре: пара чисел на клиента, без фоновой очистки.
+    Лимиты действуют в пределах процесса (воркера).
+    """
+
+    def __init__(self, limits: Dict[str, Tuple[float, int]], max_clients: int = MAX_CLIENTS):
+        self.limits = limits
+        self.max_clients = max_clients
+        self._buckets: "OrderedDict[tuple, list]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.allowed = {name: 0 for name in limits}
+        self.limited = {name: 0 for name in limits}
+
+    def hit(self, name: str, client: str) -> float:
+        """Списать токен; 0 - запрос разрешен, иначе через сколько секунд повторить"""
+        rate, burst = self.limits[name]
+        key = (name, client)
+        now = time.monotonic()
+
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = [float(burst), now]
+                self._buckets[key] = bucket
+                if len(self._buckets) > self.max_clients:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(key)
+                bucket[0] = min(burst, bucket[0] + (now - bucket[1]) * rate)
+                bucket[1] = now
+
+            if bucket[0] >= 1:
+                bucket[0] -= 1
+                self.allowed[name] += 1
+                return 0.0
+
+            self.limited[name] += 1
+            return (1 - bucket[0]) / rate
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "clients": len(self._buckets),
+                "limits": {name: {"rate": rate, "burst": burst} for name, (rate, burst) in self.limits.items()},
+                "allowed": dict(self.allowed),
+                "limited": dict(self.limited),
+            }
+
+
+limiter = RateLimiter(load_limits())
+
+
+def client_key(connection: HTTPConnection) -> str:
+    """Вошедший пользователь - по ID из подписанной cookie (без БД), иначе по IP"""
+    token = connection.cookies.get("session")
+    if token:
+        user_id = AuthService.verify_token(token)
+        if user_id:
+            return f"user:{user_id}"
+    return f"ip:{connection.client.host if connection.client else 'unknown'}"
+
+
+async def _reject(send, retry_after: float, message: str):
+    body = json.dumps({"success": False, "message": message}, ensure_ascii=False).encode()
+    await send({
+        "type": "http.response.start",
+        "status": 429,
+        "headers": [
+            (b"content-type", b"application/json; charset=utf-8"),
+            (b"content-length", str(len(body)).encode()),
+            (b"retry-after", str(max(1, math.ceil(retry_after))).encode()),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+class LoadSheddingMiddleware:
+    """ASGI middleware: лимит частоты на клиента и 429 при перегрузке БД.
+
+    Если ограничитель БД отказал внутри обработчика, ответ обработчика
+    (даже страница ошибки) подменяется на 429 с Retry-After, пока заголовки
+    еще не отправлены.
+    """
+
+    def __init__(self, app, enabled: Optional[bool] = None):
+        self.app = app
+        if enabled is None:
+            enabled = os.environ.get("BARTER_RATE_LIMIT", "1") != "0"
+        self.enabled = enabled
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        if self.enabled:
+            name = route_class(scope["method"], scope["path"])
+            if name is not None:
+                retry_after = limiter.hit(name, client_key(HTTPConnection(scope)))
+                if retry_after:
+                    await _reject(send, retry_after, "Слишком много запросов, попробуйте позже")
+                    return
+
+        overloads: List[str] = []
+        token = overload_log.set(overloads)
+        started = False
+        replaced = False
+
+        async def guarded_send(message):
+            nonlocal started, replaced
+            if replaced:
+                return
+            if message["type"] == "http.response.start":
+                if overloads:
+                    replaced = True
+                    await _reject(send, OVERLOAD_RETRY_AFTER, "Сервер перегружен, попробуйте позже")
+                    return
+                started = True
+            await send(message)
+
+        try:
+            await self.app(scope, receive, guarded_send)
+        except DatabaseOverloaded:
+            if started:
+                raise
+            if not replaced:
+                await _reject(send, OVERLOAD_RETRY_AFTER, "Сервер перегружен, попробуйте позже")
+        finally:
+            overload_log.reset(token)
+
+
+def stats() -> Dict[str, Any]:
+    return {"rate_limits": limiter.stats(), "database": db.admission_stats()}
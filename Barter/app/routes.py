@@ -1,18 +1,40 @@
 # routes.py
 from fastapi import FastAPI, Form, Request, UploadFile, File, Query
+from fastapi.encoders import jsonable_encoder
 from fastapi.responses import HTMLResponse, JSONResponse, RedirectResponse
 from fastapi.templating import Jinja2Templates
-from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
+from jinja2 import FileSystemBytecodeCache
+import asyncio
 import os
+from datetime import date
 from typing import Optional, Dict, Any
-import traceback
 
 from database import db
 from services import (
     UserService, OfferService, RatingService, 
-    ExchangeService, AuthService, FileService, MessageService
+    ExchangeService, AuthService, FileService, MessageService, CacheService,
+    UnreadCountService, OfferArchiveService, OfferImportService, MessageArchiveService, MessageSearchService,
+    CONVERSATION_PAGE, SESSION_MAX_AGE
 )
+from api import router as api_router, public_offer
+from backend import backend
+from similarity import index as similarity_index
+from leaderboard import leaderboard, game_sessions, attach_usernames, ALL_TIME, MAX_SCORE
+from snapshots import snapshots, snapshot_response
+import loaders
+from ratelimit import LoadSheddingMiddleware
+import ratelimit
+import events
+import lifecycle
+from logs import get_logger, RequestLogMiddleware
+import logs
+from sessions import ReadPinMiddleware, SessionRefreshMiddleware
+from assets import assets, AssetStaticFiles
+import profiling
+import jobs
+
+logger = get_logger("routes")
 
 # Инициализация сервисов
 user_service = UserService()
@@ -30,10 +52,54 @@ UPLOAD_DIR = os.path.join(STATIC_DIR, "uploads", "offers")
 AVATAR_DIR = os.path.join(STATIC_DIR, "uploads", "avatars")
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 os.makedirs(AVATAR_DIR, exist_ok=True)
+# Как часто сохранять принятые результаты мини-игры в game_scores
+LEADERBOARD_SNAPSHOT_SECONDS = int(os.environ.get("BARTER_LEADERBOARD_SNAPSHOT_SECONDS", "10"))
+# Сколько строк таблицы лидеров отдавать за раз и сколько соседей показывать вокруг игрока
+LEADERBOARD_MAX_LIMIT = 100
+LEADERBOARD_RADIUS = 5
+# Как часто проверять доступность и отставание реплик БД
+REPLICA_CHECK_SECONDS = float(os.environ.get("BARTER_DB_REPLICA_CHECK_SECONDS", "5"))
+# Как часто сверять счетчики непрочитанных с таблицей messages
+UNREAD_RECONCILE_SECONDS = int(os.environ.get("BARTER_UNREAD_RECONCILE_SECONDS", "600"))
+# Как часто пересобирать счетчики обменов по таблице exchanges
+EXCHANGE_RECONCILE_SECONDS = int(os.environ.get("BARTER_EXCHANGE_RECONCILE_SECONDS", "86400"))
+# Как часто переносить снятые объявления из offers в offers_archive
+OFFER_ARCHIVE_SECONDS = int(os.environ.get("BARTER_OFFER_ARCHIVE_SECONDS", "3600"))
+# Как часто переносить старую прочитанную переписку из messages в messages_archive
+MESSAGE_ARCHIVE_SECONDS = int(os.environ.get("BARTER_MESSAGE_ARCHIVE_SECONDS", "3600"))
+# Сколько архивных объявлений показывать в своем профиле
+ARCHIVED_OFFERS_LIMIT = 10
+# Полная перестройка индекса похожих объявлений (между ними - инкрементально)
+SIMILARITY_REBUILD_SECONDS = int(os.environ.get("BARTER_SIMILARITY_REBUILD_SECONDS", "3600"))
+# Сколько похожих и подходящих для обмена объявлений показывать на карточке
+SIMILAR_OFFERS_LIMIT = 4
+# Сколько объявлений показывать в публичном профиле
+PROFILE_OFFERS_LIMIT = 10
+# Как часто пересобирать сброшенные снимки анонимных страниц
+SNAPSHOT_REFRESH_SECONDS = float(os.environ.get("BARTER_SNAPSHOT_REFRESH_SECONDS", "2"))
+# Скомпилированные шаблоны на диске: новый воркер не компилирует их заново
+TEMPLATE_CACHE_DIR = os.environ.get("BARTER_TEMPLATE_CACHE_DIR", os.path.join(BASE_DIR, ".jinja_cache"))
+# Проверять изменение файлов шаблонов на каждом рендере (для разработки)
+TEMPLATE_AUTO_RELOAD = os.environ.get("BARTER_TEMPLATE_RELOAD", "0") == "1"
 
 # Создание приложения
 def create_app() -> FastAPI:
-    app = FastAPI(title="Swap Space - Платформа для обменов")
+    app = FastAPI(title="Swap Space - Платформа для обменов", lifespan=lifecycle.lifespan)
+    
+    # Профилирование по требованию (самый внутренний слой; без настройки не подключается)
+    if profiling.enabled():
+        app.add_middleware(profiling.ProfilingMiddleware)
+        profiling.instrument_json()
+    
+    # Лимиты частоты и отказ 429 при перегрузке БД (внутри CORS, чтобы 429 имели CORS-заголовки)
+    app.add_middleware(LoadSheddingMiddleware)
+    
+    # Обновленная cookie сессии (скользящее продление снимка пользователя)
+    app.add_middleware(SessionRefreshMiddleware)
+    
+    # Чтения пользователя после его записи - с основного сервера БД, а не с реплик
+    if db.replicas:
+        app.add_middleware(ReadPinMiddleware)
     
     # Настройка CORS
     app.add_middleware(
@@ -44,23 +110,90 @@ def create_app() -> FastAPI:
         allow_headers=["*"],
     )
     
+    # request_id и access-лог - самым внешним слоем, чтобы учитывались и ответы 429
+    app.add_middleware(RequestLogMiddleware)
+    
     templates = Jinja2Templates(directory=os.path.join(BASE_DIR, "templates"))
-    app.mount("/static", StaticFiles(directory=STATIC_DIR), name="static")
+    os.makedirs(TEMPLATE_CACHE_DIR, exist_ok=True)
+    templates.env.bytecode_cache = FileSystemBytecodeCache(TEMPLATE_CACHE_DIR)
+    templates.env.auto_reload = TEMPLATE_AUTO_RELOAD
+    templates.env.globals["asset_url"] = assets.url
+    if profiling.enabled():
+        profiling.instrument_templates(templates.env)
+    # Бандлы из static/dist - с Cache-Control immutable
+    app.mount("/static", AssetStaticFiles(directory=STATIC_DIR), name="static")
+
+    # JSON API (/api/v1)
+    app.include_router(api_router)
     
+    # ================================
+    # Прогрев и остановка
+    # ================================
+    def warm_templates():
+        """Скомпилировать все шаблоны заранее (в памяти и в байткод-кеше на диске)"""
+        names = templates.env.list_templates(extensions=["html"])
+        for name in names:
+            templates.env.get_template(name)
+        return len(names) > 0
+    
+    lifecycle.on_startup("db_pool", db.init_pool)
+    if db.replicas:
+        lifecycle.on_startup("db_replicas", db.check_replicas)
+    lifecycle.on_startup("assets", assets.build)
+    lifecycle.on_startup("templates", warm_templates)
+    lifecycle.on_startup("cache_backend", backend.ping)
+    lifecycle.on_startup("unread_counts", UnreadCountService.ensure_table)
+    lifecycle.on_startup("exchange_ledger", ExchangeService.ensure_tables)
+    lifecycle.on_startup("session_versions", AuthService.ensure_table)
+    lifecycle.on_startup("similarity_index", similarity_index.rebuild)
+    lifecycle.on_startup("job_tables", jobs.ensure_tables)
+    lifecycle.on_startup("row_versions", OfferService.ensure_version_columns)
+    lifecycle.on_startup("offer_import", OfferImportService.ensure_columns)
+    lifecycle.on_startup("offer_archive", OfferArchiveService.ensure_table)
+    lifecycle.on_startup("message_archive", MessageArchiveService.ensure_table)
+    lifecycle.on_startup("message_search", MessageSearchService.ensure_table)
+    lifecycle.on_startup("leaderboard", leaderboard.load)
+    lifecycle.on_startup("jobs", jobs.runner.start)
+    # Индекс похожих объявлений - в памяти каждого процесса, поэтому не через очередь
+    lifecycle.every("similarity_rebuild", SIMILARITY_REBUILD_SECONDS, similarity_index.rebuild)
+    if db.replicas:
+        lifecycle.every("db_replicas", REPLICA_CHECK_SECONDS, db.check_replicas)
+    # Результаты, принятые процессом, сохраняет сам процесс
+    lifecycle.every("leaderboard_snapshot", LEADERBOARD_SNAPSHOT_SECONDS, leaderboard.snapshot)
+    # Снимки страниц - в памяти каждого процесса, пересобирает их сам процесс
+    lifecycle.every("snapshots_refresh", SNAPSHOT_REFRESH_SECONDS, snapshots.refresh)
+    # Сверки по всей БД - один раз на все процессы
+    jobs.schedule("unread_reconcile", UNREAD_RECONCILE_SECONDS, "unread_reconcile")
+    jobs.schedule("exchange_reconcile", EXCHANGE_RECONCILE_SECONDS, "exchange_reconcile")
+    jobs.schedule("offer_archive", OFFER_ARCHIVE_SECONDS, "offer_archive")
+    jobs.schedule("message_archive", MESSAGE_ARCHIVE_SECONDS, "message_archive")
+    # Задачи доделываются до закрытия пула
+    lifecycle.on_shutdown("jobs", jobs.runner.stop)
+    lifecycle.on_shutdown("leaderboard", leaderboard.snapshot)
+    lifecycle.on_shutdown("db_pool", db.close_pool)
+    lifecycle.on_shutdown("cache_backend", backend.close)
+
     # ================================
     # Вспомогательные функции
     # ================================
     def get_current_user(request: Request):
-        """Получить текущего пользователя из cookies"""
-        token = request.cookies.get("session")
-        if not token:
-            return None
+        """Текущий пользователь из снимка в cookie: id, username, avatar_url.
         
-        user_id = auth_service.verify_token(token)
-        if not user_id:
-            return None
+        Полные данные (email, телефон) - через user_service.get_user_by_id.
+        Результат запоминается на время запроса.
+        """
+        if hasattr(request.state, "current_user"):
+            return request.state.current_user
+        
+        user = None
+        token = request.cookies.get("session")
+        if token:
+            user, refreshed = auth_service.resolve_session(token)
+            if refreshed:
+                request.state.session_cookie = refreshed
         
-        return user_service.get_user_by_id(user_id)
+        request.state.current_user = user
+        return user
     
     def get_template_context(request: Request, additional_context: dict = None):
         """Получить базовый контекст для всех шаблонов"""
@@ -101,13 +234,14 @@ def create_app() -> FastAPI:
         search = request.query_params.get("search", "")
         
         offers = offer_service.get_all_offers(category, city, search)
+        facets = offer_service.get_facets(category, city, search)
         
-        # Добавляем рейтинг к каждому пользователю
+        # Добавляем рейтинг к каждому пользователю (один запрос на всех авторов)
+        ratings = loaders.load_rating_summaries([offer.get("user_id") for offer in offers])
         for offer in offers:
             if offer.get("user_id"):
-                rating_stats = rating_service.get_user_rating_stats(offer["user_id"])
-                offer["user_rating"] = rating_stats["avg_rating"]
-                offer["total_ratings"] = rating_stats["total_ratings"]
+                offer["user_rating"] = ratings[offer["user_id"]]["avg_rating"]
+                offer["total_ratings"] = ratings[offer["user_id"]]["total_ratings"]
         
         context = get_template_context(request, {
             "offers": offers,
@@ -115,33 +249,59 @@ def create_app() -> FastAPI:
             "current_city": city,
             "current_search": search,
             "offers_count": len(offers),
+            "facets": facets,
         })
         
         return templates.TemplateResponse("offer_list.html", context)
     
+    def offercard_context(card, current_user) -> Dict[str, Any]:
+        """Данные страницы объявления (для зрителя current_user или анонима)"""
+        offer_id = card.offer["id"]
+        # Похожие и подходящие для обмена объявления - из индекса в памяти, без запросов к БД
+        top = similarity_index.top_k_kinds([offer_id], SIMILAR_OFFERS_LIMIT, ("similar", "complementary"))
+        similar = top["similar"].get(offer_id, [])
+        matches = top["complementary"].get(offer_id, [])
+        return {
+            # Контакты автора - только вошедшим (в снимок для анонимов они не попадают)
+            "offer": card.offer if current_user else public_offer(card.offer),
+            "user_rating": card.author_rating,
+            "total_ratings": card.author_total_ratings,
+            # Проверяем, может ли текущий пользователь отправить сообщение
+            "can_message": current_user and current_user["id"] != card.offer["user_id"],
+            "current_user": current_user,
+            "similar_offers": similar,
+            "exchange_matches": matches
+        }
+    
+    def render_offercard_snapshot(offer_id: int):
+        """Страница объявления для анонимного посетителя (снимок)"""
+        card = loaders.load_offer_card(offer_id)
+        if not card:
+            return None
+        context = dict(offercard_context(card, None), request=None, user=None)
+        html = templates.get_template("offercard.html").render(context)
+        return html, [("offer", offer_id), ("user", card.offer["user_id"])]
+    
+    snapshots.register("offer", render_offercard_snapshot)
+    
     @app.get("/offer/{id}", response_class=HTMLResponse)
     async def offercard(request: Request, id: int):
         """Страница объявления"""
         try:
-            offer = offer_service.get_offer_by_id(id)
-            
-            if not offer:
-                return templates.TemplateResponse("404.html", get_template_context(request))
+            current_user = get_current_user(request)
+            if not current_user:
+                # Анонимам - готовый снимок (при промахе он рендерится здесь же)
+                snapshot = await asyncio.to_thread(snapshots.get, "offer", id)
+                if snapshot:
+                    return snapshot_response(request, snapshot)
             
-            # Получаем рейтинг пользователя, который создал объявление
-            rating_stats = rating_service.get_user_rating_stats(offer["user_id"])
+            # Объявление, автор и рейтинг автора - один запрос (с кешем)
+            card = loaders.load_offer_card(id)
             
-            # Проверяем, может ли текущий пользователь отправить сообщение
-            current_user = get_current_user(request)
-            can_message = current_user and current_user["id"] != offer["user_id"]
+            if not card:
+                return templates.TemplateResponse("404.html", get_template_context(request))
             
-            context = get_template_context(request, {
-                "offer": offer,
-                "user_rating": rating_stats["avg_rating"],
-                "total_ratings": rating_stats["total_ratings"],
-                "can_message": can_message,
-                "current_user": current_user
-            })
+            context = get_template_context(request, offercard_context(card, current_user))
             
             return templates.TemplateResponse("offercard.html", context)
             
@@ -182,7 +342,7 @@ def create_app() -> FastAPI:
         
         image_url = None
         if image and image.filename:
-            filename = file_service.save_uploaded_file(image, UPLOAD_DIR, "offer")
+            filename = await asyncio.to_thread(file_service.save_uploaded_file, image, UPLOAD_DIR, "offer")
             image_url = f"/static/uploads/offers/{filename}"
         
         offer_service.create_offer(
@@ -191,6 +351,35 @@ def create_app() -> FastAPI:
         
         return RedirectResponse("/profile", status_code=303)
     
+    @app.post("/addoffer/import")
+    async def addoffer_import(
+        request: Request,
+        file: UploadFile = File(...),
+        images: UploadFile = File(None),
+    ):
+        """Массовая загрузка объявлений (CSV/JSON + zip с фото); отчет по каждой строке"""
+        user = get_current_user(request)
+        if not user:
+            return JSONResponse(
+                {"success": False, "message": "Авторизуйтесь"},
+                status_code=401
+            )
+        
+        try:
+            result = await asyncio.to_thread(
+                OfferImportService.import_offers,
+                user["id"],
+                file.file,
+                file.filename,
+                images.file if images and images.filename else None,
+                UPLOAD_DIR,
+                "/static/uploads/offers/",
+            )
+        except ValueError as e:
+            return JSONResponse({"success": False, "message": str(e)}, status_code=400)
+        
+        return JSONResponse({"success": True, **result})
+    
     @app.post("/delete_offer/{offer_id}")
     async def delete_offer(offer_id: int, request: Request):
         """Удаление объявления"""
@@ -210,18 +399,13 @@ def create_app() -> FastAPI:
                     status_code=404
                 )
             
-            # Удаляем изображение, если оно есть
-            if offer.get("image_url"):
-                try:
-                    image_path = os.path.join(BASE_DIR, offer["image_url"].lstrip("/"))
-                    file_service.delete_file(image_path)
-                except Exception as e:
-                    print(f"Ошибка при удалении изображения: {e}")
-            
             # Деактивируем объявление
             success = offer_service.deactivate_offer(offer_id, user["id"])
             
             if success:
+                # Изображение удаляется в фоне - только у действительно снятого объявления
+                if offer.get("image_url"):
+                    file_service.delete_later(os.path.join(BASE_DIR, offer["image_url"].lstrip("/")))
                 return JSONResponse(
                     {"success": True, "message": "Объявление успешно удалено"}
                 )
@@ -232,8 +416,7 @@ def create_app() -> FastAPI:
                 )
                 
         except Exception as e:
-            print(f"Ошибка удаления объявления: {e}")
-            traceback.print_exc()
+            logger.exception("Ошибка удаления объявления: %s", e)
             return JSONResponse(
                 {"success": False, "message": "Ошибка на сервере"}, 
                 status_code=500
@@ -250,17 +433,14 @@ def create_app() -> FastAPI:
         if not user:
             return RedirectResponse("/login", status_code=303)
         
-        # Получаем активные объявления
-        offers = offer_service.get_user_offers(user["id"])
-        
-        # Получаем количество всех активных объявлений пользователя
-        offers_count = offer_service.count_user_offers(user["id"])
-        
-        # Получаем количество успешных обменов
-        successful_exchanges = exchange_service.count_successful_exchanges(user["id"])
-        
-        # Получаем рейтинг
-        rating_stats = rating_service.get_user_rating_stats(user["id"])
+        # Объявления, счетчики и рейтинг - одним загрузчиком; архив - параллельно
+        profile_data, archived_offers = await asyncio.gather(
+            loaders.load_profile(user["id"], reviews_limit=0),
+            asyncio.to_thread(OfferArchiveService.get_user_archived_offers, user["id"], ARCHIVED_OFFERS_LIMIT),
+        )
+        if not profile_data:
+            return RedirectResponse("/login", status_code=303)
+        user = profile_data.user
         
         # Форматируем дату регистрации
         registration_date = user.get("registration_date")
@@ -277,10 +457,11 @@ def create_app() -> FastAPI:
             "avatar_url": user.get("avatar_url", ""),
             "about_me": user.get("about_me", ""),
             "registration_date": registration_date_str,
-            "offers_count": offers_count,
-            "successful_exchanges": successful_exchanges,
-            "rating_stats": rating_stats,
-            "offers": offers,
+            "offers_count": profile_data.offers_count,
+            "successful_exchanges": profile_data.successful_exchanges,
+            "rating_stats": profile_data.rating_stats,
+            "offers": profile_data.offers,
+            "archived_offers": archived_offers,
             "user_id": user["id"],
         })
         
@@ -290,6 +471,9 @@ def create_app() -> FastAPI:
     async def edit_profile_form(request: Request):
         """Форма редактирования профиля"""
         user = get_current_user(request)
+        if not user:
+            return RedirectResponse("/login", status_code=303)
+        user = user_service.get_user_by_id(user["id"])
         if not user:
             return RedirectResponse("/login", status_code=303)
         
@@ -312,16 +496,15 @@ def create_app() -> FastAPI:
         avatar_url = user.get("avatar_url")
         
         # Загрузка аватара
+        old_avatar_path = None
         if avatar and avatar.filename:
-            filename = file_service.save_uploaded_file(
-                avatar, AVATAR_DIR, "avatar", user["id"]
+            filename = await asyncio.to_thread(
+                file_service.save_uploaded_file, avatar, AVATAR_DIR, "avatar", user["id"]
             )
             
-            # Удаляем старый аватар, если он есть
+            # Старый аватар удаляется в фоне после сохранения профиля
             if avatar_url:
-                old_filename = os.path.basename(avatar_url)
-                old_path = os.path.join(AVATAR_DIR, old_filename)
-                file_service.delete_file(old_path)
+                old_avatar_path = os.path.join(AVATAR_DIR, os.path.basename(avatar_url))
             
             avatar_url = f"/static/uploads/avatars/{filename}"
         
@@ -329,6 +512,8 @@ def create_app() -> FastAPI:
         user_service.update_user_profile(
             user["id"], full_name, phone, about_me, avatar_url
         )
+        if old_avatar_path:
+            file_service.delete_later(old_avatar_path)
         
         return RedirectResponse("/profile", status_code=303)
     
@@ -336,60 +521,52 @@ def create_app() -> FastAPI:
     # Публичный профиль
     # ================================
     
+    def public_profile_context(profile_data, current_user) -> Dict[str, Any]:
+        """Данные публичного профиля (для зрителя current_user или анонима)"""
+        return {
+            "profile_user": profile_data.user,
+            "current_user": current_user,
+            "offers": profile_data.offers,
+            "offers_count": profile_data.offers_count,
+            "successful_exchanges": profile_data.successful_exchanges,
+            "rating_stats": profile_data.rating_stats,
+            "has_rated": profile_data.has_rated,
+            "user_rating": profile_data.viewer_rating,
+            "comment": profile_data.viewer_comment,
+            "recent_reviews": profile_data.recent_reviews,
+            # Проверяем, можно ли отправить сообщение
+            "can_message": current_user and current_user["id"] != profile_data.user["id"],
+        }
+    
+    def render_public_profile_snapshot(user_id: int):
+        """Публичный профиль для анонимного посетителя (снимок)"""
+        profile_data = loaders.load_profile_sync(user_id, offers_limit=PROFILE_OFFERS_LIMIT)
+        if not profile_data:
+            return None
+        context = dict(public_profile_context(profile_data, None), request=None, user=None)
+        html = templates.get_template("public_profile.html").render(context)
+        return html, [("user", user_id)]
+    
+    snapshots.register("user", render_public_profile_snapshot)
+    
     @app.get("/user/{user_id}", response_class=HTMLResponse)
     async def public_profile(request: Request, user_id: int):
         """Публичный профиль пользователя"""
         current_user = get_current_user(request)
-        
-        # Получаем информацию о пользователе
-        user = user_service.get_user_by_id(user_id)
-        if not user:
+        if not current_user:
+            # Анонимам - готовый снимок (при промахе он рендерится здесь же)
+            snapshot = await asyncio.to_thread(snapshots.get, "user", user_id)
+            if snapshot:
+                return snapshot_response(request, snapshot)
+        
+        # Пользователь, объявления, счетчики, рейтинг, отзывы и оценка зрителя
+        profile_data = await loaders.load_profile(
+            user_id, current_user["id"] if current_user else None, offers_limit=PROFILE_OFFERS_LIMIT
+        )
+        if not profile_data:
             return templates.TemplateResponse("404.html", get_template_context(request))
         
-        # Получаем активные объявления пользователя
-        offers = offer_service.get_user_offers(user_id, limit=10)
-        
-        # Статистика пользователя
-        offers_count = offer_service.count_user_offers(user_id)
-        successful_exchanges = exchange_service.count_successful_exchanges(user_id)
-        
-        # Получаем рейтинг пользователя
-        rating_stats = rating_service.get_user_rating_stats(user_id)
-        
-        # Проверяем, ставил ли текущий пользователь оценку
-        has_rated = False
-        user_rating = None
-        comment = None
-        if current_user:
-            rating_result = db.execute_query(
-                "SELECT rating, comment FROM ratings WHERE rater_user_id = %s AND target_user_id = %s",
-                (current_user["id"], user_id),
-                fetch=True,
-            )
-            if rating_result:
-                has_rated = True
-                user_rating = rating_result[0]["rating"]
-                comment = rating_result[0].get("comment")
-        
-        # Получаем последние отзывы
-        recent_reviews = rating_service.get_recent_reviews(user_id)
-        
-        # Проверяем, можно ли отправить сообщение
-        can_message = current_user and current_user["id"] != user_id
-        
-        context = get_template_context(request, {
-            "profile_user": user,
-            "current_user": current_user,
-            "offers": offers,
-            "offers_count": offers_count,
-            "successful_exchanges": successful_exchanges,
-            "rating_stats": rating_stats,
-            "has_rated": has_rated,
-            "user_rating": user_rating,
-            "comment": comment,
-            "recent_reviews": recent_reviews,
-            "can_message": can_message,
-        })
+        context = get_template_context(request, public_profile_context(profile_data, current_user))
         
         return templates.TemplateResponse("public_profile.html", context)
     
@@ -455,7 +632,7 @@ def create_app() -> FastAPI:
             })
             
         except Exception as e:
-            print(f"Ошибка при оценке пользователя: {e}")
+            logger.exception("Ошибка при оценке пользователя: %s", e)
             return JSONResponse(
                 {"success": False, "message": "Ошибка сервера"}, 
                 status_code=500
@@ -494,35 +671,47 @@ def create_app() -> FastAPI:
         if not user:
             return RedirectResponse("/login", status_code=303)
         
-        # Проверяем существование собеседника
-        other_user = user_service.get_user_by_id(other_user_id)
-        if not other_user:
+        # Собеседник, сообщения и их число - одновременно
+        dialog = await loaders.load_dialog(user["id"], other_user_id, page)
+        if not dialog:
             return templates.TemplateResponse("404.html", get_template_context(request))
         
-        # Получаем сообщения
-        messages = message_service.get_conversation(user["id"], other_user_id)
-        
-        # Получаем информацию о диалоге
-        total_messages_result = db.execute_query(
-            """SELECT COUNT(*) as count FROM messages 
-               WHERE (sender_id = %s AND recipient_id = %s)
-                  OR (sender_id = %s AND recipient_id = %s)""",
-            (user["id"], other_user_id, other_user_id, user["id"]),
-            fetch=True
-        )
-        
-        total_messages = total_messages_result[0]["count"] if total_messages_result else 0
-        
         context = get_template_context(request, {
-            "messages": messages,
-            "other_user": other_user,
+            "messages": dialog.messages,
+            "other_user": dialog.other_user,
             "current_user": user,
             "page": page,
-            "total_messages": total_messages,
+            "total_messages": dialog.total_messages,
+            # Ссылка на более ранние сообщения (страницы идут от новых к старым)
+            "has_earlier": dialog.total_messages > (page - 1) * CONVERSATION_PAGE + len(dialog.messages),
         })
         
         return templates.TemplateResponse("conversation.html", context)
     
+    @app.get("/messages/{other_user_id}/jump/{message_id}")
+    async def jump_to_message(request: Request, other_user_id: int, message_id: int):
+        """Открыть диалог на странице с нужным сообщением (переход из поиска)"""
+        user = get_current_user(request)
+        if not user:
+            return RedirectResponse("/login", status_code=303)
+        
+        page = await asyncio.to_thread(MessageService.page_of, user["id"], other_user_id, message_id)
+        suffix = f"?page={page}" if page > 1 else ""
+        return RedirectResponse(f"/messages/{other_user_id}{suffix}#message-{message_id}", status_code=303)
+    
+    @app.get("/api/messages/search")
+    async def search_messages(
+        request: Request,
+        q: str = Query(..., min_length=2, max_length=200)
+    ):
+        """Поиск по своей переписке: совпадения с собеседником и предыдущим сообщением"""
+        user = get_current_user(request)
+        if not user:
+            return JSONResponse({"success": False}, status_code=401)
+        
+        results = await asyncio.to_thread(MessageSearchService.search, user["id"], q)
+        return JSONResponse(jsonable_encoder({"success": True, "results": results}))
+    
     @app.post("/messages/{other_user_id}/send")
     async def send_message(
         request: Request,
@@ -561,7 +750,7 @@ def create_app() -> FastAPI:
                 }, status_code=500)
                 
         except Exception as e:
-            print(f"Ошибка отправки сообщения: {e}")
+            logger.exception("Ошибка отправки сообщения: %s", e)
             return JSONResponse({
                 "success": False,
                 "message": f"Ошибка сервера: {str(e)}"
@@ -571,9 +760,14 @@ def create_app() -> FastAPI:
     async def get_new_messages(
         request: Request,
         other_user_id: int,
-        last_message_id: int = Query(0, ge=0)
+        last_message_id: int = Query(0, ge=0),
+        wait: int = Query(0, ge=0, le=30)
     ):
-        """Получить новые сообщения (для AJAX)"""
+        """Получить новые сообщения (для AJAX).
+
+        wait > 0 включает long polling: если новых сообщений нет, запрос
+        ждет события о новом сообщении в диалоге (от любого воркера).
+        """
         user = get_current_user(request)
         if not user:
             return JSONResponse({"success": False}, status_code=401)
@@ -589,14 +783,19 @@ def create_app() -> FastAPI:
             WHERE ((m.sender_id = %s AND m.recipient_id = %s)
                OR (m.sender_id = %s AND m.recipient_id = %s))
                AND m.id > %s
-            ORDER BY m.created_at ASC
+            ORDER BY m.id ASC
         """
         
-        new_messages = db.execute_query(
-            query,
-            (user["id"], other_user_id, other_user_id, user["id"], last_message_id),
-            fetch=True
-        ) or []
+        params = (user["id"], other_user_id, other_user_id, user["id"], last_message_id)
+        # Номер события берется до запроса: сообщение, пришедшее между запросом
+        # и ожиданием, сразу разбудит wait
+        topic = events.dialog_topic(user["id"], other_user_id)
+        seen = events.hub.version(topic)
+        new_messages = db.execute_query(query, params, fetch=True) or []
+        
+        if not new_messages and wait:
+            if await events.hub.wait(topic, timeout=wait, since=seen):
+                new_messages = db.execute_query(query, params, fetch=True) or []
         
         # Помечаем как прочитанные
         if new_messages:
@@ -649,12 +848,11 @@ def create_app() -> FastAPI:
             )
         
         try:
-            db.execute_query(
-                """DELETE FROM messages 
-                   WHERE (sender_id = %s AND recipient_id = %s)
-                      OR (sender_id = %s AND recipient_id = %s)""",
-                (user["id"], other_user_id, other_user_id, user["id"]),
-            )
+            if not message_service.clear_conversation(user["id"], other_user_id):
+                return JSONResponse({
+                    "success": False,
+                    "message": "Не удалось очистить переписку"
+                }, status_code=500)
             
             return JSONResponse({
                 "success": True,
@@ -667,14 +865,27 @@ def create_app() -> FastAPI:
             }, status_code=500)
     
     @app.get("/api/unread_count")
-    async def get_unread_count_api(request: Request):
-        """API для получения количества непрочитанных сообщений"""
+    async def get_unread_count_api(
+        request: Request,
+        since: Optional[int] = Query(None, ge=0),
+        wait: int = Query(0, ge=0, le=30)
+    ):
+        """API для получения количества непрочитанных сообщений.
+
+        С параметрами since и wait работает как long polling: если счетчик
+        равен since, ответ задерживается до его изменения или таймаута.
+        """
         user = get_current_user(request)
         if not user:
             return JSONResponse({"count": 0})
         
+        topic = events.unread_topic(user["id"])
+        seen = events.hub.version(topic)
         count = message_service.get_unread_count(user["id"])
-        return JSONResponse({"count": count})
+        if since is not None and wait and count == since:
+            if await events.hub.wait(topic, timeout=wait, since=seen):
+                count = message_service.get_unread_count(user["id"])
+        return JSONResponse({"count": count, "changed": count != since})
     
     @app.post("/start_conversation/{user_id}")
     async def start_conversation(
@@ -762,9 +973,9 @@ def create_app() -> FastAPI:
             })
             return templates.TemplateResponse("auth.html", context)
         
-        token = auth_service.generate_token(user["id"])
+        token = auth_service.generate_token(user)
         response = RedirectResponse("/profile", status_code=303)
-        response.set_cookie("session", token, max_age=3600 * 24 * 30, httponly=True)
+        response.set_cookie("session", token, max_age=SESSION_MAX_AGE, httponly=True)
         return response
     
     @app.post("/logout")
@@ -774,6 +985,16 @@ def create_app() -> FastAPI:
         response.delete_cookie("session")
         return response
     
+    @app.post("/logout_all")
+    async def logout_all(request: Request):
+        """Выход на всех устройствах: отзыв всех сессий пользователя"""
+        user = get_current_user(request)
+        if user:
+            auth_service.revoke_sessions(user["id"])
+        response = RedirectResponse("/", status_code=303)
+        response.delete_cookie("session")
+        return response
+    
     # ================================
     # Мини-игра
     # ================================
@@ -784,6 +1005,117 @@ def create_app() -> FastAPI:
         context = get_template_context(request)
         return templates.TemplateResponse("minigame.html", context)
     
+    @app.post("/api/minigame/start")
+    async def start_game(request: Request):
+        """Начать игру: номер игры, без которого результат не примут"""
+        user = get_current_user(request)
+        if not user:
+            return JSONResponse(
+                {"success": False, "message": "Войдите, чтобы попасть в таблицу лидеров"},
+                status_code=401
+            )
+        return JSONResponse({"success": True, "game": game_sessions.start(user["id"])})
+    
+    @app.post("/api/minigame/score")
+    async def submit_game_score(request: Request, score: int = Form(...), game: str = Form("")):
+        """Принять результат игры: лучший результат игрока и его места"""
+        user = get_current_user(request)
+        if not user:
+            return JSONResponse(
+                {"success": False, "message": "Войдите, чтобы попасть в таблицу лидеров"},
+                status_code=401
+            )
+        if not 0 <= score <= MAX_SCORE or not game_sessions.finish(user["id"], game, score):
+            return JSONResponse(
+                {"success": False, "message": "Некорректный результат"},
+                status_code=400
+            )
+        
+        position = leaderboard.submit(user["id"], score)
+        return JSONResponse({"success": True, "position": position})
+    
+    @app.get("/api/minigame/leaderboard")
+    async def game_leaderboard(
+        request: Request,
+        board: str = Query("all", pattern="^(all|today)$"),
+        limit: int = Query(10, ge=1, le=LEADERBOARD_MAX_LIMIT),
+        offset: int = Query(0, ge=0)
+    ):
+        """Таблица лидеров (за все время или за сегодня) и соседи текущего игрока"""
+        name = ALL_TIME if board == "all" else leaderboard.day_board(date.today())
+        body = {"success": True, "board": board, "top": leaderboard.top(name, limit, offset)}
+        
+        user = get_current_user(request)
+        if user:
+            body["position"] = leaderboard.position(user["id"])
+            body["around"] = leaderboard.around(user["id"], name, LEADERBOARD_RADIUS)
+        
+        # Имена - одним запросом на всю выдачу
+        await asyncio.to_thread(attach_usernames, body["top"] + body.get("around", []))
+        return JSONResponse(body)
+    
+    # ================================
+    # Обмены
+    # ================================
+    
+    @app.post("/exchanges/propose")
+    async def propose_exchange(
+        request: Request,
+        offer_id: int = Form(...),
+        my_offer_id: Optional[int] = Form(None),
+        message: Optional[str] = Form(None)
+    ):
+        """Предложить обмен на объявление"""
+        user = get_current_user(request)
+        if not user:
+            return JSONResponse({"success": False, "message": "Авторизуйтесь"}, status_code=401)
+        
+        exchange_id = exchange_service.propose(user["id"], offer_id, my_offer_id, message)
+        if not exchange_id:
+            return JSONResponse({
+                "success": False,
+                "message": "Не удалось предложить обмен (объявление недоступно или предложение уже есть)"
+            }, status_code=400)
+        
+        return JSONResponse({"success": True, "exchange_id": exchange_id})
+    
+    @app.post("/exchanges/{exchange_id}/{action}")
+    async def change_exchange(request: Request, exchange_id: int, action: str):
+        """Принять, завершить или отменить обмен"""
+        user = get_current_user(request)
+        if not user:
+            return JSONResponse({"success": False, "message": "Авторизуйтесь"}, status_code=401)
+        
+        actions = {
+            "accept": exchange_service.accept,
+            "complete": exchange_service.complete,
+            "cancel": exchange_service.cancel,
+        }
+        if action not in actions:
+            return JSONResponse({"success": False, "message": "Неизвестное действие"}, status_code=404)
+        
+        if not actions[action](exchange_id, user["id"]):
+            return JSONResponse(
+                {"success": False, "message": "Действие недоступно для этого обмена"},
+                status_code=409
+            )
+        
+        return JSONResponse({"success": True})
+    
+    @app.get("/api/exchanges")
+    async def list_exchanges(request: Request, status: Optional[str] = Query(None)):
+        """История обменов текущего пользователя и его счетчики"""
+        user = get_current_user(request)
+        if not user:
+            return JSONResponse({"success": False}, status_code=401)
+        
+        exchanges = exchange_service.get_user_exchanges(user["id"], status)
+        return JSONResponse(jsonable_encoder({
+            "success": True,
+            "exchanges": exchanges,
+            "counts": exchange_service.get_counts(user["id"]),
+        }))
+    
     # ================================
     # API для фронтенда
     # ================================
@@ -812,6 +1144,65 @@ def create_app() -> FastAPI:
         
         return JSONResponse({"users": users})
     
+    @app.get("/api/cache_stats")
+    async def cache_stats(request: Request):
+        """Статистика кешей (попадания, промахи, вытеснения; только с заголовком X-Profile)"""
+        if not profiling.is_admin(request.scope):
+            return JSONResponse({"success": False, "message": "Не найдено"}, status_code=404)
+        return JSONResponse({
+            "caches": CacheService.get_stats(),
+            "similarity_index": similarity_index.stats(),
+            "assets": assets.stats(),
+            "leaderboard": leaderboard.stats(),
+        })
+    
+    @app.get("/api/load_stats")
+    async def load_stats(request: Request):
+        """Счетчики лимитов частоты и ограничителя одновременных запросов к БД (только с X-Profile)"""
+        if not profiling.is_admin(request.scope):
+            return JSONResponse({"success": False, "message": "Не найдено"}, status_code=404)
+        return JSONResponse(dict(ratelimit.stats(), logging=logs.stats()))
+    
+    @app.get("/api/job_stats")
+    async def job_stats(request: Request):
+        """Очередь фоновых задач: статусы в БД и счетчики этого процесса (только с X-Profile)"""
+        if not profiling.is_admin(request.scope):
+            return JSONResponse({"success": False, "message": "Не найдено"}, status_code=404)
+        return JSONResponse(await asyncio.to_thread(jobs.runner.stats))
+    
+    @app.get("/api/profile_stats")
+    async def profile_stats(request: Request):
+        """Сводка профилей по маршрутам (только с заголовком X-Profile)"""
+        if not profiling.is_admin(request.scope):
+            return JSONResponse({"success": False, "message": "Не найдено"}, status_code=404)
+        return JSONResponse(profiling.stats())
+    
+    # ================================
+    # Проверки состояния (liveness / readiness)
+    # ================================
+    
+    @app.get("/health/live")
+    async def health_live():
+        """Процесс жив и цикл событий отвечает"""
+        return JSONResponse({"status": "alive"})
+    
+    @app.get("/health/ready")
+    async def health_ready():
+        """Процесс прогрет, не останавливается и БД отвечает"""
+        database = db.health()
+        ready = (
+            lifecycle.state.started
+            and not lifecycle.state.draining
+            and database["ok"]
+        )
+        return JSONResponse({
+            "status": "ready" if ready else "not_ready",
+            "started": lifecycle.state.started,
+            "draining": lifecycle.state.draining,
+            "database": database,
+            "warmup": lifecycle.state.warmup,
+        }, status_code=200 if ready else 503)
+    
     # ================================
     # Статические страницы
     # ================================
@@ -844,7 +1235,7 @@ def create_app() -> FastAPI:
     
     @app.exception_handler(500)
     async def server_error(request, exc):
-        traceback.print_exc()
+        logger.error("Необработанная ошибка", exc_info=(type(exc), exc, exc.__traceback__))
         return templates.TemplateResponse("error.html", get_template_context(request))
     
     @app.exception_handler(401)
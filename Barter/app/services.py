@@ -1,26 +1,278 @@
 # services.py
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 import bcrypt
+import copy
+import csv
+import io
 import os
+import re
 import shutil
-from typing import Optional, Dict, Any, List
+import time
+import uuid
+import zipfile
+from collections import Counter
+from typing import Optional, Dict, Any, List, Tuple
 from itsdangerous import URLSafeTimedSerializer
 import json
 
 from database import db
+from cache import Generations, TTLCache, SharedCache
+from backend import backend
+from snapshots import snapshots
+import events
+import jobs
+from logs import get_logger
+
+logger = get_logger("services")
 
 SECRET_KEY = "super_secret_key_123"
 serializer = URLSafeTimedSerializer(SECRET_KEY)
 
+# Сессия живет 30 дней; снимок пользователя в ней считается свежим SESSION_SNAPSHOT_TTL,
+# потом обновляется (скользящее продление) с перепроверкой версии сессии
+SESSION_MAX_AGE = 3600 * 24 * 30
+SESSION_SNAPSHOT_TTL = int(os.environ.get("BARTER_SESSION_SNAPSHOT_TTL", "900"))
+
+# Очистка переписки: сколько сообщений удалять одним DELETE (остальное - в фоне)
+CLEAR_BATCH = 1000
+# Архив объявлений: размер пачки переноса и срок жизни активного объявления
+# (0 - активные объявления не архивируются, только снятые)
+OFFER_ARCHIVE_BATCH = 500
+OFFER_EXPIRE_DAYS = int(os.environ.get("BARTER_OFFER_EXPIRE_DAYS", "0"))
+# Индексы, по которым перенос в архив находит снятые и просроченные объявления
+OFFER_ARCHIVE_INDEXES = {
+    "idx_offers_active": "(is_active, id)",
+    "idx_offers_created": "(created_at)",
+}
+OFFER_ARCHIVE_COLUMNS = {
+    "archived_at": "DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP",
+    "archive_reason": "VARCHAR(16) NOT NULL DEFAULT 'inactive'",
+}
+# Версия строки для ETag JSON API: меняется при любом UPDATE строки
+# (правка профиля, снятие объявления), точность - микросекунды
+VERSION_COLUMN = "changed_at"
+VERSION_COLUMN_DEFINITION = (
+    "TIMESTAMP(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6)"
+)
+VERSIONED_TABLES = ("users", "offers", "offers_archive")
+# Поля пользователя для страниц и кеша - без password_hash
+USER_COLUMNS = ("id", "username", "email", "full_name", "phone", "about_me", "avatar_url", "registration_date")
+# Допустимые категории и города (значения формы /addoffer)
+OFFER_CATEGORIES = ("books", "electronics", "clothes", "furniture", "sports", "hobby", "services", "other")
+OFFER_CITIES = ("moscow", "spb", "ekb", "nnov", "kazan", "novosibirsk", "krasnodar", "vladivostok", "other")
+# Массовая загрузка объявлений: строк в файле, строк в одном INSERT,
+# потоков обработки фото и размер одного фото
+IMPORT_MAX_ROWS = int(os.environ.get("BARTER_IMPORT_MAX_ROWS", "1000"))
+IMPORT_BATCH = 200
+IMPORT_IMAGE_WORKERS = int(os.environ.get("BARTER_IMPORT_IMAGE_WORKERS", "4"))
+IMPORT_MAX_IMAGE_BYTES = 10 * 1024 * 1024
+IMPORT_FIELD_LIMITS = {"give": 255, "get": 255, "contact": 255, "district": 100}
+# Метка пачки импорта: по ней после многострочного INSERT читаются ID строк
+IMPORT_BATCH_COLUMN = "import_batch"
+IMPORT_BATCH_TABLES = ("offers", "offers_archive")
+# Сигнатуры допустимых форматов фото (WebP дополнительно проверяется по байтам 8-12)
+IMAGE_SIGNATURES = {
+    b"\xff\xd8\xff": ".jpg",
+    b"\x89PNG\r\n\x1a\n": ".png",
+    b"GIF87a": ".gif",
+    b"GIF89a": ".gif",
+    b"RIFF": ".webp",
+}
+# Переписка: горячая таблица messages держит последние MESSAGE_HOT_DAYS дней,
+# более старые прочитанные сообщения переносятся в messages_archive
+CONVERSATION_PAGE = 50
+MESSAGE_ARCHIVE_BATCH = 1000
+MESSAGE_HOT_DAYS = int(os.environ.get("BARTER_MESSAGE_HOT_DAYS", "90"))
+# Поиск по переписке: термин - первые SEARCH_STEM_LENGTH букв слова (грубый стемминг),
+# слово запроса ищется как начало термина; не больше SEARCH_MAX_TERMS терминов
+# на сообщение и SEARCH_MAX_QUERY_TERMS в запросе
+SEARCH_STEM_LENGTH = 5
+SEARCH_MAX_TERMS = 64
+SEARCH_MAX_QUERY_TERMS = 8
+SEARCH_RESULTS = 20
+SEARCH_BACKFILL_BATCH = 2000
+SEARCH_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+# Индексы, без которых опрос новых сообщений и перенос в архив читают всю таблицу
+MESSAGE_INDEXES = {
+    "idx_messages_pair": "(sender_id, recipient_id, id)",
+    "idx_messages_created": "(created_at)",
+}
+
+# Кеши чтения: сбрасываются точечно из методов записи.
+# Второй уровень - общий бэкенд (BARTER_CACHE_URL), если он настроен.
+user_cache = SharedCache(
+    TTLCache("users", max_entries=5000, max_bytes=16 * 1024 * 1024, ttl=300), backend
+)
+offer_cache = SharedCache(
+    TTLCache("offers", max_entries=5000, max_bytes=16 * 1024 * 1024, ttl=300), backend
+)
+user_offers_cache = SharedCache(
+    TTLCache("user_offers", max_entries=2000, max_bytes=16 * 1024 * 1024, ttl=300), backend
+)
+# Фасеты фильтров: одна сгруппированная выборка (категория x город) на поисковую строку
+facets_cache = SharedCache(
+    TTLCache("facets", max_entries=500, max_bytes=4 * 1024 * 1024, ttl=300), backend
+)
+# Версии сессий пользователей: проверяются на каждом запросе, поэтому только из кеша
+session_cache = SharedCache(
+    TTLCache("sessions", max_entries=20000, max_bytes=4 * 1024 * 1024, ttl=60), backend
+)
+CACHES = {
+    cache.name: cache
+    for cache in (user_cache, offer_cache, user_offers_cache, facets_cache, session_cache)
+}
+# Выдача объявлений по фильтрам (category, city, search) и странице. Только память
+# процесса: ключ включает поколения (общее, категории, города), которые сдвигает
+# любое создание или снятие объявления, а также смена аватара автора
+# (имя пользователя не меняется), поэтому сброс не перебирает ключи
+LISTING_CACHE_BYTES = int(os.environ.get("BARTER_LISTING_CACHE_MB", "32")) * 1024 * 1024
+listing_cache = TTLCache("listings", max_entries=5000, max_bytes=LISTING_CACHE_BYTES, ttl=120)
+listing_generations = Generations()
+
+
+def _copy_result(value):
+    """Копия закешированного результата, чтобы вызывающий код не испортил кеш"""
+    if isinstance(value, list):
+        return [copy.copy(row) for row in value]
+    return copy.copy(value)
+
+
+class CacheService:
+    @staticmethod
+    def _delete(cache: SharedCache, key):
+        """Удалить ключ здесь и попросить остальные воркеры сделать то же"""
+        cache.delete(key)
+        events.publish(events.INVALIDATE_CHANNEL, {"cache": cache.name, "key": key})
+
+    @staticmethod
+    def _invalidate_tag(cache: SharedCache, tag):
+        """Сбросить тег здесь и во всех остальных воркерах"""
+        cache.invalidate_tag(tag)
+        events.publish(events.INVALIDATE_CHANNEL, {"cache": cache.name, "tag": tag})
+
+    @staticmethod
+    def _invalidate_snapshots(*tags):
+        """Сбросить снимки анонимных страниц здесь и во всех остальных воркерах"""
+        for tag in tags:
+            snapshots.invalidate(tag)
+        events.publish(events.INVALIDATE_CHANNEL, {"cache": snapshots.cache.name, "snapshots": tags})
+
+    @staticmethod
+    def apply_remote_invalidation(payload: Dict[str, Any]):
+        """Применить инвалидацию, пришедшую от другого воркера (только локально)"""
+        if "generations" in payload:
+            listing_generations.bump(tuple(scope) for scope in payload["generations"])
+            return
+        if "snapshots" in payload:
+            for tag in payload["snapshots"]:
+                snapshots.invalidate(tuple(tag))
+            return
+        cache = CACHES.get(payload.get("cache"))
+        if cache is None:
+            return
+        if "key" in payload:
+            cache.delete(payload["key"], local_only=True)
+        if "tag" in payload:
+            cache.invalidate_tag(payload["tag"], local_only=True)
+
+    @staticmethod
+    def invalidate_user(user_id: int):
+        """Сбросить кеш пользователя и объявлений, в которых есть его данные"""
+        CacheService._delete(user_cache, user_id)
+        CacheService._invalidate_tag(offer_cache, ("user", user_id))
+        CacheService._invalidate_snapshots(("user", user_id))
+
+    @staticmethod
+    def invalidate_user_offers(user_id: int):
+        """Сбросить списки и счетчики объявлений пользователя"""
+        CacheService._invalidate_tag(user_offers_cache, ("user", user_id))
+        CacheService._invalidate_snapshots(("user", user_id))
+
+    @staticmethod
+    def invalidate_offer(offer_id: int, user_id: int):
+        """Сбросить объявление, его карточку и списки объявлений его автора"""
+        CacheService._delete(offer_cache, offer_id)
+        CacheService._delete(offer_cache, ("card", offer_id))
+        CacheService._invalidate_tag(user_offers_cache, ("user", user_id))
+        CacheService._invalidate_snapshots(("offer", offer_id), ("user", user_id))
+
+    @staticmethod
+    def invalidate_user_cards(user_id: int):
+        """Сбросить карточки объявлений пользователя (в них есть его рейтинг)"""
+        CacheService._invalidate_tag(offer_cache, ("user", user_id))
+        CacheService._invalidate_snapshots(("user", user_id))
+
+    @staticmethod
+    def invalidate_profiles(*user_ids: int):
+        """Сбросить снимки публичных профилей (данные, которых нет в кешах выше)"""
+        CacheService._invalidate_snapshots(*(("user", user_id) for user_id in user_ids))
+
+    @staticmethod
+    def invalidate_facets():
+        """Сбросить счетчики фильтров (любое создание или снятие объявления)"""
+        CacheService._invalidate_tag(facets_cache, ("facets",))
+
+    @staticmethod
+    def listing_scopes(category: Optional[str], city: Optional[str]) -> List[tuple]:
+        """Области поколений, от которых зависит выдача с фильтрами.
+
+        Выдача по категории и/или городу зависит только от них, без этих
+        фильтров (в том числе только поиск) - от поколения всей выдачи.
+        """
+        scopes = []
+        if category:
+            scopes.append(("category", category))
+        if city:
+            scopes.append(("city", city))
+        return scopes or [("all",)]
+
+    @staticmethod
+    def invalidate_listings(category: Optional[str], city: Optional[str]):
+        """Сбросить выдачу, в которую попадает объявление (здесь и в других воркерах)"""
+        scopes = [("all",)] + [
+            scope for scope in CacheService.listing_scopes(category, city) if scope != ("all",)
+        ]
+        listing_generations.bump(scopes)
+        events.publish(events.INVALIDATE_CHANNEL, {"cache": listing_cache.name, "generations": scopes})
+
+    @staticmethod
+    def invalidate_author_listings(user_id: int):
+        """Сбросить выдачу, в которой есть активные объявления пользователя (аватар автора)"""
+        scopes = db.execute_query(
+            "SELECT DISTINCT category, city FROM offers WHERE user_id = %s AND is_active = TRUE",
+            (user_id,),
+            fetch=True,
+            primary=True,
+        ) or []
+        for scope in scopes:
+            CacheService.invalidate_listings(scope["category"], scope["city"])
+
+    @staticmethod
+    def get_stats() -> List[Dict[str, Any]]:
+        """Статистика всех кешей"""
+        listings = listing_cache.stats()
+        listings["generations"] = listing_generations.stats()
+        return [cache.stats() for cache in CACHES.values()] + [listings, snapshots.stats()]
+
+
+# Инвалидации от других воркеров (свои уже применены синхронно)
+events.subscribe(
+    events.INVALIDATE_CHANNEL, CacheService.apply_remote_invalidation, skip_own=True
+)
+
 
 class UserService:
     @staticmethod
     def get_user_by_id(user_id: int) -> Optional[Dict[str, Any]]:
         """Получить пользователя по ID"""
-        user_data = db.execute_query(
-            "SELECT * FROM users WHERE id = %s", (user_id,), fetch=True
-        )
-        return user_data[0] if user_data else None
+        def load():
+            user_data = db.execute_query(
+                f"SELECT {', '.join(USER_COLUMNS)} FROM users WHERE id = %s", (user_id,), fetch=True
+            )
+            return user_data[0] if user_data else None
+
+        return _copy_result(user_cache.get_or_load(user_id, load))
 
     @staticmethod
     def get_user_by_username(username: str) -> Optional[Dict[str, Any]]:
@@ -39,6 +291,8 @@ class UserService:
                VALUES (%s, %s, %s, NOW())""",
             (username, hashed, email),
         )
+        if result:
+            CacheService.invalidate_user(result)
         return result
 
     @staticmethod
@@ -50,12 +304,19 @@ class UserService:
         avatar_url: Optional[str] = None
     ):
         """Обновить профиль пользователя"""
+        previous = UserService.get_user_by_id(user_id)
         db.execute_query(
             """UPDATE users 
                SET full_name = %s, phone = %s, about_me = %s, avatar_url = %s 
                WHERE id = %s""",
             (full_name, phone, about_me, avatar_url, user_id),
         )
+        CacheService.invalidate_user(user_id)
+        # Аватар автора показывается в выдаче объявлений
+        if previous is None or previous.get("avatar_url") != avatar_url:
+            CacheService.invalidate_author_listings(user_id)
+        # Снимок пользователя в сессиях устарел - обновятся на следующем запросе
+        AuthService.invalidate_sessions(user_id)
 
     @staticmethod
     def check_credentials(username: str, password: str) -> Optional[Dict[str, Any]]:
@@ -78,38 +339,47 @@ class OfferService:
         search: str = ""
     ) -> List[Dict[str, Any]]:
         """Получить все активные объявления с фильтрами"""
-        query = """
+        category, city, search = category.strip(), city.strip(), search.strip()
+        where, params = OfferService._build_filters(category, city, search)
+        query = f"""
             SELECT o.*, u.username, u.avatar_url
             FROM offers o
             LEFT JOIN users u ON o.user_id = u.id
-            WHERE o.is_active = TRUE
+            WHERE {where}
+            ORDER BY o.created_at DESC
         """
-        params = []
-
-        if category:
-            query += " AND o.category = %s"
-            params.append(category)
-        if city:
-            query += " AND o.city = %s"
-            params.append(city)
-        if search:
-            query += " AND (o.give LIKE %s OR o.`get` LIKE %s OR u.username LIKE %s)"
-            params.extend([f"%{search}%", f"%{search}%", f"%{search}%"])
+        return OfferService._cached_listing(
+            category, city, search, ("all",),
+            lambda: db.execute_query(query, params, fetch=True),
+        )
 
-        query += " ORDER BY o.created_at DESC"
-        return db.execute_query(query, params, fetch=True) or []
+    @staticmethod
+    def _cached_listing(category: str, city: str, search: str, page: tuple, load) -> List[Dict[str, Any]]:
+        """Выдача из listing_cache: ключ - нормализованные фильтры, страница и поколения"""
+        scopes = CacheService.listing_scopes(category, city)
+        # LIKE без учета регистра (collation таблиц), поэтому поиск - в нижнем регистре
+        key = (category, city, search.lower(), page, listing_generations.get(scopes))
+        return _copy_result(listing_cache.get_or_load(key, load)) or []
 
     @staticmethod
     def get_offer_by_id(offer_id: int) -> Optional[Dict[str, Any]]:
         """Получить объявление по ID"""
         query = """
-            SELECT o.*, u.username, u.email, u.phone, u.avatar_url
+            SELECT o.*, u.username, u.avatar_url
             FROM offers o
             JOIN users u ON o.user_id = u.id
             WHERE o.id = %s AND o.is_active = TRUE
         """
-        result = db.execute_query(query, (offer_id,), fetch=True)
-        return result[0] if result else None
+
+        def load():
+            result = db.execute_query(query, (offer_id,), fetch=True)
+            return result[0] if result else None
+
+        # Помечаем тегом автора: его данные входят в строку объявления
+        offer = offer_cache.get_or_load(
+            offer_id, load, tags=lambda row: [("user", row["user_id"])]
+        )
+        return _copy_result(offer)
 
     @staticmethod
     def get_user_offers(user_id: int, limit: int = None) -> List[Dict[str, Any]]:
@@ -122,8 +392,13 @@ class OfferService:
         """
         if limit:
             query += f" LIMIT {limit}"
-        
-        return db.execute_query(query, (user_id,), fetch=True) or []
+
+        offers = user_offers_cache.get_or_load(
+            ("list", user_id, limit),
+            lambda: db.execute_query(query, (user_id,), fetch=True),
+            tags=[("user", user_id)],
+        )
+        return _copy_result(offers) or []
 
     @staticmethod
     def create_offer(
@@ -135,21 +410,30 @@ class OfferService:
         city: Optional[str] = None,
         district: Optional[str] = None,
         image_url: Optional[str] = None
-    ):
+    ) -> Optional[int]:
         """Создать новое объявление"""
-        db.execute_query(
+        offer_id = db.execute_query(
             """INSERT INTO offers (user_id, give, `get`, contact, 
                category, city, district, image_url, created_at)
                VALUES (%s,%s,%s,%s,%s,%s,%s,%s, NOW())""",
             (user_id, give, get, contact, category, city, district, image_url),
         )
+        CacheService.invalidate_user_offers(user_id)
+        CacheService.invalidate_facets()
+        CacheService.invalidate_listings(category, city)
+        if offer_id:
+            events.publish_offer_created({
+                "id": offer_id, "user_id": user_id, "give": give, "get": get,
+                "category": category, "city": city, "image_url": image_url,
+            })
+        return offer_id
 
     @staticmethod
     def deactivate_offer(offer_id: int, user_id: int) -> bool:
         """Деактивировать объявление (удалить)"""
         # Проверяем, существует ли объявление и принадлежит ли пользователю
         offer = db.execute_query(
-            "SELECT id FROM offers WHERE id = %s AND user_id = %s AND is_active = TRUE",
+            "SELECT id, category, city FROM offers WHERE id = %s AND user_id = %s AND is_active = TRUE",
             (offer_id, user_id),
             fetch=True,
         )
@@ -161,25 +445,556 @@ class OfferService:
             "UPDATE offers SET is_active = FALSE WHERE id = %s", 
             (offer_id,)
         )
+        CacheService.invalidate_offer(offer_id, user_id)
+        CacheService.invalidate_facets()
+        CacheService.invalidate_listings(offer[0]["category"], offer[0]["city"])
+        events.publish_offer_deactivated(offer_id)
         return True
 
     @staticmethod
-    def count_user_offers(user_id: int) -> int:
-        """Посчитать активные объявления пользователя"""
+    def _build_filters(
+        category: str = "",
+        city: str = "",
+        search: str = ""
+    ) -> tuple:
+        """Собрать условия WHERE для фильтров списка объявлений"""
+        conditions = ["o.is_active = TRUE"]
+        params = []
+
+        if category:
+            conditions.append("o.category = %s")
+            params.append(category)
+        if city:
+            conditions.append("o.city = %s")
+            params.append(city)
+        if search:
+            conditions.append("(o.give LIKE %s OR o.`get` LIKE %s OR u.username LIKE %s)")
+            params.extend([f"%{search}%", f"%{search}%", f"%{search}%"])
+
+        return " AND ".join(conditions), params
+
+    @staticmethod
+    def get_offers_page(
+        category: str = "",
+        city: str = "",
+        search: str = "",
+        limit: int = 20,
+        after: Optional[tuple] = None
+    ) -> List[Dict[str, Any]]:
+        """Получить страницу объявлений (keyset-пагинация по created_at, id)"""
+        category, city, search = category.strip(), city.strip(), search.strip()
+        where, params = OfferService._build_filters(category, city, search)
+
+        # after = (created_at, id) последнего объявления предыдущей страницы
+        if after:
+            where += " AND (o.created_at < %s OR (o.created_at = %s AND o.id < %s))"
+            params.extend([after[0], after[0], after[1]])
+
+        query = f"""
+            SELECT o.*, u.username, u.avatar_url
+            FROM offers o
+            LEFT JOIN users u ON o.user_id = u.id
+            WHERE {where}
+            ORDER BY o.created_at DESC, o.id DESC
+            LIMIT %s
+        """
+        params.append(limit)
+        return OfferService._cached_listing(
+            category, city, search, ("page", limit, tuple(after) if after else None),
+            lambda: db.execute_query(query, params, fetch=True),
+        )
+
+    @staticmethod
+    def get_facets(
+        category: str = "",
+        city: str = "",
+        search: str = ""
+    ) -> Dict[str, Any]:
+        """Счетчики для фильтров списка объявлений.
+
+        Одна выборка GROUP BY category, city под текущим поиском; из нее
+        считаются объявления по категориям (в выбранном городе), по городам
+        (в выбранной категории) и полная таблица категория x город.
+        """
+        search = search.strip()
+
+        def load():
+            where, params = OfferService._build_filters(search=search)
+            join = "LEFT JOIN users u ON o.user_id = u.id" if search else ""
+            return db.execute_query(
+                f"""SELECT o.category, o.city, COUNT(*) AS count
+                    FROM offers o {join}
+                    WHERE {where}
+                    GROUP BY o.category, o.city""",
+                params,
+                fetch=True,
+            )
+
+        rows = facets_cache.get_or_load(("facets", search.lower()), load, tags=[("facets",)]) or []
+
+        categories: Dict[str, int] = {}
+        cities: Dict[str, int] = {}
+        pairs: List[Dict[str, Any]] = []
+        total = 0
+        for row in rows:
+            row_category = row["category"] or ""
+            row_city = row["city"] or ""
+            count = int(row["count"])
+            pairs.append({"category": row_category, "city": row_city, "count": count})
+            if not city or row_city == city:
+                categories[row_category] = categories.get(row_category, 0) + count
+            if not category or row_category == category:
+                cities[row_city] = cities.get(row_city, 0) + count
+            if (not city or row_city == city) and (not category or row_category == category):
+                total += count
+
+        return {"categories": categories, "cities": cities, "pairs": pairs, "total": total}
+
+    @staticmethod
+    def get_offer_version(offer_id: int) -> Optional[Dict[str, Any]]:
+        """Получить версию одного объявления и его автора (только по первичным ключам)"""
+        result = db.execute_query(
+            f"""SELECT o.id, o.user_id, o.{VERSION_COLUMN} AS changed_at,
+                       u.{VERSION_COLUMN} AS author_changed_at,
+                       GREATEST(o.{VERSION_COLUMN}, u.{VERSION_COLUMN}) AS last_modified
+                FROM offers o
+                JOIN users u ON o.user_id = u.id
+                WHERE o.id = %s AND o.is_active = TRUE""",
+            (offer_id,),
+            fetch=True,
+        )
+        return result[0] if result else None
+
+    @staticmethod
+    def get_user_offers_version(user_id: int) -> Optional[Dict[str, Any]]:
+        """Получить версию списка объявлений пользователя (данных автора в списке нет)"""
         result = db.execute_query(
-            "SELECT COUNT(*) AS count FROM offers WHERE user_id = %s AND is_active = TRUE",
+            f"""SELECT COUNT(*) AS count, MAX(id) AS max_id, SUM(id) AS id_sum,
+                       MAX({VERSION_COLUMN}) AS last_modified
+                FROM offers
+                WHERE user_id = %s AND is_active = TRUE""",
             (user_id,),
             fetch=True,
         )
-        return result[0]["count"] if result else 0
+        return result[0] if result else None
 
+    @staticmethod
+    def ensure_version_columns() -> bool:
+        """Добавить столбец версии в users, offers и offers_archive, где его нет"""
+        existing = db.execute_query(
+            f"""SELECT TABLE_NAME AS table_name, SUM(COLUMN_NAME = '{VERSION_COLUMN}') AS has_version
+                FROM information_schema.COLUMNS
+                WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME IN ({", ".join(["%s"] * len(VERSIONED_TABLES))})
+                GROUP BY TABLE_NAME""",
+            VERSIONED_TABLES,
+            fetch=True,
+            primary=True,
+        )
+        if existing is None:
+            return False
+        for row in existing:
+            if not row["has_version"]:
+                db.execute_query(
+                    f"ALTER TABLE {row['table_name']} ADD COLUMN {VERSION_COLUMN} {VERSION_COLUMN_DEFINITION}"
+                )
+        return True
 
-class RatingService:
     @staticmethod
-    def get_user_rating_stats(user_id: int) -> Dict[str, Any]:
-        """Получить статистику рейтинга пользователя"""
-        rating_query = """
-            SELECT 
+    def count_user_offers(user_id: int) -> int:
+        """Посчитать активные объявления пользователя"""
+        def load():
+            result = db.execute_query(
+                "SELECT COUNT(*) AS count FROM offers WHERE user_id = %s AND is_active = TRUE",
+                (user_id,),
+                fetch=True,
+            )
+            return result[0]["count"] if result else None
+
+        count = user_offers_cache.get_or_load(("count", user_id), load, tags=[("user", user_id)])
+        return count or 0
+
+
+class OfferImportService:
+    """Массовая загрузка объявлений из CSV, JSON или JSON Lines и архива фото.
+
+    Строки читаются и проверяются по одной (CSV и JSON Lines не загружаются
+    в память целиком), корректные копятся в пачки по IMPORT_BATCH: фото пачки
+    извлекаются из zip параллельно, затем пачка вставляется одним
+    многострочным INSERT в транзакции. Отчет - по каждой строке файла.
+    """
+
+    @staticmethod
+    def ensure_columns() -> bool:
+        """Добавить метку пачки импорта в offers и offers_archive, где ее нет"""
+        existing = db.execute_query(
+            f"""SELECT TABLE_NAME AS table_name, SUM(COLUMN_NAME = '{IMPORT_BATCH_COLUMN}') AS has_column
+                FROM information_schema.COLUMNS
+                WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME IN ({", ".join(["%s"] * len(IMPORT_BATCH_TABLES))})
+                GROUP BY TABLE_NAME""",
+            IMPORT_BATCH_TABLES,
+            fetch=True,
+            primary=True,
+        )
+        if existing is None:
+            return False
+        for row in existing:
+            if not row["has_column"]:
+                # Индекс нужен только живой таблице: по нему читаются ID пачки
+                index = ""
+                if row["table_name"] == "offers":
+                    index = f", ADD INDEX idx_{IMPORT_BATCH_COLUMN} ({IMPORT_BATCH_COLUMN})"
+                db.execute_query(
+                    f"ALTER TABLE {row['table_name']} ADD COLUMN {IMPORT_BATCH_COLUMN} CHAR(32) NULL{index}"
+                )
+        return True
+
+    @staticmethod
+    def read_rows(file, filename: str):
+        """Строки файла как словари (номер строки считается с 1)"""
+        ext = os.path.splitext(filename or "")[1].lower()
+        if ext == ".csv":
+            text = io.TextIOWrapper(file, encoding="utf-8-sig", newline="")
+            yield from csv.DictReader(text)
+        elif ext in (".jsonl", ".ndjson"):
+            for line in io.TextIOWrapper(file, encoding="utf-8-sig"):
+                if line.strip():
+                    yield json.loads(line)
+        elif ext == ".json":
+            # Обычный JSON-массив без потокового парсера читается целиком
+            data = json.load(io.TextIOWrapper(file, encoding="utf-8-sig"))
+            if not isinstance(data, list):
+                raise ValueError("JSON должен быть массивом объявлений")
+            yield from data
+        else:
+            raise ValueError("Поддерживаются файлы .csv, .json и .jsonl")
+
+    @staticmethod
+    def validate_row(row, images: Optional[zipfile.ZipFile]) -> Tuple[Optional[Dict[str, Any]], List[str]]:
+        """Проверить строку: (поля объявления, []) или (None, ошибки)"""
+        if not isinstance(row, dict):
+            return None, ["Строка должна быть объектом с полями"]
+
+        values = {
+            key: str(row.get(key) or "").strip()
+            for key in ("give", "get", "contact", "category", "city", "district", "image")
+        }
+        errors = []
+        for key in ("give", "get", "contact"):
+            if not values[key]:
+                errors.append(f"Не заполнено поле {key}")
+        for key, limit in IMPORT_FIELD_LIMITS.items():
+            if len(values[key]) > limit:
+                errors.append(f"Поле {key} длиннее {limit} символов")
+        if values["category"] not in OFFER_CATEGORIES:
+            errors.append(f"Неизвестная категория '{values['category']}'")
+        if values["city"] not in OFFER_CITIES:
+            errors.append(f"Неизвестный город '{values['city']}'")
+
+        if values["image"]:
+            info = None
+            if images is not None:
+                try:
+                    info = images.getinfo(values["image"])
+                except KeyError:
+                    pass
+            if info is None:
+                errors.append(f"Нет фото '{values['image']}' в архиве")
+            elif info.file_size > IMPORT_MAX_IMAGE_BYTES:
+                errors.append(f"Фото '{values['image']}' больше {IMPORT_MAX_IMAGE_BYTES // (1024 * 1024)} МБ")
+
+        if errors:
+            return None, errors
+        values["district"] = values["district"] or None
+        return values, []
+
+    @staticmethod
+    def _image_ext(head: bytes) -> Optional[str]:
+        for signature, ext in IMAGE_SIGNATURES.items():
+            if head.startswith(signature) and (ext != ".webp" or head[8:12] == b"WEBP"):
+                return ext
+        return None
+
+    @staticmethod
+    def save_image(images: zipfile.ZipFile, name: str, upload_dir: str, user_id: int) -> str:
+        """Извлечь фото из архива в upload_dir под новым именем (ValueError - не фото)"""
+        with images.open(name) as source:
+            head = source.read(16)
+            ext = OfferImportService._image_ext(head)
+            if ext is None:
+                raise ValueError(f"Файл '{name}' не является фото JPG, PNG, GIF или WebP")
+            filename = f"offer_{user_id}_{uuid.uuid4().hex}{ext}"
+            with open(os.path.join(upload_dir, filename), "wb") as target:
+                target.write(head)
+                shutil.copyfileobj(source, target)
+        return filename
+
+    @staticmethod
+    def _insert_batch(
+        user_id: int,
+        batch: List[Tuple[int, Dict[str, Any]]],
+        images: Optional[zipfile.ZipFile],
+        pool: ThreadPoolExecutor,
+        upload_dir: str,
+        url_prefix: str,
+    ) -> List[Dict[str, Any]]:
+        """Фото пачки - параллельно, строки - одним INSERT; отчет по строкам пачки"""
+        futures = {
+            number: pool.submit(OfferImportService.save_image, images, values["image"], upload_dir, user_id)
+            for number, values in batch
+            if values["image"]
+        }
+        report, rows, saved = [], [], []
+        for number, values in batch:
+            image_url = None
+            if number in futures:
+                try:
+                    filename = futures[number].result()
+                except (ValueError, OSError, zipfile.BadZipFile) as e:
+                    report.append({"row": number, "status": "error", "errors": [str(e)]})
+                    continue
+                saved.append(os.path.join(upload_dir, filename))
+                image_url = url_prefix + filename
+            values["image_url"] = image_url
+            rows.append((number, values))
+
+        if not rows:
+            return report
+        try:
+            token = uuid.uuid4().hex
+            with db.transaction() as cursor:
+                # executemany для INSERT отправляет один многострочный INSERT ... VALUES (...), (...)
+                cursor.executemany(
+                    f"""INSERT INTO offers (user_id, give, `get`, contact,
+                       category, city, district, image_url, {IMPORT_BATCH_COLUMN}, created_at)
+                       VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s, NOW())""",
+                    [
+                        (user_id, v["give"], v["get"], v["contact"], v["category"], v["city"],
+                         v["district"], v["image_url"], token)
+                        for _, v in rows
+                    ],
+                )
+                # ID одного INSERT возрастают в порядке строк, но не обязаны идти подряд
+                # (innodb_autoinc_lock_mode = 2, auto_increment_increment), поэтому
+                # они читаются обратно по метке пачки
+                cursor.execute(
+                    f"SELECT id FROM offers WHERE {IMPORT_BATCH_COLUMN} = %s ORDER BY id", (token,)
+                )
+                offer_ids = [row["id"] for row in cursor.fetchall()]
+                if len(offer_ids) != len(rows):
+                    raise RuntimeError(f"Вставлено {len(offer_ids)} строк из {len(rows)}")
+        except Exception as e:
+            logger.exception("Ошибка вставки пачки объявлений: %s", e)
+            FileService.delete_later(*saved)
+            return report + [
+                {"row": number, "status": "error", "errors": ["Ошибка сохранения объявления"]}
+                for number, _ in rows
+            ]
+
+        for offer_id, (number, values) in zip(offer_ids, rows):
+            report.append({"row": number, "status": "created", "offer_id": offer_id})
+            events.publish_offer_created({
+                "id": offer_id, "user_id": user_id, "give": values["give"], "get": values["get"],
+                "category": values["category"], "city": values["city"], "image_url": values["image_url"],
+            })
+        return report
+
+    @staticmethod
+    def import_offers(
+        user_id: int,
+        file,
+        filename: str,
+        images_file=None,
+        upload_dir: str = "",
+        url_prefix: str = "",
+    ) -> Dict[str, Any]:
+        """Загрузить объявления пользователя; ValueError - файл не читается целиком"""
+        try:
+            images = zipfile.ZipFile(images_file) if images_file is not None else None
+        except zipfile.BadZipFile:
+            raise ValueError("Архив фото должен быть zip-файлом")
+
+        report, batch, scopes = [], [], set()
+        number = 0
+        try:
+            with ThreadPoolExecutor(IMPORT_IMAGE_WORKERS, thread_name_prefix="offer-import") as pool:
+                try:
+                    for number, row in enumerate(OfferImportService.read_rows(file, filename), start=1):
+                        if number > IMPORT_MAX_ROWS:
+                            report.append({
+                                "row": number, "status": "error",
+                                "errors": [f"Больше {IMPORT_MAX_ROWS} строк - остаток файла пропущен"],
+                            })
+                            break
+                        values, errors = OfferImportService.validate_row(row, images)
+                        if errors:
+                            report.append({"row": number, "status": "error", "errors": errors})
+                            continue
+                        batch.append((number, values))
+                        scopes.add((values["category"], values["city"]))
+                        if len(batch) == IMPORT_BATCH:
+                            report += OfferImportService._insert_batch(
+                                user_id, batch, images, pool, upload_dir, url_prefix
+                            )
+                            batch = []
+                except (UnicodeDecodeError, csv.Error, json.JSONDecodeError) as e:
+                    # Уже загруженные пачки остаются, отчет показывает, где файл сломан
+                    report.append({
+                        "row": number + 1, "status": "error", "errors": [f"Не удалось прочитать файл: {e}"],
+                    })
+                if batch:
+                    report += OfferImportService._insert_batch(user_id, batch, images, pool, upload_dir, url_prefix)
+        finally:
+            if images is not None:
+                images.close()
+
+        created = sum(1 for row in report if row["status"] == "created")
+        if created:
+            CacheService.invalidate_user_offers(user_id)
+            CacheService.invalidate_facets()
+            for category, city in scopes:
+                CacheService.invalidate_listings(category, city)
+        report.sort(key=lambda row: row["row"])
+        return {"created": created, "failed": len(report) - created, "rows": report}
+
+
+class OfferArchiveService:
+    """Холодное хранение снятых объявлений (таблица offers_archive).
+
+    deactivate_offer только снимает флаг; фоновая задача offer_archive
+    пачками переносит снятые (и, если задан срок, просроченные) объявления
+    из offers в offers_archive с тем же ID. Живая таблица остается маленькой,
+    а история обменов, сообщений и профиль продолжают видеть объявление.
+    """
+
+    @staticmethod
+    def ensure_table():
+        """Создать архив по структуре offers, добавить поля архивации и индексы offers"""
+        created = db.execute_query("CREATE TABLE IF NOT EXISTS offers_archive LIKE offers")
+        indexes = db.execute_query(
+            """SELECT DISTINCT INDEX_NAME AS name FROM information_schema.STATISTICS
+               WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'offers'""",
+            fetch=True,
+            primary=True,
+        ) or []
+        index_names = {row["name"] for row in indexes}
+        for index, columns in OFFER_ARCHIVE_INDEXES.items():
+            if index_names and index not in index_names:
+                db.execute_query(f"ALTER TABLE offers ADD INDEX {index} {columns}")
+        existing = db.execute_query(
+            """SELECT COLUMN_NAME AS name FROM information_schema.COLUMNS
+               WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'offers_archive'""",
+            fetch=True,
+            primary=True,
+        ) or []
+        names = {row["name"] for row in existing}
+        for column, definition in OFFER_ARCHIVE_COLUMNS.items():
+            if names and column not in names:
+                db.execute_query(f"ALTER TABLE offers_archive ADD COLUMN {column} {definition}")
+        if names and "archived_at" not in names:
+            db.execute_query("ALTER TABLE offers_archive ADD INDEX idx_archive_user (user_id, archived_at)")
+        return created is not None
+
+    @staticmethod
+    def _archive_ids(cursor, where: str, params: tuple, reason: str, limit: int) -> List[Dict[str, Any]]:
+        """Перенести до limit объявлений в архив в текущей транзакции.
+
+        Кандидаты выбираются обычным (неблокирующим) чтением, блокируются
+        только они - по первичному ключу, с повторной проверкой условия.
+        Блокирующее чтение с условием по неключевым полям ставило бы
+        next-key блокировки на все просмотренные строки и задерживало
+        обычные записи в offers.
+        """
+        cursor.execute(
+            f"SELECT id FROM offers WHERE {where} ORDER BY id LIMIT %s",
+            params + (limit,),
+        )
+        candidates = [row["id"] for row in cursor.fetchall()]
+        if not candidates:
+            return []
+
+        cursor.execute(
+            f"""SELECT id, user_id, is_active, category, city FROM offers
+                WHERE id IN ({", ".join(["%s"] * len(candidates))}) AND {where}
+                FOR UPDATE""",
+            tuple(candidates) + params,
+        )
+        rows = cursor.fetchall()
+        if not rows:
+            return rows
+
+        ids = [row["id"] for row in rows]
+        placeholders = ", ".join(["%s"] * len(ids))
+        cursor.execute("SHOW COLUMNS FROM offers")
+        columns = ", ".join(f"`{column['Field']}`" for column in cursor.fetchall())
+        cursor.execute(
+            f"""INSERT INTO offers_archive ({columns}, archived_at, archive_reason)
+                SELECT {columns}, NOW(), %s FROM offers WHERE id IN ({placeholders})""",
+            [reason] + ids,
+        )
+        cursor.execute(
+            f"UPDATE offers_archive SET is_active = FALSE WHERE id IN ({placeholders})", ids
+        )
+        cursor.execute(f"DELETE FROM offers WHERE id IN ({placeholders})", ids)
+        return rows
+
+    @staticmethod
+    def archive_batch(limit: int = OFFER_ARCHIVE_BATCH) -> Dict[str, int]:
+        """Одна пачка: снятые объявления, затем просроченные (если задан срок)"""
+        with db.transaction() as cursor:
+            inactive = OfferArchiveService._archive_ids(cursor, "is_active = FALSE", (), "inactive", limit)
+
+        expired = []
+        if OFFER_EXPIRE_DAYS > 0 and len(inactive) < limit:
+            with db.transaction() as cursor:
+                expired = OfferArchiveService._archive_ids(
+                    cursor,
+                    "is_active = TRUE AND created_at < NOW() - INTERVAL %s DAY",
+                    (OFFER_EXPIRE_DAYS,),
+                    "expired",
+                    limit - len(inactive),
+                )
+            # Просроченные объявления пропадают из выдачи - как при снятии
+            for row in expired:
+                CacheService.invalidate_offer(row["id"], row["user_id"])
+                events.publish_offer_deactivated(row["id"])
+            for category, city in {(row["category"], row["city"]) for row in expired}:
+                CacheService.invalidate_listings(category, city)
+            if expired:
+                CacheService.invalidate_facets()
+
+        return {"inactive": len(inactive), "expired": len(expired)}
+
+    @staticmethod
+    def archive_all(time_budget: float = 60) -> Dict[str, int]:
+        """Фоновая задача: архивировать пачками, пока есть что и не вышло время"""
+        totals = {"inactive": 0, "expired": 0}
+        deadline = time.monotonic() + time_budget
+        while time.monotonic() < deadline:
+            moved = OfferArchiveService.archive_batch()
+            for key, value in moved.items():
+                totals[key] += value
+            if sum(moved.values()) < OFFER_ARCHIVE_BATCH:
+                break
+        if any(totals.values()):
+            logger.info("Объявления перенесены в архив", extra=totals)
+        return totals
+
+    @staticmethod
+    def get_user_archived_offers(user_id: int, limit: int = 20) -> List[Dict[str, Any]]:
+        """Архивные объявления пользователя (для профиля), новые сверху"""
+        return db.execute_query(
+            """SELECT id, give, `get`, image_url, created_at, archived_at, archive_reason
+               FROM offers_archive
+               WHERE user_id = %s
+               ORDER BY archived_at DESC
+               LIMIT %s""",
+            (user_id, limit),
+            fetch=True,
+        ) or []
+
+
+# Агрегаты рейтинга; используются и отдельным запросом, и сводными загрузчиками страниц
+RATING_STATS_COLUMNS = """
                 COALESCE(AVG(rating), 0) as avg_rating,
                 COALESCE(COUNT(*), 0) as total_ratings,
                 COALESCE(SUM(CASE WHEN rating = 5 THEN 1 ELSE 0 END), 0) as five_star,
@@ -187,22 +1002,35 @@ class RatingService:
                 COALESCE(SUM(CASE WHEN rating = 3 THEN 1 ELSE 0 END), 0) as three_star,
                 COALESCE(SUM(CASE WHEN rating = 2 THEN 1 ELSE 0 END), 0) as two_star,
                 COALESCE(SUM(CASE WHEN rating = 1 THEN 1 ELSE 0 END), 0) as one_star
+"""
+
+
+class RatingService:
+    @staticmethod
+    def get_user_rating_stats(user_id: int) -> Dict[str, Any]:
+        """Получить статистику рейтинга пользователя"""
+        rating_query = f"""
+            SELECT {RATING_STATS_COLUMNS}
             FROM ratings 
             WHERE target_user_id = %s
         """
         stats = db.execute_query(rating_query, (user_id,), fetch=True)
+        return RatingService.stats_from_row(stats[0] if stats else None)
 
-        if stats and stats[0]:
-            total_ratings = int(stats[0]["total_ratings"])
+    @staticmethod
+    def stats_from_row(row: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """Статистика рейтинга из строки с колонками RATING_STATS_COLUMNS"""
+        if row:
+            total_ratings = int(row["total_ratings"])
 
             if total_ratings > 0:
-                avg_rating = float(stats[0]["avg_rating"])
+                avg_rating = float(row["avg_rating"])
                 distribution = {
-                    5: (int(stats[0]["five_star"]) / total_ratings) * 100,
-                    4: (int(stats[0]["four_star"]) / total_ratings) * 100,
-                    3: (int(stats[0]["three_star"]) / total_ratings) * 100,
-                    2: (int(stats[0]["two_star"]) / total_ratings) * 100,
-                    1: (int(stats[0]["one_star"]) / total_ratings) * 100,
+                    5: (int(row["five_star"]) / total_ratings) * 100,
+                    4: (int(row["four_star"]) / total_ratings) * 100,
+                    3: (int(row["three_star"]) / total_ratings) * 100,
+                    2: (int(row["two_star"]) / total_ratings) * 100,
+                    1: (int(row["one_star"]) / total_ratings) * 100,
                 }
             else:
                 avg_rating = 0
@@ -275,6 +1103,8 @@ class RatingService:
                 (rater_id, target_user_id, rating, comment),
             )
         
+        # Рейтинг автора входит в закешированные карточки его объявлений
+        CacheService.invalidate_user_cards(target_user_id)
         return True
 
     @staticmethod
@@ -292,33 +1122,428 @@ class RatingService:
         ) or []
 
 
+# Статусы обмена и разрешенные переходы
+EXCHANGE_PROPOSED = "proposed"
+EXCHANGE_ACCEPTED = "accepted"
+EXCHANGE_COMPLETED = "completed"
+EXCHANGE_CANCELLED = "cancelled"
+EXCHANGE_OPEN_STATUSES = (EXCHANGE_PROPOSED, EXCHANGE_ACCEPTED)
+
+# Колонки, которые нужны сервису в таблице exchanges (добавляются, если их нет)
+EXCHANGE_COLUMNS = {
+    "offer1_id": "INT NULL",
+    "offer2_id": "INT NULL",
+    "created_at": "TIMESTAMP DEFAULT CURRENT_TIMESTAMP",
+    "updated_at": "TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP",
+}
+
+
 class ExchangeService:
+    """Жизненный цикл обмена: предложение -> принятие -> завершение (или отмена).
+
+    offer1_user_id - кто предложил (и что отдает, offer1_id - необязательно),
+    offer2_user_id - автор объявления offer2_id. Каждый переход в одной
+    транзакции меняет статус обмена, строки участников (exchange_participants)
+    и счетчики участников (user_exchange_counts), поэтому статистика профиля -
+    чтение по первичному ключу, а история - по индексу участника без OR.
+    """
+
     @staticmethod
-    def count_successful_exchanges(user_id: int) -> int:
-        """Посчитать успешные обмены пользователя"""
+    def ensure_tables():
+        """Создать таблицы обменов и счетчиков; заполнить их по старым обменам"""
+        db.execute_query(
+            """CREATE TABLE IF NOT EXISTS exchanges (
+                   id INT AUTO_INCREMENT PRIMARY KEY,
+                   offer1_id INT NULL,
+                   offer2_id INT NULL,
+                   offer1_user_id INT NOT NULL,
+                   offer2_user_id INT NOT NULL,
+                   status VARCHAR(20) NOT NULL DEFAULT 'proposed',
+                   created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                   updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+               )"""
+        )
+        existing = db.execute_query(
+            """SELECT COLUMN_NAME AS name FROM information_schema.COLUMNS
+               WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'exchanges'""",
+            fetch=True,
+        ) or []
+        names = {row["name"] for row in existing}
+        for column, definition in EXCHANGE_COLUMNS.items():
+            if names and column not in names:
+                db.execute_query(f"ALTER TABLE exchanges ADD COLUMN {column} {definition}")
+
+        db.execute_query(
+            """CREATE TABLE IF NOT EXISTS exchange_participants (
+                   user_id INT NOT NULL,
+                   exchange_id INT NOT NULL,
+                   counterpart_id INT NOT NULL,
+                   role VARCHAR(10) NOT NULL,
+                   status VARCHAR(20) NOT NULL,
+                   updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+                   PRIMARY KEY (user_id, exchange_id),
+                   KEY idx_participant_status (user_id, status, updated_at),
+                   KEY idx_exchange (exchange_id)
+               )"""
+        )
+        created = db.execute_query(
+            """CREATE TABLE IF NOT EXISTS user_exchange_counts (
+                   user_id INT NOT NULL PRIMARY KEY,
+                   open_count INT NOT NULL DEFAULT 0,
+                   completed INT NOT NULL DEFAULT 0,
+                   cancelled INT NOT NULL DEFAULT 0
+               )"""
+        )
+
+        has_participants = db.execute_query(
+            "SELECT 1 FROM exchange_participants LIMIT 1", fetch=True, primary=True
+        )
+        if not has_participants:
+            ExchangeService.reconcile_all()
+        return created is not None
+
+    @staticmethod
+    def reconcile_all() -> int:
+        """Перестроить строки участников и счетчики по таблице exchanges"""
+        with db.transaction() as cursor:
+            cursor.execute(
+                """INSERT IGNORE INTO exchange_participants
+                       (user_id, exchange_id, counterpart_id, role, status)
+                   SELECT offer1_user_id, id, offer2_user_id, 'proposer', status FROM exchanges
+                   UNION ALL
+                   SELECT offer2_user_id, id, offer1_user_id, 'owner', status FROM exchanges"""
+            )
+            cursor.execute(
+                """UPDATE exchange_participants p
+                   JOIN exchanges e ON e.id = p.exchange_id
+                   SET p.status = e.status
+                   WHERE p.status <> e.status"""
+            )
+            cursor.execute("DELETE FROM user_exchange_counts")
+            cursor.execute(
+                """INSERT INTO user_exchange_counts (user_id, open_count, completed, cancelled)
+                   SELECT user_id,
+                          SUM(status IN ('proposed', 'accepted')),
+                          SUM(status = 'completed'),
+                          SUM(status = 'cancelled')
+                   FROM exchange_participants
+                   GROUP BY user_id"""
+            )
+            return cursor.rowcount
+
+    @staticmethod
+    def _bump_counters(cursor, user_ids: List[int], open_count: int = 0, completed: int = 0, cancelled: int = 0):
+        """Изменить счетчики участников в текущей транзакции (не ниже нуля)"""
+        for user_id in user_ids:
+            cursor.execute(
+                """INSERT INTO user_exchange_counts (user_id, open_count, completed, cancelled)
+                   VALUES (%s, GREATEST(%s, 0), GREATEST(%s, 0), GREATEST(%s, 0))
+                   ON DUPLICATE KEY UPDATE
+                       open_count = GREATEST(open_count + %s, 0),
+                       completed = GREATEST(completed + %s, 0),
+                       cancelled = GREATEST(cancelled + %s, 0)""",
+                (user_id, open_count, completed, cancelled, open_count, completed, cancelled),
+            )
+
+    @staticmethod
+    def propose(
+        proposer_id: int,
+        offer_id: int,
+        my_offer_id: Optional[int] = None,
+        message: Optional[str] = None
+    ) -> Optional[int]:
+        """Предложить обмен на объявление offer_id; вернуть ID обмена"""
+        offer = db.execute_query(
+            "SELECT id, user_id, give FROM offers WHERE id = %s AND is_active = TRUE",
+            (offer_id,),
+            fetch=True,
+        )
+        if not offer or offer[0]["user_id"] == proposer_id:
+            return None
+        owner_id = offer[0]["user_id"]
+
+        if my_offer_id:
+            mine = db.execute_query(
+                "SELECT id FROM offers WHERE id = %s AND user_id = %s AND is_active = TRUE",
+                (my_offer_id, proposer_id),
+                fetch=True,
+            )
+            if not mine:
+                return None
+
+        try:
+            with db.transaction() as cursor:
+                # Одно открытое предложение на пару (кто предлагает, объявление)
+                cursor.execute(
+                    """SELECT exchange_id FROM exchange_participants p
+                       JOIN exchanges e ON e.id = p.exchange_id
+                       WHERE p.user_id = %s AND p.status IN ('proposed', 'accepted')
+                         AND e.offer2_id = %s
+                       FOR UPDATE""",
+                    (proposer_id, offer_id),
+                )
+                if cursor.fetchall():
+                    return None
+
+                cursor.execute(
+                    """INSERT INTO exchanges
+                           (offer1_id, offer2_id, offer1_user_id, offer2_user_id, status, created_at)
+                       VALUES (%s, %s, %s, %s, %s, NOW())""",
+                    (my_offer_id, offer_id, proposer_id, owner_id, EXCHANGE_PROPOSED),
+                )
+                exchange_id = cursor.lastrowid
+                cursor.execute(
+                    """INSERT INTO exchange_participants
+                           (user_id, exchange_id, counterpart_id, role, status)
+                       VALUES (%s, %s, %s, 'proposer', %s), (%s, %s, %s, 'owner', %s)""",
+                    (proposer_id, exchange_id, owner_id, EXCHANGE_PROPOSED,
+                     owner_id, exchange_id, proposer_id, EXCHANGE_PROPOSED),
+                )
+                ExchangeService._bump_counters(cursor, [proposer_id, owner_id], open_count=1)
+        except Exception as e:
+            logger.exception("Ошибка создания обмена: %s", e)
+            return None
+
+        # Предложение появляется в диалоге участников
+        text = message.strip() if message and message.strip() else f"Предлагаю обмен на «{offer[0]['give']}»"
+        MessageService.send_message(proposer_id, owner_id, text, offer_id)
+        return exchange_id
+
+    @staticmethod
+    def _transition(
+        exchange_id: int,
+        user_id: int,
+        from_statuses: tuple,
+        to_status: str,
+        owner_only: bool = False
+    ) -> Optional[Dict[str, Any]]:
+        """Перевести обмен в новый статус; None - переход невозможен"""
+        try:
+            with db.transaction() as cursor:
+                cursor.execute("SELECT * FROM exchanges WHERE id = %s FOR UPDATE", (exchange_id,))
+                rows = cursor.fetchall()
+                if not rows:
+                    return None
+                exchange = rows[0]
+                participants = [exchange["offer1_user_id"], exchange["offer2_user_id"]]
+                allowed = [exchange["offer2_user_id"]] if owner_only else participants
+                if user_id not in allowed or exchange["status"] not in from_statuses:
+                    return None
+
+                cursor.execute(
+                    "UPDATE exchanges SET status = %s WHERE id = %s", (to_status, exchange_id)
+                )
+                cursor.execute(
+                    "UPDATE exchange_participants SET status = %s WHERE exchange_id = %s",
+                    (to_status, exchange_id),
+                )
+                if to_status == EXCHANGE_COMPLETED:
+                    ExchangeService._bump_counters(cursor, participants, open_count=-1, completed=1)
+                elif to_status == EXCHANGE_CANCELLED:
+                    ExchangeService._bump_counters(cursor, participants, open_count=-1, cancelled=1)
+        except Exception as e:
+            logger.exception("Ошибка смены статуса обмена %s: %s", exchange_id, e)
+            return None
+
+        exchange["status"] = to_status
+        return exchange
+
+    @staticmethod
+    def _notify(exchange: Dict[str, Any], user_id: int, text: str):
+        """Сообщение второму участнику в их диалоге"""
+        other_id = (
+            exchange["offer2_user_id"] if user_id == exchange["offer1_user_id"] else exchange["offer1_user_id"]
+        )
+        MessageService.send_message(user_id, other_id, text, exchange.get("offer2_id"))
+
+    @staticmethod
+    def accept(exchange_id: int, user_id: int) -> bool:
+        """Принять предложение (только автор объявления)"""
+        exchange = ExchangeService._transition(
+            exchange_id, user_id, (EXCHANGE_PROPOSED,), EXCHANGE_ACCEPTED, owner_only=True
+        )
+        if exchange:
+            ExchangeService._notify(exchange, user_id, "Предложение обмена принято")
+        return exchange is not None
+
+    @staticmethod
+    def complete(exchange_id: int, user_id: int) -> bool:
+        """Отметить принятый обмен состоявшимся (любой участник)"""
+        exchange = ExchangeService._transition(
+            exchange_id, user_id, (EXCHANGE_ACCEPTED,), EXCHANGE_COMPLETED
+        )
+        if exchange:
+            # Число состоявшихся обменов видно в публичных профилях участников
+            CacheService.invalidate_profiles(exchange["offer1_user_id"], exchange["offer2_user_id"])
+            ExchangeService._notify(exchange, user_id, "Обмен отмечен как состоявшийся")
+        return exchange is not None
+
+    @staticmethod
+    def cancel(exchange_id: int, user_id: int) -> bool:
+        """Отменить или отклонить незавершенный обмен (любой участник)"""
+        exchange = ExchangeService._transition(
+            exchange_id, user_id, EXCHANGE_OPEN_STATUSES, EXCHANGE_CANCELLED
+        )
+        if exchange:
+            ExchangeService._notify(exchange, user_id, "Обмен отменен")
+        return exchange is not None
+
+    @staticmethod
+    def get_counts(user_id: int) -> Dict[str, int]:
+        """Счетчики обменов пользователя - чтение по первичному ключу"""
         result = db.execute_query(
-            """SELECT COUNT(*) AS count FROM exchanges 
-               WHERE (offer1_user_id = %s OR offer2_user_id = %s) 
-               AND status = 'completed'""",
-            (user_id, user_id),
+            "SELECT open_count, completed, cancelled FROM user_exchange_counts WHERE user_id = %s",
+            (user_id,),
             fetch=True,
         )
-        return result[0]["count"] if result else 0
+        if result:
+            return {key: int(value) for key, value in result[0].items()}
+        return {"open_count": 0, "completed": 0, "cancelled": 0}
+
+    @staticmethod
+    def count_successful_exchanges(user_id: int) -> int:
+        """Посчитать успешные обмены пользователя"""
+        return ExchangeService.get_counts(user_id)["completed"]
+
+    @staticmethod
+    def get_user_exchanges(
+        user_id: int,
+        status: Optional[str] = None,
+        limit: int = 50
+    ) -> List[Dict[str, Any]]:
+        """История обменов пользователя (по индексу участника)"""
+        where = "p.user_id = %s"
+        params: List[Any] = [user_id]
+        if status:
+            where += " AND p.status = %s"
+            params.append(status)
+        params.append(limit)
+
+        return db.execute_query(
+            f"""SELECT e.*, p.role, p.counterpart_id,
+                       u.username AS counterpart_username, u.avatar_url AS counterpart_avatar,
+                       COALESCE(o1.give, a1.give) AS offer1_give, COALESCE(o2.give, a2.give) AS offer2_give
+                FROM exchange_participants p
+                JOIN exchanges e ON e.id = p.exchange_id
+                JOIN users u ON u.id = p.counterpart_id
+                LEFT JOIN offers o1 ON o1.id = e.offer1_id
+                LEFT JOIN offers o2 ON o2.id = e.offer2_id
+                LEFT JOIN offers_archive a1 ON o1.id IS NULL AND a1.id = e.offer1_id
+                LEFT JOIN offers_archive a2 ON o2.id IS NULL AND a2.id = e.offer2_id
+                WHERE {where}
+                ORDER BY p.updated_at DESC
+                LIMIT %s""",
+            params,
+            fetch=True,
+        ) or []
 
 
 class AuthService:
+    """Подписанные сессии со снимком пользователя.
+
+    Cookie содержит id, имя, аватар и версию сессии (sv, se). Пока снимок
+    свежий и версии совпадают с user_session_versions, запрос обходится без БД
+    (версии читаются из кеша). version растет при изменении профиля - снимок
+    перевыпускается; epoch растет при отзыве - все сессии пользователя
+    становятся недействительными.
+    """
+
     @staticmethod
-    def generate_token(user_id: int) -> str:
-        """Сгенерировать токен для пользователя"""
-        return serializer.dumps(user_id)
+    def ensure_table():
+        """Создать таблицу версий сессий, если ее нет"""
+        db.execute_query(
+            """CREATE TABLE IF NOT EXISTS user_session_versions (
+                   user_id INT NOT NULL PRIMARY KEY,
+                   version INT NOT NULL DEFAULT 0,
+                   epoch INT NOT NULL DEFAULT 0
+               )"""
+        )
+
+    @staticmethod
+    def get_session_state(user_id: int) -> Dict[str, int]:
+        """Текущие версия и эпоха сессий пользователя (из кеша)"""
+        def load():
+            result = db.execute_query(
+                "SELECT version, epoch FROM user_session_versions WHERE user_id = %s",
+                (user_id,),
+                fetch=True,
+            )
+            if result is None:
+                return None
+            return result[0] if result else {"version": 0, "epoch": 0}
+
+        state = session_cache.get_or_load(user_id, load)
+        return state or {"version": 0, "epoch": 0}
+
+    @staticmethod
+    def _bump_session_state(user_id: int, column: str):
+        db.execute_query(
+            f"""INSERT INTO user_session_versions (user_id, {column}) VALUES (%s, 1)
+                ON DUPLICATE KEY UPDATE {column} = {column} + 1""",
+            (user_id,),
+        )
+        CacheService._delete(session_cache, user_id)
+
+    @staticmethod
+    def invalidate_sessions(user_id: int):
+        """Данные пользователя изменились: снимки в сессиях будут перевыпущены"""
+        AuthService._bump_session_state(user_id, "version")
+
+    @staticmethod
+    def revoke_sessions(user_id: int):
+        """Отозвать все сессии пользователя (выход на всех устройствах)"""
+        AuthService._bump_session_state(user_id, "epoch")
+
+    @staticmethod
+    def snapshot(user: Dict[str, Any]) -> Dict[str, Any]:
+        """Поля пользователя, которые хранятся в сессии"""
+        return {"id": user["id"], "username": user["username"], "avatar_url": user.get("avatar_url")}
+
+    @staticmethod
+    def generate_token(user: Dict[str, Any]) -> str:
+        """Сгенерировать токен сессии со снимком пользователя"""
+        state = AuthService.get_session_state(user["id"])
+        return serializer.dumps({
+            "id": user["id"],
+            "u": user["username"],
+            "a": user.get("avatar_url"),
+            "sv": state["version"],
+            "se": state["epoch"],
+        })
 
     @staticmethod
     def verify_token(token: str) -> Optional[int]:
-        """Верифицировать токен и получить ID пользователя"""
+        """Верифицировать токен и получить ID пользователя (только подпись, без БД)"""
         try:
-            return serializer.loads(token, max_age=3600 * 24 * 30)
+            payload = serializer.loads(token, max_age=SESSION_MAX_AGE)
         except Exception:
             return None
+        # Старые токены содержали только ID
+        return payload.get("id") if isinstance(payload, dict) else payload
+
+    @staticmethod
+    def resolve_session(token: str) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+        """Пользователь из сессии и, если снимок обновлен, новый токен для cookie"""
+        try:
+            payload, issued_at = serializer.loads(token, max_age=SESSION_MAX_AGE, return_timestamp=True)
+        except Exception:
+            return None, None
+        if not isinstance(payload, dict):
+            payload = {"id": payload}
+
+        state = AuthService.get_session_state(payload["id"])
+        if payload.get("se", 0) != state["epoch"]:
+            return None, None
+
+        age = time.time() - issued_at.timestamp()
+        if "u" in payload and payload.get("sv") == state["version"] and age < SESSION_SNAPSHOT_TTL:
+            return {"id": payload["id"], "username": payload["u"], "avatar_url": payload.get("a")}, None
+
+        # Снимок устарел или данные менялись - перечитываем пользователя и продлеваем сессию
+        user = UserService.get_user_by_id(payload["id"])
+        if not user:
+            return None, None
+        return AuthService.snapshot(user), AuthService.generate_token(user)
 
     @staticmethod
     def check_user_exists(username: str, email: str) -> bool:
@@ -361,9 +1586,119 @@ class FileService:
                 os.remove(file_path)
                 return True
         except Exception as e:
-            print(f"Ошибка при удалении файла: {e}")
+            logger.warning("Ошибка при удалении файла: %s", e)
         return False
 
+    @staticmethod
+    def delete_files(paths: List[str]):
+        """Фоновая задача: удалить файлы (ошибка - повтор задачи)"""
+        for path in paths:
+            if os.path.exists(path):
+                os.remove(path)
+
+    @staticmethod
+    def delete_later(*paths: str) -> Optional[int]:
+        """Удалить файлы в фоне, не задерживая ответ"""
+        paths = [path for path in paths if path]
+        if not paths:
+            return None
+        return jobs.enqueue("delete_files", paths=paths)
+
+
+class UnreadCountService:
+    """Поддерживаемый счетчик непрочитанных сообщений (таблица user_unread_counts).
+
+    send_message увеличивает счетчик получателя, прочтение и удаление -
+    уменьшают. Расхождения (гонки, ручные правки БД) исправляет reconcile_all.
+    """
+
+    @staticmethod
+    def ensure_table():
+        """Создать таблицу счетчиков, если ее нет"""
+        db.execute_query(
+            """CREATE TABLE IF NOT EXISTS user_unread_counts (
+                   user_id INT NOT NULL PRIMARY KEY,
+                   unread INT NOT NULL DEFAULT 0,
+                   updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+               )"""
+        )
+
+    @staticmethod
+    def get(user_id: int) -> int:
+        """Прочитать счетчик по первичному ключу (при первом обращении - посчитать)"""
+        result = db.execute_query(
+            "SELECT unread FROM user_unread_counts WHERE user_id = %s",
+            (user_id,),
+            fetch=True,
+        )
+        if result:
+            return result[0]["unread"]
+        return UnreadCountService.reconcile_user(user_id)
+
+    @staticmethod
+    def increment(user_id: int, amount: int = 1):
+        """Увеличить счетчик (новое сообщение).
+
+        Если строки счетчика еще нет, она не создается со значением amount:
+        непрочитанные сообщения могли быть и раньше, поэтому счетчик
+        пересчитывается по таблице messages.
+        """
+        updated = db.execute_query(
+            "UPDATE user_unread_counts SET unread = unread + %s WHERE user_id = %s",
+            (amount, user_id),
+            rowcount=True,
+        )
+        if not updated:
+            UnreadCountService.reconcile_user(user_id)
+
+    @staticmethod
+    def decrement(user_id: int, amount: int):
+        """Уменьшить счетчик (прочтение или удаление), не ниже нуля"""
+        if amount <= 0:
+            return
+        db.execute_query(
+            """UPDATE user_unread_counts
+               SET unread = GREATEST(CAST(unread AS SIGNED) - %s, 0)
+               WHERE user_id = %s""",
+            (amount, user_id),
+        )
+        events.publish_unread_event(user_id)
+
+    @staticmethod
+    def reconcile_user(user_id: int) -> int:
+        """Пересчитать счетчик одного пользователя по таблице messages"""
+        result = db.execute_query(
+            "SELECT COUNT(*) AS count FROM messages WHERE recipient_id = %s AND is_read = FALSE",
+            (user_id,),
+            fetch=True,
+            primary=True,
+        )
+        count = result[0]["count"] if result else 0
+        db.execute_query(
+            """INSERT INTO user_unread_counts (user_id, unread) VALUES (%s, %s)
+               ON DUPLICATE KEY UPDATE unread = VALUES(unread)""",
+            (user_id, count),
+        )
+        events.publish_unread_event(user_id)
+        return count
+
+    @staticmethod
+    def reconcile_all() -> int:
+        """Сверить все счетчики с таблицей messages; вернуть число исправленных"""
+        fixed = db.execute_query(
+            """UPDATE user_unread_counts c
+               LEFT JOIN (
+                   SELECT recipient_id, COUNT(*) AS count
+                   FROM messages
+                   WHERE is_read = FALSE
+                   GROUP BY recipient_id
+               ) m ON m.recipient_id = c.user_id
+               SET c.unread = COALESCE(m.count, 0)
+               WHERE c.unread <> COALESCE(m.count, 0)""",
+            rowcount=True,
+        )
+        return fixed or 0
+
 
 class MessageService:
     @staticmethod
@@ -393,62 +1728,122 @@ class MessageService:
                 offer_id = None
         
         try:
-            db.execute_query(
+            message_id = db.execute_query(
                 """INSERT INTO messages (sender_id, recipient_id, offer_id, message)
                    VALUES (%s, %s, %s, %s)""",
                 (sender_id, recipient_id, offer_id, message.strip()),
             )
+            if not message_id:
+                return False
+            MessageSearchService.index_message(message_id, sender_id, recipient_id, message)
+            UnreadCountService.increment(recipient_id)
+            events.publish_message_event(sender_id, recipient_id)
             return True
         except Exception as e:
-            print(f"Ошибка отправки сообщения: {e}")
+            logger.exception("Ошибка отправки сообщения: %s", e)
             return False
     
     @staticmethod
-    def get_conversation(
-        user1_id: int,
-        user2_id: int,
-        limit: int = 50,
-        offset: int = 0
-    ) -> List[Dict[str, Any]]:
-        """Получить переписку между двумя пользователями - ИСПРАВЛЕНО: ASC вместо DESC"""
-        query = """
+    def _conversation_page(table: str, user1_id: int, user2_id: int, limit: int, offset: int) -> List[Dict[str, Any]]:
+        """Страница переписки из одной таблицы (messages или messages_archive), новые сверху"""
+        query = f"""
             SELECT 
                 m.*,
                 s.username as sender_username,
                 s.avatar_url as sender_avatar,
                 r.username as recipient_username,
                 r.avatar_url as recipient_avatar,
-                o.give as offer_title
-            FROM messages m
+                COALESCE(o.give, oa.give) as offer_title
+            FROM {table} m
             JOIN users s ON m.sender_id = s.id
             JOIN users r ON m.recipient_id = r.id
             LEFT JOIN offers o ON m.offer_id = o.id
+            LEFT JOIN offers_archive oa ON o.id IS NULL AND oa.id = m.offer_id
             WHERE (m.sender_id = %s AND m.recipient_id = %s)
                OR (m.sender_id = %s AND m.recipient_id = %s)
-            ORDER BY m.created_at ASC  # ВАЖНО: ASC вместо DESC!
+            ORDER BY m.id DESC
             LIMIT %s OFFSET %s
         """
-        
-        messages = db.execute_query(
-            query, 
-            (user1_id, user2_id, user2_id, user1_id, limit, offset), 
+        return db.execute_query(
+            query,
+            (user1_id, user2_id, user2_id, user1_id, limit, offset),
             fetch=True
         ) or []
+    
+    @staticmethod
+    def count_conversation(user1_id: int, user2_id: int, table: str = "messages") -> int:
+        """Число сообщений переписки в одной таблице"""
+        result = db.execute_query(
+            f"""SELECT COUNT(*) as count FROM {table}
+                WHERE (sender_id = %s AND recipient_id = %s)
+                   OR (sender_id = %s AND recipient_id = %s)""",
+            (user1_id, user2_id, user2_id, user1_id),
+            fetch=True
+        )
+        return result[0]["count"] if result else 0
+
+    @staticmethod
+    def page_of(user1_id: int, user2_id: int, message_id: int) -> int:
+        """Номер страницы диалога (1 - самые новые), на которой находится сообщение"""
+        newer = 0
+        for table in ("messages", "messages_archive"):
+            result = db.execute_query(
+                f"""SELECT COUNT(*) as count FROM {table}
+                    WHERE ((sender_id = %s AND recipient_id = %s)
+                        OR (sender_id = %s AND recipient_id = %s))
+                      AND id > %s""",
+                (user1_id, user2_id, user2_id, user1_id, message_id),
+                fetch=True
+            )
+            newer += result[0]["count"] if result else 0
+        return newer // CONVERSATION_PAGE + 1
+
+    @staticmethod
+    def get_conversation(
+        user1_id: int,
+        user2_id: int,
+        limit: int = CONVERSATION_PAGE,
+        offset: int = 0
+    ) -> List[Dict[str, Any]]:
+        """Получить переписку между двумя пользователями: последние limit сообщений
+        (offset - сколько самых новых пропустить), от старых к новым.
         
-        # Помечаем сообщения как прочитанные
+        Сначала читается горячая таблица messages; архив затрагивается, только
+        если страница уходит дальше ее начала (прокрутка далеко назад).
+        """
+        messages = MessageService._conversation_page("messages", user1_id, user2_id, limit, offset)
+        
+        if len(messages) < limit:
+            # Горячие сообщения кончились - остаток страницы из архива
+            if messages or not offset:
+                hot_total = offset + len(messages)
+            else:
+                hot_total = MessageService.count_conversation(user1_id, user2_id)
+            messages += MessageService._conversation_page(
+                "messages_archive", user1_id, user2_id, limit - len(messages), max(offset - hot_total, 0)
+            )
+        
+        # Помечаем сообщения как прочитанные (непрочитанные в архив не переносятся)
         if messages:
-            db.execute_query(
+            marked = db.execute_query(
                 """UPDATE messages 
                    SET is_read = TRUE 
                    WHERE recipient_id = %s AND sender_id = %s AND is_read = FALSE""",
                 (user1_id, user2_id),
+                rowcount=True,
             )
+            UnreadCountService.decrement(user1_id, marked or 0)
         
-        return messages  # Теперь сообщения идут от старых к новым
+        messages.reverse()
+        return messages  # Сообщения идут от старых к новым
     
     @staticmethod
     def get_user_dialogs(user_id: int) -> List[Dict[str, Any]]:
-        """Получить список диалогов пользователя с последними сообщениями"""
+        """Получить список диалогов пользователя с последними сообщениями.
+        
+        Читает только горячую таблицу: последнее сообщение каждого диалога
+        и все непрочитанные в архив не переносятся.
+        """
         query = """
             SELECT 
                 other_user.id as other_user_id,
@@ -502,12 +1897,7 @@ class MessageService:
     @staticmethod
     def get_unread_count(user_id: int) -> int:
         """Получить количество непрочитанных сообщений"""
-        result = db.execute_query(
-            "SELECT COUNT(*) as count FROM messages WHERE recipient_id = %s AND is_read = FALSE",
-            (user_id,),
-            fetch=True,
-        )
-        return result[0]["count"] if result else 0
+        return UnreadCountService.get(user_id)
     
     @staticmethod
     def mark_as_read(message_ids: List[int], user_id: int) -> bool:
@@ -519,11 +1909,12 @@ class MessageService:
         query = f"""
             UPDATE messages 
             SET is_read = TRUE 
-            WHERE id IN ({placeholders}) AND recipient_id = %s
+            WHERE id IN ({placeholders}) AND recipient_id = %s AND is_read = FALSE
         """
         
         params = message_ids + [user_id]
-        db.execute_query(query, params)
+        marked = db.execute_query(query, params, rowcount=True)
+        UnreadCountService.decrement(user_id, marked or 0)
         return True
     
     @staticmethod
@@ -531,16 +1922,485 @@ class MessageService:
         """Удалить сообщение (только для отправителя)"""
         # Проверяем, принадлежит ли сообщение пользователю
         message = db.execute_query(
-            "SELECT id FROM messages WHERE id = %s AND sender_id = %s",
+            "SELECT id, recipient_id, is_read FROM messages WHERE id = %s AND sender_id = %s",
             (message_id, user_id),
             fetch=True,
+            primary=True,
         )
         
         if not message:
-            return False
+            # Старое сообщение могло уже уехать в архив
+            deleted = db.execute_query(
+                "DELETE FROM messages_archive WHERE id = %s AND sender_id = %s",
+                (message_id, user_id),
+                rowcount=True,
+            )
+            if deleted:
+                MessageSearchService.forget_message(message_id)
+            return bool(deleted)
         
         db.execute_query(
             "DELETE FROM messages WHERE id = %s",
             (message_id,),
         )
-        return True
\ No newline at end of file
+        MessageSearchService.forget_message(message_id)
+        # Диалог должен остаться в списке, даже если удалено его последнее горячее сообщение
+        MessageArchiveService.restore_last(user_id, message[0]["recipient_id"])
+        
+        # Непрочитанное сообщение исчезло и у получателя
+        if not message[0]["is_read"]:
+            UnreadCountService.decrement(message[0]["recipient_id"], 1)
+        return True
+    
+    @staticmethod
+    def _delete_conversation_batch(
+        user_id: int, other_user_id: int, max_id: Optional[int] = None, table: str = "messages"
+    ) -> Optional[int]:
+        """Удалить CLEAR_BATCH самых новых сообщений переписки (не новее max_id)"""
+        return db.execute_query(
+            f"""DELETE FROM {table} 
+                WHERE ((sender_id = %s AND recipient_id = %s)
+                    OR (sender_id = %s AND recipient_id = %s))
+                  AND id <= %s
+                ORDER BY id DESC
+                LIMIT %s""",
+            (user_id, other_user_id, other_user_id, user_id, max_id or 2 ** 63 - 1, CLEAR_BATCH),
+            rowcount=True,
+        )
+    
+    @staticmethod
+    def clear_conversation(user_id: int, other_user_id: int) -> bool:
+        """Удалить всю переписку двух пользователей.
+        
+        Новейшие CLEAR_BATCH сообщений (то, что видно в диалоге) удаляются сразу,
+        остаток длинной переписки и ее архив - фоновой задачей clear_conversation.
+        """
+        last = db.execute_query(
+            """SELECT MAX(id) AS max_id FROM messages
+               WHERE (sender_id = %s AND recipient_id = %s)
+                  OR (sender_id = %s AND recipient_id = %s)""",
+            (user_id, other_user_id, other_user_id, user_id),
+            fetch=True,
+            primary=True,
+        )
+        if last is None:
+            return False
+        max_id = last[0]["max_id"] if last else None
+        archived = MessageArchiveService.has_archived(user_id, other_user_id)
+        if max_id is None and not archived:
+            return True
+        
+        deleted = 0
+        if max_id is not None:
+            deleted = MessageService._delete_conversation_batch(user_id, other_user_id, max_id)
+            if deleted is None:
+                return False
+        if deleted < CLEAR_BATCH and not archived:
+            MessageSearchService.forget_conversation(user_id, other_user_id, max_id)
+            UnreadCountService.reconcile_user(user_id)
+            UnreadCountService.reconcile_user(other_user_id)
+            return True
+        
+        # Сообщения, пришедшие после очистки (id > max_id), не трогаем;
+        # архивные сообщения всегда старше горячих
+        max_id = max_id or 2 ** 63 - 1
+        if jobs.enqueue("clear_conversation", user_id=user_id, other_user_id=other_user_id, max_id=max_id) is None:
+            MessageService.finish_clear_conversation(user_id, other_user_id, max_id)
+        return True
+    
+    @staticmethod
+    def finish_clear_conversation(user_id: int, other_user_id: int, max_id: int):
+        """Фоновая задача: удалить остаток переписки (и архив) пачками и пересчитать непрочитанные"""
+        for table in ("messages", "messages_archive"):
+            while True:
+                deleted = MessageService._delete_conversation_batch(user_id, other_user_id, max_id, table)
+                if deleted is None:
+                    raise RuntimeError("Ошибка удаления сообщений")
+                if deleted < CLEAR_BATCH:
+                    break
+        MessageSearchService.forget_conversation(user_id, other_user_id, max_id)
+        
+        # Непрочитанные могли быть у обоих собеседников - пересчитываем обоих
+        UnreadCountService.reconcile_user(user_id)
+        UnreadCountService.reconcile_user(other_user_id)
+
+
+class MessageArchiveService:
+    """Холодное хранение старой переписки (таблица messages_archive).
+
+    Фоновая задача message_archive пачками переносит прочитанные сообщения
+    старше MESSAGE_HOT_DAYS дней из messages в архив с тем же ID. Последнее
+    сообщение каждого диалога остается в горячей таблице, поэтому вставка,
+    опрос новых сообщений, счетчики непрочитанных и список диалогов работают
+    только с ней, а ее размер определяется трафиком за последние дни,
+    а не всей историей. В архив заглядывает лишь get_conversation при
+    прокрутке далеко назад.
+    """
+
+    @staticmethod
+    def ensure_table():
+        """Создать архив по структуре messages и недостающие индексы"""
+        created = db.execute_query("CREATE TABLE IF NOT EXISTS messages_archive LIKE messages")
+        for table in ("messages", "messages_archive"):
+            existing = db.execute_query(
+                """SELECT DISTINCT INDEX_NAME AS name FROM information_schema.STATISTICS
+                   WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s""",
+                (table,),
+                fetch=True,
+                primary=True,
+            ) or []
+            names = {row["name"] for row in existing}
+            for index, columns in MESSAGE_INDEXES.items():
+                if names and index not in names:
+                    db.execute_query(f"ALTER TABLE {table} ADD INDEX {index} {columns}")
+        return created is not None
+
+    @staticmethod
+    def archive_batch(limit: int = MESSAGE_ARCHIVE_BATCH) -> int:
+        """Перенести в архив одну пачку старых прочитанных сообщений"""
+        with db.transaction() as cursor:
+            cursor.execute(
+                """SELECT m.id FROM messages m
+                   WHERE m.created_at < NOW() - INTERVAL %s DAY
+                     AND m.is_read = TRUE
+                     AND EXISTS (
+                         SELECT 1 FROM messages n
+                         WHERE n.id > m.id
+                           AND ((n.sender_id = m.sender_id AND n.recipient_id = m.recipient_id)
+                             OR (n.sender_id = m.recipient_id AND n.recipient_id = m.sender_id))
+                     )
+                   ORDER BY m.created_at
+                   LIMIT %s
+                   FOR UPDATE""",
+                (MESSAGE_HOT_DAYS, limit),
+            )
+            ids = [row["id"] for row in cursor.fetchall()]
+            if not ids:
+                return 0
+
+            placeholders = ", ".join(["%s"] * len(ids))
+            cursor.execute(
+                f"INSERT IGNORE INTO messages_archive SELECT * FROM messages WHERE id IN ({placeholders})", ids
+            )
+            cursor.execute(f"DELETE FROM messages WHERE id IN ({placeholders})", ids)
+        return len(ids)
+
+    @staticmethod
+    def archive_all(time_budget: float = 60) -> int:
+        """Фоновая задача: архивировать пачками, пока есть что и не вышло время"""
+        total = 0
+        deadline = time.monotonic() + time_budget
+        while time.monotonic() < deadline:
+            moved = MessageArchiveService.archive_batch()
+            total += moved
+            if moved < MESSAGE_ARCHIVE_BATCH:
+                break
+        if total:
+            logger.info("Сообщения перенесены в архив", extra={"messages": total})
+        return total
+
+    @staticmethod
+    def has_archived(user1_id: int, user2_id: int) -> bool:
+        """Есть ли у переписки сообщения в архиве"""
+        result = db.execute_query(
+            """SELECT 1 FROM messages_archive
+               WHERE (sender_id = %s AND recipient_id = %s)
+                  OR (sender_id = %s AND recipient_id = %s)
+               LIMIT 1""",
+            (user1_id, user2_id, user2_id, user1_id),
+            fetch=True,
+            primary=True,
+        )
+        return bool(result)
+
+    @staticmethod
+    def restore_last(user1_id: int, user2_id: int) -> bool:
+        """Вернуть последнее архивное сообщение, если в горячей таблице диалог опустел"""
+        with db.transaction() as cursor:
+            cursor.execute(
+                """SELECT id FROM messages
+                   WHERE (sender_id = %s AND recipient_id = %s)
+                      OR (sender_id = %s AND recipient_id = %s)
+                   LIMIT 1""",
+                (user1_id, user2_id, user2_id, user1_id),
+            )
+            if cursor.fetchall():
+                return False
+            cursor.execute(
+                """SELECT id FROM messages_archive
+                   WHERE (sender_id = %s AND recipient_id = %s)
+                      OR (sender_id = %s AND recipient_id = %s)
+                   ORDER BY id DESC
+                   LIMIT 1
+                   FOR UPDATE""",
+                (user1_id, user2_id, user2_id, user1_id),
+            )
+            rows = cursor.fetchall()
+            if not rows:
+                return False
+            cursor.execute("INSERT IGNORE INTO messages SELECT * FROM messages_archive WHERE id = %s", (rows[0]["id"],))
+            cursor.execute("DELETE FROM messages_archive WHERE id = %s", (rows[0]["id"],))
+        return True
+
+
+class MessageSearchService:
+    """Поиск по переписке пользователя: обратный индекс в таблице message_search.
+
+    Для каждого сообщения и каждого из двух собеседников хранятся строки
+    (user_id, термин, message_id) - первичный ключ начинается с пользователя
+    и термина, поэтому поиск читает только постинги своих терминов, и время
+    зависит от числа совпадений у пользователя, а не от размера messages.
+    Индекс пополняет send_message, чистят delete_message и очистка переписки;
+    сообщения, написанные до появления индекса, добавляет фоновая задача.
+    Перенос в messages_archive ID не меняет - индекс остается верным.
+    """
+
+    @staticmethod
+    def terms(text: Optional[str]) -> Counter:
+        """Термины текста с частотами"""
+        counts: Counter = Counter()
+        for token in SEARCH_TOKEN_RE.findall((text or "").lower().replace("ё", "е")):
+            if len(token) >= 2:
+                counts[token[:SEARCH_STEM_LENGTH]] += 1
+        return counts
+
+    @staticmethod
+    def prefix_pattern(term: str) -> str:
+        """Шаблон LIKE "термин начинается с term" ('_' из \\w экранируется)"""
+        return term.replace("_", "!_") + "%"
+
+    @staticmethod
+    def ensure_table():
+        """Создать индекс; при первом создании - проиндексировать старую переписку"""
+        existed = db.execute_query(
+            """SELECT 1 FROM information_schema.TABLES
+               WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'message_search'""",
+            fetch=True,
+            primary=True,
+        )
+        if existed is None:
+            return False
+        db.execute_query(
+            f"""CREATE TABLE IF NOT EXISTS message_search (
+                   user_id INT NOT NULL,
+                   term VARCHAR({SEARCH_STEM_LENGTH * 4}) NOT NULL,
+                   message_id INT NOT NULL,
+                   partner_id INT NOT NULL,
+                   tf SMALLINT NOT NULL DEFAULT 1,
+                   PRIMARY KEY (user_id, term, message_id),
+                   KEY idx_search_message (message_id),
+                   KEY idx_search_partner (user_id, partner_id, message_id)
+               )"""
+        )
+        if not existed:
+            jobs.enqueue("message_search_backfill", table="messages", after_id=0)
+        return True
+
+    @staticmethod
+    def _rows(message_id: int, sender_id: int, recipient_id: int, text: str) -> List[tuple]:
+        terms = MessageSearchService.terms(text).most_common(SEARCH_MAX_TERMS)
+        rows = [(sender_id, term, message_id, recipient_id, min(tf, 32767)) for term, tf in terms]
+        if recipient_id != sender_id:
+            rows += [(recipient_id, term, message_id, sender_id, tf) for _, term, _, _, tf in rows]
+        return rows
+
+    @staticmethod
+    def _insert(rows: List[tuple]):
+        if not rows:
+            return
+        with db.transaction() as cursor:
+            cursor.executemany(
+                """INSERT IGNORE INTO message_search (user_id, term, message_id, partner_id, tf)
+                   VALUES (%s, %s, %s, %s, %s)""",
+                rows,
+            )
+
+    @staticmethod
+    def index_message(message_id: int, sender_id: int, recipient_id: int, text: str):
+        """Добавить сообщение в индекс (ошибка индекса не мешает отправке)"""
+        try:
+            MessageSearchService._insert(MessageSearchService._rows(message_id, sender_id, recipient_id, text))
+        except Exception as e:
+            logger.warning("Не удалось проиндексировать сообщение %s: %s", message_id, e)
+
+    @staticmethod
+    def forget_message(message_id: int):
+        db.execute_query("DELETE FROM message_search WHERE message_id = %s", (message_id,))
+
+    @staticmethod
+    def forget_conversation(user_id: int, other_user_id: int, max_id: int):
+        """Убрать из индекса очищенную переписку (не новее max_id), пачками"""
+        for owner, partner in ((user_id, other_user_id), (other_user_id, user_id)):
+            while True:
+                deleted = db.execute_query(
+                    """DELETE FROM message_search
+                       WHERE user_id = %s AND partner_id = %s AND message_id <= %s
+                       LIMIT %s""",
+                    (owner, partner, max_id, CLEAR_BATCH * 10),
+                    rowcount=True,
+                )
+                if not deleted or deleted < CLEAR_BATCH * 10:
+                    break
+
+    @staticmethod
+    def backfill(table: str, after_id: int):
+        """Фоновая задача: проиндексировать пачку старых сообщений и поставить следующую.
+
+        Сначала messages, затем messages_archive: сообщение, уехавшее в архив
+        во время первого прохода, подберет второй.
+        """
+        if table not in ("messages", "messages_archive"):
+            raise ValueError(f"Неизвестная таблица {table}")
+        messages = db.execute_query(
+            f"""SELECT id, sender_id, recipient_id, message FROM {table}
+                WHERE id > %s ORDER BY id LIMIT %s""",
+            (after_id, SEARCH_BACKFILL_BATCH),
+            fetch=True,
+            primary=True,
+        )
+        if messages is None:
+            raise RuntimeError("Ошибка чтения сообщений")
+
+        rows = []
+        for message in messages:
+            rows += MessageSearchService._rows(
+                message["id"], message["sender_id"], message["recipient_id"], message["message"]
+            )
+        MessageSearchService._insert(rows)
+
+        if len(messages) == SEARCH_BACKFILL_BATCH:
+            jobs.enqueue("message_search_backfill", table=table, after_id=messages[-1]["id"])
+        elif table == "messages":
+            jobs.enqueue("message_search_backfill", table="messages_archive", after_id=0)
+        else:
+            logger.info("Индекс поиска по сообщениям заполнен")
+
+    @staticmethod
+    def search(user_id: int, query: str, limit: int = SEARCH_RESULTS) -> List[Dict[str, Any]]:
+        """Сообщения пользователя, в которых есть слова, начинающиеся с каждого слова запроса.
+
+        Каждое слово запроса - диапазон первичного ключа (user_id, term LIKE 'слово%'),
+        совпадения сводятся по сообщению, так что одно слово запроса, подошедшее
+        к нескольким словам сообщения, считается один раз. Порядок - по
+        суммарной частоте терминов, затем новые выше. Каждое
+        совпадение - с собеседником, фрагментом текста и предыдущим сообщением диалога.
+        """
+        terms = list(MessageSearchService.terms(query))[:SEARCH_MAX_QUERY_TERMS]
+        if not terms:
+            return []
+
+        matches = " UNION ALL ".join(
+            """SELECT message_id, partner_id, SUM(tf) AS weight
+               FROM message_search
+               WHERE user_id = %s AND term LIKE %s ESCAPE '!'
+               GROUP BY message_id, partner_id"""
+            for _ in terms
+        )
+        params: List[Any] = []
+        for term in terms:
+            params += [user_id, MessageSearchService.prefix_pattern(term)]
+        postings = db.execute_query(
+            f"""SELECT message_id, partner_id, SUM(weight) AS weight
+                FROM ({matches}) m
+                GROUP BY message_id, partner_id
+                HAVING COUNT(*) = %s
+                ORDER BY weight DESC, message_id DESC
+                LIMIT %s""",
+            params + [len(terms), limit],
+            fetch=True,
+        ) or []
+        if not postings:
+            return []
+
+        ids = [row["message_id"] for row in postings]
+        id_marks = ", ".join(["%s"] * len(ids))
+        messages = {}
+        for table in ("messages", "messages_archive"):
+            for row in db.execute_query(
+                f"""SELECT id, sender_id, recipient_id, message, created_at
+                    FROM {table} WHERE id IN ({id_marks})""",
+                ids,
+                fetch=True,
+            ) or []:
+                messages[row["id"]] = row
+
+        partner_ids = sorted({row["partner_id"] for row in postings})
+        partners = {
+            row["id"]: row
+            for row in db.execute_query(
+                f"SELECT id, username, avatar_url FROM users WHERE id IN ({', '.join(['%s'] * len(partner_ids))})",
+                partner_ids,
+                fetch=True,
+            ) or []
+        }
+        previous = MessageSearchService._previous_messages(user_id, postings)
+
+        results = []
+        for row in postings:
+            message = messages.get(row["message_id"])
+            # Постинг мог пережить сообщение (удаление между запросами) - пропускаем
+            if message is None:
+                continue
+            partner = partners.get(row["partner_id"], {})
+            results.append({
+                "message_id": message["id"],
+                "partner_id": row["partner_id"],
+                "partner_username": partner.get("username"),
+                "partner_avatar": partner.get("avatar_url"),
+                "is_my_message": message["sender_id"] == user_id,
+                "created_at": message["created_at"],
+                "snippet": MessageSearchService.snippet(message["message"], terms),
+                "previous": previous.get(message["id"]),
+                "url": f"/messages/{row['partner_id']}/jump/{message['id']}",
+                "weight": int(row["weight"]),
+            })
+        return results
+
+    @staticmethod
+    def _previous_messages(user_id: int, postings: List[Dict[str, Any]]) -> Dict[int, Dict[str, Any]]:
+        """Предыдущее сообщение диалога для каждого совпадения - одним запросом"""
+        parts, params = [], []
+        for row in postings:
+            for table in ("messages", "messages_archive"):
+                parts.append(
+                    f"""(SELECT %s AS hit_id, id, sender_id, message FROM {table}
+                         WHERE ((sender_id = %s AND recipient_id = %s) OR (sender_id = %s AND recipient_id = %s))
+                           AND id < %s
+                         ORDER BY id DESC LIMIT 1)"""
+                )
+                params += [
+                    row["message_id"], user_id, row["partner_id"], row["partner_id"], user_id, row["message_id"],
+                ]
+        rows = db.execute_query(" UNION ALL ".join(parts), params, fetch=True) or []
+
+        previous: Dict[int, Dict[str, Any]] = {}
+        for row in rows:
+            current = previous.get(row["hit_id"])
+            if current is None or row["id"] > current["id"]:
+                previous[row["hit_id"]] = {
+                    "id": row["id"],
+                    "is_my_message": row["sender_id"] == user_id,
+                    "text": row["message"][:120],
+                }
+        return previous
+
+    @staticmethod
+    def snippet(text: str, terms: List[str], width: int = 160) -> str:
+        """Фрагмент сообщения вокруг первого найденного термина"""
+        if len(text) <= width:
+            return text
+        lowered = text.lower().replace("ё", "е")
+        positions = [pos for pos in (lowered.find(term) for term in terms) if pos >= 0]
+        start = max(min(positions) - width // 4, 0) if positions else 0
+        fragment = text[start:start + width]
+        return ("…" if start else "") + fragment + ("…" if start + width < len(text) else "")
+
+
+# Фоновые задачи сервисов (выполняет jobs.runner)
+jobs.register("delete_files", FileService.delete_files, max_attempts=3)
+jobs.register("clear_conversation", MessageService.finish_clear_conversation)
+jobs.register("unread_reconcile", UnreadCountService.reconcile_all, max_attempts=1)
+jobs.register("exchange_reconcile", ExchangeService.reconcile_all, max_attempts=1)
+jobs.register("offer_archive", OfferArchiveService.archive_all, max_attempts=1)
+jobs.register("message_archive", MessageArchiveService.archive_all, max_attempts=1)
+jobs.register("message_search_backfill", MessageSearchService.backfill)
\ No newline at end of file
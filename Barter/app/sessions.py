@@ -0,0 +1,95 @@
+# sessions.py
+# Скользящее продление сессий: если при разборе cookie снимок пользователя
+# был перевыпущен (request.state.session_cookie), новый токен уходит клиенту
+# в Set-Cookie любого ответа - страницы, JSON или редиректа.
+# Там же - привязка чтений к основному серверу БД после записи (read-your-writes).
+import time
+
+from database import READ_PIN_SECONDS, read_pin
+from services import SESSION_MAX_AGE
+
+COOKIE_NAME = "session"
+PIN_COOKIE_NAME = "db_pin"
+
+
+class SessionRefreshMiddleware:
+    """ASGI middleware: дописать обновленную cookie сессии к ответу"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_cookie(message):
+            if message["type"] == "http.response.start":
+                token = scope.get("state", {}).get("session_cookie")
+                headers = list(message.get("headers", []))
+                # Вход и выход сами ставят или удаляют cookie - их не перебиваем
+                sets_session = any(
+                    key == b"set-cookie" and value.startswith(COOKIE_NAME.encode() + b"=")
+                    for key, value in headers
+                )
+                if token and not sets_session:
+                    cookie = f"{COOKIE_NAME}={token}; HttpOnly; Max-Age={SESSION_MAX_AGE}; Path=/; SameSite=lax"
+                    headers.append((b"set-cookie", cookie.encode("latin-1")))
+                    message = dict(message, headers=headers)
+            await send(message)
+
+        await self.app(scope, receive, send_with_cookie)
+
+
+def _cookie(scope, name: str):
+    """Значение cookie из заголовков ASGI-запроса"""
+    prefix = name.encode() + b"="
+    for key, value in scope.get("headers", ()):
+        if key == b"cookie":
+            for part in value.split(b";"):
+                part = part.strip()
+                if part.startswith(prefix):
+                    return part[len(prefix):].decode("latin-1")
+    return None
+
+
+class ReadPinMiddleware:
+    """ASGI middleware: после записи читать с основного сервера БД.
+
+    Запись в запросе продлевает привязку (database.read_pin), а ответ уносит
+    ее в cookie db_pin, поэтому следующие запросы пользователя - к любому
+    воркеру - READ_PIN_SECONDS не читают с реплик и видят свое новое
+    объявление или сообщение. Подделка cookie лишь отправляет чтения на основной.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            until = float(_cookie(scope, PIN_COOKIE_NAME) or 0)
+        except ValueError:
+            until = 0.0
+        # Ограничиваем срок: из cookie нельзя привязаться к основному надолго
+        pin = {"until": min(until, time.time() + READ_PIN_SECONDS), "wrote": False}
+        token = read_pin.set(pin)
+
+        async def send_with_pin(message):
+            if message["type"] == "http.response.start" and pin["wrote"]:
+                cookie = (
+                    f"{PIN_COOKIE_NAME}={pin['until']:.3f}; HttpOnly; "
+                    f"Max-Age={int(READ_PIN_SECONDS) + 1}; Path=/; SameSite=lax"
+                )
+                message = dict(message, headers=list(message.get("headers", [])) + [
+                    (b"set-cookie", cookie.encode("latin-1")),
+                ])
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_pin)
+        finally:
+            read_pin.reset(token)
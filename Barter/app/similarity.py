@@ -0,0 +1,351 @@
+# similarity.py
+# "Похожие объявления" и "подходят для обмена" на разреженных TF-IDF векторах.
+#
+# Тексты give/get превращаются в хешированные признаки (без словаря, поэтому
+# индекс легко дополнять), веса - сублинейный TF * IDF, строки нормированы.
+# Похожие: другие отдают похожее на то, что отдаю я.
+# Для обмена: другие отдают то, что я хочу получить, и/или хотят то, что я отдаю.
+import math
+import re
+import threading
+import time
+import zlib
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from scipy import sparse
+
+from database import db
+import events
+from logs import get_logger
+
+logger = get_logger("similarity")
+
+# Размерность пространства хешированных признаков
+N_FEATURES = 1 << 18
+# Грубый стемминг: русские окончания отбрасываются обрезкой слова
+STEM_LENGTH = 5
+# Новые строки копятся в "хвосте" и вливаются в основную матрицу пачками
+TAIL_LIMIT = 512
+# Виды выдачи top_k
+KINDS = ("similar", "complementary")
+
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+# Поля объявления, которые индекс хранит для показа без запроса к БД
+META_FIELDS = ("id", "user_id", "give", "get", "category", "city", "image_url")
+
+
+def text_features(text: Optional[str]) -> Dict[int, float]:
+    """Хешированные признаки текста с сублинейным TF"""
+    counts: Dict[int, int] = {}
+    for token in TOKEN_RE.findall((text or "").lower()):
+        if len(token) < 2 or token.isdigit():
+            continue
+        feature = zlib.crc32(token[:STEM_LENGTH].encode()) & (N_FEATURES - 1)
+        counts[feature] = counts.get(feature, 0) + 1
+    return {feature: 1.0 + math.log(count) for feature, count in counts.items()}
+
+
+def _to_csr(rows: List[Dict[int, float]], idf: np.ndarray) -> sparse.csr_matrix:
+    """Собрать CSR-матрицу из словарей признаков, с IDF и L2-нормировкой строк"""
+    indptr = np.zeros(len(rows) + 1, dtype=np.int64)
+    indices = []
+    data = []
+    for i, row in enumerate(rows):
+        if row:
+            keys = np.fromiter(row.keys(), dtype=np.int64, count=len(row))
+            values = np.fromiter(row.values(), dtype=np.float32, count=len(row)) * idf[keys]
+            norm = float(np.linalg.norm(values))
+            if norm > 0:
+                values /= norm
+            indices.append(keys)
+            data.append(values)
+        indptr[i + 1] = indptr[i] + len(row)
+
+    return sparse.csr_matrix(
+        (
+            np.concatenate(data) if data else np.zeros(0, dtype=np.float32),
+            np.concatenate(indices) if indices else np.zeros(0, dtype=np.int64),
+            indptr,
+        ),
+        shape=(len(rows), N_FEATURES),
+        dtype=np.float32,
+    )
+
+
+class SimilarityIndex:
+    """Индекс активных объявлений в памяти процесса"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        # Перестройки идут по одной; события, пришедшие во время перестройки,
+        # копятся в _pending и применяются к новому индексу после подмены
+        self._rebuild_lock = threading.Lock()
+        self._pending: Optional[List[tuple]] = None
+        self._reset()
+        self.built_at = None
+        self.build_seconds = None
+
+    def _reset(self):
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.user_ids = np.zeros(0, dtype=np.int64)
+        self.active = np.zeros(0, dtype=bool)
+        self.meta: List[Dict[str, Any]] = []
+        self.positions: Dict[int, int] = {}
+        # Число документов с признаком (для IDF) и число активных документов
+        self.df = np.zeros(N_FEATURES, dtype=np.float32)
+        self.n_docs = 0
+        empty = sparse.csr_matrix((0, N_FEATURES), dtype=np.float32)
+        self.give_main, self.get_main = empty, empty
+        self.give_tail: List[sparse.csr_matrix] = []
+        self.get_tail: List[sparse.csr_matrix] = []
+
+    def _idf(self) -> np.ndarray:
+        return (np.log((1.0 + self.n_docs) / (1.0 + self.df)) + 1.0).astype(np.float32)
+
+    # ================================
+    # Построение и обновление
+    # ================================
+
+    def rebuild(self) -> int:
+        """Полностью перестроить индекс по активным объявлениям"""
+        with self._rebuild_lock:
+            start = time.perf_counter()
+            with self._lock:
+                self._pending = []
+            try:
+                offers = db.execute_query(
+                    """SELECT id, user_id, give, `get`, category, city, image_url
+                       FROM offers WHERE is_active = TRUE ORDER BY id""",
+                    fetch=True,
+                )
+                if offers is None:
+                    return 0
+                self._load(offers, start)
+            finally:
+                with self._lock:
+                    self._pending = None
+
+        logger.info(
+            "Индекс похожих объявлений построен",
+            extra={"offers": self.n_docs, "seconds": self.build_seconds},
+        )
+        return len(offers)
+
+    def load(self, offers: List[Dict[str, Any]]) -> int:
+        """Построить индекс по готовому списку объявлений (без БД; для замеров)"""
+        with self._rebuild_lock:
+            self._load(offers, time.perf_counter())
+        return len(offers)
+
+    def _load(self, offers: List[Dict[str, Any]], start: float):
+        give_rows = [text_features(offer["give"]) for offer in offers]
+        get_rows = [text_features(offer["get"]) for offer in offers]
+
+        df = np.zeros(N_FEATURES, dtype=np.float32)
+        for give, get in zip(give_rows, get_rows):
+            features = np.fromiter(set(give) | set(get), dtype=np.int64)
+            df[features] += 1
+        n_docs = len(offers)
+        idf = (np.log((1.0 + n_docs) / (1.0 + df)) + 1.0).astype(np.float32)
+
+        give_main = _to_csr(give_rows, idf)
+        get_main = _to_csr(get_rows, idf)
+
+        with self._lock:
+            self._reset()
+            self.ids = np.array([offer["id"] for offer in offers], dtype=np.int64)
+            self.user_ids = np.array([offer["user_id"] for offer in offers], dtype=np.int64)
+            self.active = np.ones(len(offers), dtype=bool)
+            self.meta = [{field: offer.get(field) for field in META_FIELDS} for offer in offers]
+            self.positions = {offer["id"]: i for i, offer in enumerate(offers)}
+            self.df = df
+            self.n_docs = n_docs
+            self.give_main, self.get_main = give_main, get_main
+            # Создания и снятия, которые выборка могла не увидеть (оба идемпотентны)
+            for op, args in self._pending or []:
+                if op == "add":
+                    self._add(*args)
+                else:
+                    self._remove(*args)
+            if self._pending:
+                self._pending = []
+            self.built_at = time.time()
+            self.build_seconds = round(time.perf_counter() - start, 3)
+
+    def add(self, offer: Dict[str, Any]):
+        """Добавить новое объявление (без перестройки матриц)"""
+        give = text_features(offer.get("give"))
+        get = text_features(offer.get("get"))
+
+        with self._lock:
+            if self._pending is not None:
+                self._pending.append(("add", (offer, give, get)))
+            self._add(offer, give, get)
+
+    def _add(self, offer: Dict[str, Any], give: Dict[int, float], get: Dict[int, float]):
+        """Добавить строку (вызывается под блокировкой)"""
+        if offer["id"] in self.positions:
+            return
+        features = np.fromiter(set(give) | set(get), dtype=np.int64)
+        self.df[features] += 1
+        self.n_docs += 1
+        idf = self._idf()
+
+        self.give_tail.append(_to_csr([give], idf))
+        self.get_tail.append(_to_csr([get], idf))
+        self.positions[offer["id"]] = len(self.ids)
+        self.ids = np.append(self.ids, offer["id"])
+        self.user_ids = np.append(self.user_ids, offer["user_id"])
+        self.active = np.append(self.active, True)
+        self.meta.append({field: offer.get(field) for field in META_FIELDS})
+
+        if len(self.give_tail) >= TAIL_LIMIT:
+            self._merge_tail()
+
+    def remove(self, offer_id: int):
+        """Исключить объявление из выдачи (строка остается до перестройки)"""
+        with self._lock:
+            if self._pending is not None:
+                self._pending.append(("remove", (offer_id,)))
+            self._remove(offer_id)
+
+    def _remove(self, offer_id: int):
+        """Погасить строку (вызывается под блокировкой)"""
+        position = self.positions.get(offer_id)
+        if position is None or not self.active[position]:
+            return
+        self.active[position] = False
+        self.n_docs -= 1
+        features = np.concatenate([
+            self._row(self.give_main, self.give_tail, position).indices,
+            self._row(self.get_main, self.get_tail, position).indices,
+        ])
+        self.df[np.unique(features)] -= 1
+
+    def _row(self, main, tail, position) -> sparse.csr_matrix:
+        if position < main.shape[0]:
+            return main[position]
+        return tail[position - main.shape[0]]
+
+    def _merge_tail(self):
+        """Влить хвост в основные матрицы (вызывается под блокировкой)"""
+        if not self.give_tail:
+            return
+        self.give_main = sparse.vstack([self.give_main] + self.give_tail, format="csr")
+        self.get_main = sparse.vstack([self.get_main] + self.get_tail, format="csr")
+        self.give_tail, self.get_tail = [], []
+
+    # ================================
+    # Поиск
+    # ================================
+
+    def _snapshot(self):
+        with self._lock:
+            if len(self.give_tail) > 32:
+                self._merge_tail()
+            return (
+                self.give_main, list(self.give_tail), self.get_main, list(self.get_tail),
+                self.ids, self.user_ids, self.active.copy(), self.meta, dict(self.positions),
+            )
+
+    @staticmethod
+    def _scores(main, tail, queries) -> np.ndarray:
+        """Батчевое скалярное произведение: (n x D) @ (D x m) -> плотная (n x m)"""
+        blocks = [(main @ queries.T).toarray()]
+        if tail:
+            blocks.append((sparse.vstack(tail, format="csr") @ queries.T).toarray())
+        return np.vstack(blocks) if len(blocks) > 1 else blocks[0]
+
+    def _query_rows(self, main, tail, rows) -> sparse.csr_matrix:
+        return sparse.vstack([self._row(main, tail, row) for row in rows], format="csr")
+
+    def top_k_kinds(
+        self, offer_ids: List[int], k: int = 6, kinds=KINDS
+    ) -> Dict[str, Dict[int, List[Dict[str, Any]]]]:
+        """Топ-k нескольких видов для нескольких объявлений за один проход.
+
+        kind = "similar"        - похожие (что отдают и что хотят);
+        kind = "complementary"  - подходящие для обмена.
+        Запросы give и get стоят рядом, поэтому все четыре произведения
+        (give/get индекса на give/get запроса) - два матричных умножения.
+        """
+        give_main, give_tail, get_main, get_tail, ids, user_ids, active, meta, positions = self._snapshot()
+        rows = [positions[offer_id] for offer_id in offer_ids if offer_id in positions]
+        if not rows or not len(ids):
+            return {kind: {offer_id: [] for offer_id in offer_ids} for kind in kinds}
+
+        m = len(rows)
+        queries = sparse.vstack(
+            [self._query_rows(give_main, give_tail, rows), self._query_rows(get_main, get_tail, rows)],
+            format="csr",
+        )
+        give_scores = self._scores(give_main, give_tail, queries)
+        get_scores = self._scores(get_main, get_tail, queries)
+
+        results: Dict[str, Dict[int, List[Dict[str, Any]]]] = {}
+        for kind in kinds:
+            if kind == "complementary":
+                # Они отдают то, что я хочу + они хотят то, что я отдаю
+                scores = give_scores[:, m:] + get_scores[:, :m]
+            else:
+                scores = 0.7 * give_scores[:, :m] + 0.3 * get_scores[:, m:]
+            results[kind] = self._top_k(scores, rows, k, kind, ids, user_ids, active, meta)
+        return results
+
+    @staticmethod
+    def _top_k(scores, rows, k, kind, ids, user_ids, active, meta) -> Dict[int, List[Dict[str, Any]]]:
+        scores[~active, :] = 0.0
+        results: Dict[int, List[Dict[str, Any]]] = {}
+        for column, row in enumerate(rows):
+            column_scores = scores[:, column]
+            column_scores[row] = 0.0
+            if kind == "complementary":
+                column_scores[user_ids == user_ids[row]] = 0.0
+
+            candidates = np.flatnonzero(column_scores > 0)
+            if len(candidates) > k:
+                best = np.argpartition(-column_scores[candidates], k)[:k]
+                candidates = candidates[best]
+            candidates = candidates[np.argsort(-column_scores[candidates])]
+
+            results[int(ids[row])] = [
+                dict(meta[i], score=round(float(column_scores[i]), 4)) for i in candidates
+            ]
+        return results
+
+    def top_k_batch(self, offer_ids: List[int], k: int = 6, kind: str = "similar") -> Dict[int, List[Dict[str, Any]]]:
+        """Топ-k одного вида для нескольких объявлений"""
+        return self.top_k_kinds(offer_ids, k, (kind,))[kind]
+
+    def similar(self, offer_id: int, k: int = 6) -> List[Dict[str, Any]]:
+        return self.top_k_batch([offer_id], k, "similar").get(offer_id, [])
+
+    def complementary(self, offer_id: int, k: int = 6) -> List[Dict[str, Any]]:
+        return self.top_k_batch([offer_id], k, "complementary").get(offer_id, [])
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "rows": int(len(self.ids)),
+                "active": int(self.active.sum()),
+                "tail_rows": len(self.give_tail),
+                "nnz": int(self.give_main.nnz + self.get_main.nnz),
+                "built_at": self.built_at,
+                "build_seconds": self.build_seconds,
+            }
+
+
+index = SimilarityIndex()
+
+
+def _on_offer_event(payload: Dict[str, Any]):
+    if payload.get("op") == "created":
+        index.add(payload["offer"])
+    elif payload.get("op") == "deactivated":
+        index.remove(payload["offer_id"])
+
+
+# Индекс каждого воркера обновляется по событиям от всех воркеров
+events.subscribe(events.OFFERS_CHANNEL, _on_offer_event)
@@ -0,0 +1,101 @@
+# snapshots.py
+# Готовые страницы для анонимных посетителей: /offer/{id} и /user/{id} без
+# входа одинаковы для всех, поэтому HTML рендерится один раз и отдается из
+# памяти процесса с ETag и Cache-Control. Снимок помечен тегами ("offer", id)
+# и ("user", id); изменение объявления, профиля, оценки или обменов сбрасывает
+# его (во всех воркерах через CacheService), и сброшенные снимки, которые
+# уже смотрели, пересобираются в фоне. Промах - обычный рендер, он же и
+# становится снимком.
+import hashlib
+import os
+import threading
+from collections import namedtuple
+from typing import Any, Callable, Dict, Hashable, Iterable, Optional, Tuple
+
+from fastapi.responses import HTMLResponse, Response
+
+from cache import TTLCache
+from logs import get_logger
+
+logger = get_logger("snapshots")
+
+SNAPSHOT_CACHE_BYTES = int(os.environ.get("BARTER_SNAPSHOT_CACHE_MB", "64")) * 1024 * 1024
+# Страховка для того, что не сбрасывается точечно (похожие объявления)
+SNAPSHOT_TTL = int(os.environ.get("BARTER_SNAPSHOT_TTL", "300"))
+# Сколько браузер и прокси могут не перепроверять страницу
+SNAPSHOT_MAX_AGE = int(os.environ.get("BARTER_SNAPSHOT_MAX_AGE", "60"))
+CACHE_CONTROL = f"public, max-age={SNAPSHOT_MAX_AGE}"
+# Сколько сброшенных снимков пересобирать за один проход refresh
+REFRESH_BATCH = 50
+
+Snapshot = namedtuple("Snapshot", ["body", "etag", "tags"])
+
+# Рендерер страницы: id -> (html, теги) или None, если страницы нет
+Renderer = Callable[[int], Optional[Tuple[str, Iterable[Hashable]]]]
+
+
+class SnapshotStore:
+    """Снимки страниц по ключу (вид, id) с пересборкой сброшенных"""
+
+    def __init__(self, cache: TTLCache):
+        self.cache = cache
+        self.renderers: Dict[str, Renderer] = {}
+        self._stale: set = set()
+        self._lock = threading.Lock()
+        self.refreshed = 0
+
+    def register(self, kind: str, renderer: Renderer):
+        self.renderers[kind] = renderer
+
+    def _render(self, kind: str, item_id: int) -> Optional[Snapshot]:
+        result = self.renderers[kind](item_id)
+        if result is None:
+            return None
+        html, tags = result
+        body = html.encode("utf-8")
+        return Snapshot(body, '"' + hashlib.sha256(body).hexdigest()[:20] + '"', tuple(tags))
+
+    def get(self, kind: str, item_id: int) -> Optional[Snapshot]:
+        """Снимок страницы; при промахе - рендер (один на ключ, остальные ждут его)"""
+        return self.cache.get_or_load(
+            (kind, item_id), lambda: self._render(kind, item_id), tags=lambda snapshot: snapshot.tags
+        )
+
+    def invalidate(self, tag: Hashable):
+        """Сбросить снимки тега; их пересоберет refresh"""
+        keys = self.cache.invalidate_tag(tag)
+        if keys:
+            with self._lock:
+                self._stale.update(keys)
+
+    def refresh(self) -> int:
+        """Пересобрать сброшенные снимки (не больше REFRESH_BATCH за раз)"""
+        with self._lock:
+            batch = [self._stale.pop() for _ in range(min(len(self._stale), REFRESH_BATCH))]
+        for kind, item_id in batch:
+            try:
+                self.get(kind, item_id)
+                self.refreshed += 1
+            except Exception as e:
+                logger.warning("Не удалось пересобрать снимок %s %s: %s", kind, item_id, e)
+        return len(batch)
+
+    def stats(self) -> Dict[str, Any]:
+        stats = self.cache.stats()
+        with self._lock:
+            stats["stale"] = len(self._stale)
+        stats["refreshed"] = self.refreshed
+        return stats
+
+
+snapshots = SnapshotStore(
+    TTLCache("snapshots", max_entries=20000, max_bytes=SNAPSHOT_CACHE_BYTES, ttl=SNAPSHOT_TTL)
+)
+
+
+def snapshot_response(request, snapshot: Snapshot) -> Response:
+    """Ответ со снимком; 304, если у клиента та же версия"""
+    headers = {"ETag": snapshot.etag, "Cache-Control": CACHE_CONTROL, "Vary": "Cookie"}
+    if request.headers.get("if-none-match") == snapshot.etag:
+        return Response(status_code=304, headers=headers)
+    return HTMLResponse(snapshot.body, headers=headers)
@@ -0,0 +1,148 @@
+// JS код для работы формы, категорий, превью и валидации
+const fadeElements = document.querySelectorAll('.fade-in');
+const fadeInOnScroll = new IntersectionObserver((entries) => {
+    entries.forEach(entry => {
+        if (entry.isIntersecting) {
+            entry.target.style.opacity = 1;
+            entry.target.style.transform = 'translateY(0)';
+        }
+    });
+}, { threshold: 0.1 });
+fadeElements.forEach(el => {
+    el.style.opacity = 0;
+    el.style.transform = 'translateY(20px)';
+    el.style.transition = 'opacity 0.6s ease, transform 0.6s ease';
+    fadeInOnScroll.observe(el);
+});
+
+const categoryTags = document.querySelectorAll('.category-tag');
+const categoryInput = document.getElementById('category');
+const submitButton = document.getElementById('submitButton');
+
+categoryTags.forEach(tag => {
+    tag.addEventListener('click', function() {
+        categoryTags.forEach(t => t.classList.remove('active'));
+        this.classList.add('active');
+        categoryInput.value = this.getAttribute('data-category');
+        updateSubmitButton();
+    });
+});
+
+const imageInput = document.getElementById('image');
+const imagePreview = document.getElementById('imagePreview');
+const previewImage = document.getElementById('previewImage');
+imageInput.addEventListener('change', function() {
+    const file = this.files[0];
+    if (file) {
+        const reader = new FileReader();
+        reader.onload = function(e) {
+            previewImage.src = e.target.result;
+            imagePreview.style.display = 'block';
+        }
+        reader.readAsDataURL(file);
+    } else {
+        imagePreview.style.display = 'none';
+    }
+    updateSubmitButton();
+});
+
+const citySelect = document.getElementById('city');
+citySelect.addEventListener('change', function() {
+    if (this.value) this.style.borderColor = '#06d6a0';
+    updateSubmitButton();
+});
+
+const form = document.querySelector('form');
+const inputs = document.querySelectorAll('.form-input, .form-select, .form-file');
+inputs.forEach(input => {
+    input.addEventListener('focus', function() { this.parentElement.style.transform = 'translateY(-2px)'; });
+    input.addEventListener('blur', function() { this.parentElement.style.transform = 'translateY(0)'; });
+    if (input.type !== 'file') {
+        input.addEventListener('input', function() {
+            this.style.borderColor = (this.value.trim().length > 0 && this.checkValidity()) ? '#06d6a0' : '#e2e8f0';
+            updateSubmitButton();
+        });
+    }
+});
+
+function updateSubmitButton() {
+    const requiredFields = [
+        categoryInput.value,
+        citySelect.value,
+        document.getElementById('give').value,
+        document.getElementById('get').value,
+        document.getElementById('contact').value
+    ];
+    const allFilled = requiredFields.every(field => field.trim().length > 0);
+    submitButton.disabled = !allFilled;
+    submitButton.style.opacity = allFilled ? '1' : '0.6';
+}
+
+form.addEventListener('submit', function(e) {
+    let isValid = true;
+    const requiredFields = [
+        { element: categoryInput, name: 'категория' },
+        { element: citySelect, name: 'город' },
+        { element: document.getElementById('give'), name: 'что отдаете' },
+        { element: document.getElementById('get'), name: 'что получаете' },
+        { element: document.getElementById('contact'), name: 'контакты' }
+    ];
+    requiredFields.forEach(field => {
+        if (!field.element.value.trim()) {
+            field.element.style.borderColor = '#ef4444';
+            isValid = false;
+            if (field.element.style.animation) field.element.style.animation = '';
+            setTimeout(() => { field.element.style.animation = 'shake 0.5s ease-in-out'; }, 10);
+        }
+    });
+    if (!isValid) {
+        e.preventDefault();
+        alert('Пожалуйста, заполните все обязательные поля');
+    } else {
+        submitButton.innerHTML = '<i class="fas fa-spinner fa-spin"></i> Добавляем...';
+        submitButton.disabled = true;
+    }
+});
+
+const style = document.createElement('style');
+style.textContent = `@keyframes shake {0%, 100% { transform: translateX(0); } 25% { transform: translateX(-5px); } 75% { transform: translateX(5px); }}`;
+document.head.appendChild(style);
+
+updateSubmitButton();
+
+// Массовая загрузка: файл объявлений и архив фото, отчет по строкам
+const importForm = document.getElementById('importForm');
+const importButton = document.getElementById('importButton');
+const importReport = document.getElementById('importReport');
+
+function escapeHtml(text) {
+    const div = document.createElement('div');
+    div.textContent = text;
+    return div.innerHTML;
+}
+
+importForm.addEventListener('submit', async function(e) {
+    e.preventDefault();
+    importButton.disabled = true;
+    importButton.innerHTML = '<i class="fas fa-spinner fa-spin"></i> Загрузка...';
+    importReport.innerHTML = '';
+    try {
+        const response = await fetch('/addoffer/import', { method: 'POST', body: new FormData(importForm) });
+        const data = await response.json();
+        if (!data.success) {
+            importReport.innerHTML = `<p class="import-error">${escapeHtml(data.message || 'Ошибка загрузки')}</p>`;
+            return;
+        }
+        const failed = data.rows.filter(row => row.status !== 'created');
+        importReport.innerHTML = `
+            <p class="import-summary">Создано: ${data.created}, с ошибками: ${data.failed}
+            ${data.created ? ' — <a href="/profile">мои объявления</a>' : ''}</p>
+            ${failed.map(row => `<p class="import-error">Строка ${row.row}: ${escapeHtml(row.errors.join('; '))}</p>`).join('')}
+        `;
+    } catch (error) {
+        importReport.innerHTML = '<p class="import-error">Ошибка сети</p>';
+    } finally {
+        importButton.disabled = false;
+        importButton.innerHTML = '<i class="fas fa-upload"></i> Загрузить';
+    }
+});
@@ -0,0 +1,109 @@
+// Tab switching
+function showTab(tabName) {
+    // Hide all forms
+    document.querySelectorAll('.form-container').forEach(form => {
+        form.classList.remove('active');
+    });
+
+    // Remove active class from all tabs
+    document.querySelectorAll('.tab').forEach(tab => {
+        tab.classList.remove('active');
+    });
+
+    // Show selected form
+    document.getElementById(tabName + '-form').classList.add('active');
+
+    // Make button active
+    event.target.classList.add('active');
+
+    // Move slider
+    const slider = document.getElementById('tabSlider');
+    if (tabName === 'login') {
+        slider.classList.remove('register');
+    } else {
+        slider.classList.add('register');
+    }
+}
+
+// Password visibility toggle
+function togglePassword(inputId) {
+    const input = document.getElementById(inputId);
+    const icon = event.target.querySelector('i') || event.target;
+
+    if (input.type === 'password') {
+        input.type = 'text';
+        icon.className = 'fas fa-eye-slash';
+    } else {
+        input.type = 'password';
+        icon.className = 'fas fa-eye';
+    }
+}
+
+// Form validation and submission
+document.getElementById('loginForm').addEventListener('submit', function(e) {
+    const button = this.querySelector('.submit-button');
+    const originalText = button.innerHTML;
+
+    button.innerHTML = '<i class="fas fa-spinner fa-spin"></i> Вход...';
+    button.disabled = true;
+
+    setTimeout(() => {
+        button.innerHTML = originalText;
+        button.disabled = false;
+    }, 3000);
+});
+
+document.getElementById('registerForm').addEventListener('submit', function(e) {
+    const password = document.getElementById('register-password').value;
+    const confirmPassword = document.getElementById('confirm-password').value;
+    const button = this.querySelector('.submit-button');
+
+    // Client-side validation
+    if (password !== confirmPassword) {
+        e.preventDefault();
+        alert('Пароли не совпадают!');
+        return;
+    }
+
+    if (password.length < 6) {
+        e.preventDefault();
+        alert('Пароль должен содержать минимум 6 символов!');
+        return;
+    }
+
+    const originalText = button.innerHTML;
+    button.innerHTML = '<i class="fas fa-spinner fa-spin"></i> Регистрация...';
+    button.disabled = true;
+
+    setTimeout(() => {
+        button.innerHTML = originalText;
+        button.disabled = false;
+    }, 3000);
+});
+
+// Add input focus effects
+document.querySelectorAll('.form-input').forEach(input => {
+    input.addEventListener('focus', function() {
+        this.parentElement.style.transform = 'translateY(-2px)';
+    });
+
+    input.addEventListener('blur', function() {
+        this.parentElement.style.transform = 'translateY(0)';
+    });
+});
+
+// Auto-focus first input on tab switch
+function focusFirstInput(formId) {
+    const form = document.getElementById(formId);
+    const firstInput = form.querySelector('input');
+    if (firstInput) {
+        setTimeout(() => firstInput.focus(), 300);
+    }
+}
+
+// Enhanced tab switching with focus
+const originalShowTab = showTab;
+showTab = function(tabName) {
+    originalShowTab(tabName);
+    focusFirstInput(tabName + '-form');
+};
@@ -0,0 +1,134 @@
+document.addEventListener('DOMContentLoaded', function() {
+    // Автоматическая прокрутка вниз (или к сообщению из поиска: #message-ID)
+    const messagesContainer = document.getElementById('messagesContainer');
+    const target = /^#message-\d+$/.test(location.hash) ? document.querySelector(location.hash) : null;
+    if (target) {
+        target.scrollIntoView({ block: 'center' });
+        target.classList.add('message-found');
+    } else if (messagesContainer) {
+        messagesContainer.scrollTop = messagesContainer.scrollHeight;
+    }
+
+    // Автоматическое увеличение высоты textarea
+    const messageInput = document.getElementById('messageInput');
+    if (messageInput) {
+        messageInput.addEventListener('input', function() {
+            this.style.height = 'auto';
+            this.style.height = (this.scrollHeight) + 'px';
+        });
+    }
+
+    // Отправка сообщения
+    const messageForm = document.getElementById('messageForm');
+    if (messageForm) {
+        messageForm.addEventListener('submit', async function(e) {
+            e.preventDefault();
+
+            const messageInput = document.getElementById('messageInput');
+            const sendButton = document.getElementById('sendButton');
+            const message = messageInput.value.trim();
+            const otherUserId = document.querySelector('input[name="other_user_id"]').value;
+
+            if (!message) return;
+
+            sendButton.disabled = true;
+            sendButton.innerHTML = '<i class="fas fa-spinner fa-spin"></i>';
+
+            try {
+                const response = await fetch(`/messages/${otherUserId}/send`, {
+                    method: 'POST',
+                    headers: {
+                        'Content-Type': 'application/x-www-form-urlencoded',
+                    },
+                    body: `message=${encodeURIComponent(message)}`
+                });
+
+                const data = await response.json();
+
+                if (data.success) {
+                    messageInput.value = '';
+                    messageInput.style.height = 'auto';
+                    location.reload();
+                } else {
+                    alert(data.message || 'Ошибка отправки сообщения');
+                }
+            } catch (error) {
+                console.error('Ошибка:', error);
+                alert('Ошибка сети');
+            } finally {
+                sendButton.disabled = false;
+                sendButton.innerHTML = '<i class="fas fa-paper-plane"></i>';
+            }
+        });
+    }
+
+    // Проверка новых сообщений
+    let lastMessageId = 0;
+    const messages = document.querySelectorAll('.message-wrapper');
+    if (messages.length > 0) {
+        lastMessageId = parseInt(messages[messages.length - 1].dataset.messageId) || 0;
+    }
+
+    // Функция для проверки новых сообщений
+    async function checkNewMessages() {
+        const otherUserId = document.querySelector('input[name="other_user_id"]').value;
+
+        try {
+            const response = await fetch(`/messages/${otherUserId}/new?last_message_id=${lastMessageId}`);
+            const data = await response.json();
+
+            if (data.success && data.messages.length > 0) {
+                // Обновляем страницу, чтобы показать новые сообщения
+                location.reload();
+            }
+        } catch (error) {
+            console.error('Ошибка проверки новых сообщений:', error);
+        }
+    }
+
+    // Проверяем новые сообщения каждые 5 секунд
+    if (lastMessageId > 0) {
+        setInterval(checkNewMessages, 5000);
+    }
+});
+
+// Функции для работы с чатом
+function clearChat() {
+    const otherUserId = document.querySelector('input[name="other_user_id"]').value;
+
+    if (confirm('Вы уверены, что хотите очистить переписку?')) {
+        fetch(`/messages/clear/${otherUserId}`, {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+            }
+        })
+        .then(response => response.json())
+        .then(data => {
+            if (data.success) {
+                location.reload();
+            } else {
+                alert('Ошибка при очистке переписки');
+            }
+        });
+    }
+}
+
+function deleteMessage(messageId) {
+    if (confirm('Удалить это сообщение?')) {
+        fetch(`/messages/delete/${messageId}`, {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+            }
+        })
+        .then(response => response.json())
+        .then(data => {
+            if (data.success) {
+                location.reload();
+            } else {
+                alert('Не удалось удалить сообщение');
+            }
+        });
+    }
+}
@@ -0,0 +1,118 @@
+// Particles.js configuration
+particlesJS('particles-js', {
+    particles: {
+        number: { 
+            value: 80, 
+            density: { 
+                enable: true, 
+                value_area: 800 
+            } 
+        },
+        color: { 
+            value: "#6366f1" 
+        },
+        shape: { 
+            type: "circle" 
+        },
+        opacity: { 
+            value: 0.5, 
+            random: true 
+        },
+        size: { 
+            value: 3, 
+            random: true 
+        },
+        line_linked: {
+            enable: true,
+            distance: 150,
+            color: "#6366f1",
+            opacity: 0.2,
+            width: 1
+        },
+        move: {
+            enable: true,
+            speed: 2,
+            direction: "none",
+            random: true,
+            straight: false,
+            out_mode: "out",
+            bounce: false
+        }
+    },
+    interactivity: {
+        detect_on: "canvas",
+        events: {
+            onhover: { 
+                enable: true, 
+                mode: "repulse" 
+            },
+            onclick: { 
+                enable: true, 
+                mode: "push" 
+            },
+            resize: true
+        }
+    },
+    retina_detect: true
+});
+
+// Header scroll effect
+window.addEventListener('scroll', function() {
+    const header = document.querySelector('.header');
+    if (window.scrollY > 50) {
+        header.classList.add('scrolled');
+    } else {
+        header.classList.remove('scrolled');
+    }
+});
+
+// Fade in animation on scroll
+const fadeElements = document.querySelectorAll('.fade-in');
+
+const fadeInOnScroll = new IntersectionObserver((entries) => {
+    entries.forEach(entry => {
+        if (entry.isIntersecting) {
+            entry.target.style.opacity = 1;
+            entry.target.style.transform = 'translateY(0)';
+        }
+    });
+}, { threshold: 0.1 });
+
+fadeElements.forEach(el => {
+    el.style.opacity = 0;
+    el.style.transform = 'translateY(30px)';
+    el.style.transition = 'opacity 0.8s ease, transform 0.8s ease';
+    fadeInOnScroll.observe(el);
+});
+
+// Mobile menu toggle
+const menuToggle = document.querySelector('.menu-toggle');
+const navLinks = document.querySelector('.nav-links');
+const navActions = document.querySelector('.nav-actions');
+
+menuToggle.addEventListener('click', () => {
+    const isVisible = navLinks.style.display === 'flex';
+    navLinks.style.display = isVisible ? 'none' : 'flex';
+    navActions.style.display = isVisible ? 'none' : 'flex';
+
+    if (!isVisible) {
+        navLinks.style.flexDirection = 'column';
+        navLinks.style.position = 'absolute';
+        navLinks.style.top = '100%';
+        navLinks.style.left = '0';
+        navLinks.style.right = '0';
+        navLinks.style.background = 'rgba(255, 255, 255, 0.95)';
+        navLinks.style.backdropFilter = 'blur(20px)';
+        navLinks.style.padding = '2rem';
+        navLinks.style.gap = '1.5rem';
+
+        navActions.style.flexDirection = 'column';
+        navActions.style.position = 'absolute';
+        navActions.style.top = 'calc(100% + 200px)';
+        navActions.style.left = '0';
+        navActions.style.right = '0';
+        navActions.style.background = 'rgba(255, 255, 255, 0.95)';
+        navActions.style.backdropFilter = 'blur(20px)';
+        navActions.style.padding = '2rem';
+    }
+});
@@ -0,0 +1,32 @@
+// Add fade-in animation
+const fadeElements = document.querySelectorAll('.fade-in');
+
+fadeElements.forEach((el, index) => {
+    el.style.opacity = '0';
+    el.style.transform = 'translateY(20px)';
+    el.style.transition = 'opacity 0.8s ease, transform 0.8s ease';
+
+    setTimeout(() => {
+        el.style.opacity = '1';
+        el.style.transform = 'translateY(0)';
+    }, index * 200);
+});
+
+// Add interactive effects
+document.querySelectorAll('.action-item').forEach(item => {
+    item.addEventListener('mouseenter', function() {
+        this.style.transform = 'translateY(-5px)';
+    });
+
+    item.addEventListener('mouseleave', function() {
+        this.style.transform = 'translateY(0)';
+    });
+});
+
+// Auto-redirect to profile after 8 seconds
+setTimeout(() => {
+    const redirect = confirm('Перейти в ваш профиль?');
+    if (redirect) {
+        window.location.href = '/profile';
+    }
+}, 8000);
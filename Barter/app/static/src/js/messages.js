@@ -0,0 +1,269 @@
+// Particles.js configuration
+particlesJS('particles-js', {
+    particles: {
+        number: { 
+            value: 40, 
+            density: { 
+                enable: true, 
+                value_area: 800 
+            } 
+        },
+        color: { 
+            value: "#6366f1" 
+        },
+        shape: { 
+            type: "circle" 
+        },
+        opacity: { 
+            value: 0.3, 
+            random: true 
+        },
+        size: { 
+            value: 2, 
+            random: true 
+        },
+        line_linked: {
+            enable: true,
+            distance: 150,
+            color: "#6366f1",
+            opacity: 0.1,
+            width: 1
+        },
+        move: {
+            enable: true,
+            speed: 1,
+            direction: "none",
+            random: true,
+            straight: false,
+            out_mode: "out",
+            bounce: false
+        }
+    },
+    interactivity: {
+        detect_on: "canvas",
+        events: {
+            onhover: { 
+                enable: true, 
+                mode: "repulse" 
+            },
+            onclick: { 
+                enable: true, 
+                mode: "push" 
+            },
+            resize: true
+        }
+    },
+    retina_detect: true
+});
+
+// Header scroll effect
+window.addEventListener('scroll', function() {
+    const header = document.querySelector('.header');
+    if (window.scrollY > 50) {
+        header.classList.add('scrolled');
+    } else {
+        header.classList.remove('scrolled');
+    }
+});
+
+// Auto-resize textarea
+const textarea = document.getElementById('messageInput');
+if (textarea) {
+    textarea.addEventListener('input', function() {
+        this.style.height = 'auto';
+        this.style.height = (this.scrollHeight) + 'px';
+    });
+}
+
+// Search dialogs
+const searchInput = document.getElementById('searchDialogs');
+if (searchInput) {
+    searchInput.addEventListener('input', function(e) {
+        const searchTerm = e.target.value.toLowerCase();
+        const dialogItems = document.querySelectorAll('.dialog-item');
+
+        dialogItems.forEach(item => {
+            const userName = item.querySelector('.dialog-name').textContent.toLowerCase();
+            const preview = item.querySelector('.dialog-preview').textContent.toLowerCase();
+
+            if (userName.includes(searchTerm) || preview.includes(searchTerm)) {
+                item.style.display = 'flex';
+            } else {
+                item.style.display = 'none';
+            }
+        });
+    });
+}
+
+// Chat functions
+let messagePollingInterval;
+
+function openChat(userId) {
+    window.location.href = `/messages/${userId}`;
+}
+
+function toggleDialogs() {
+    const sidebar = document.getElementById('dialogsSidebar');
+    sidebar.classList.toggle('active');
+}
+
+function clearChat() {
+    if (confirm('Вы уверены, что хотите очистить переписку?')) {
+        fetch(`/messages/clear/${currentChatUserId}`, {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+            }
+        })
+        .then(response => response.json())
+        .then(data => {
+            if (data.success) {
+                location.reload();
+            }
+        });
+    }
+}
+
+// Send message
+const messageForm = document.getElementById('messageForm');
+if (messageForm) {
+    messageForm.addEventListener('submit', async function(e) {
+        e.preventDefault();
+
+        const messageInput = document.getElementById('messageInput');
+        const message = messageInput.value.trim();
+        const sendButton = document.getElementById('sendButton');
+
+        if (!message) return;
+
+        sendButton.disabled = true;
+        sendButton.innerHTML = '<i class="fas fa-spinner fa-spin"></i>';
+
+        try {
+            const formData = new FormData();
+            formData.append('message', message);
+            formData.append('other_user_id', currentChatUserId);
+
+            // Handle file attachment
+            const fileInput = document.getElementById('fileInput');
+            if (fileInput.files.length > 0) {
+                formData.append('attachment', fileInput.files[0]);
+                fileInput.value = '';
+            }
+
+            const response = await fetch(`/messages/${currentChatUserId}/send`, {
+                method: 'POST',
+                body: formData
+            });
+
+            const data = await response.json();
+
+            if (data.success) {
+                messageInput.value = '';
+                messageInput.style.height = 'auto';
+                location.reload();
+            } else {
+                alert(data.message || 'Ошибка отправки сообщения');
+            }
+        } catch (error) {
+            console.error('Ошибка:', error);
+            alert('Ошибка сети');
+        } finally {
+            sendButton.disabled = false;
+            sendButton.innerHTML = '<i class="fas fa-paper-plane"></i>';
+        }
+    });
+}
+
+// Image modal
+function openImageModal(src) {
+    const modal = document.getElementById('imageModal');
+    const modalImage = document.getElementById('modalImage');
+    modalImage.src = src;
+    modal.style.display = 'flex';
+    document.body.style.overflow = 'hidden';
+}
+
+function closeImageModal() {
+    const modal = document.getElementById('imageModal');
+    modal.style.display = 'none';
+    document.body.style.overflow = 'auto';
+}
+
+// Close modal on ESC
+document.addEventListener('keydown', function(e) {
+    if (e.key === 'Escape') {
+        closeImageModal();
+    }
+});
+
+// Close modal on background click
+document.getElementById('imageModal')?.addEventListener('click', function(e) {
+    if (e.target === this) {
+        closeImageModal();
+    }
+});
+
+// Auto-scroll to bottom of messages
+function scrollToBottom() {
+    const container = document.getElementById('messagesContainer');
+    if (container) {
+        container.scrollTop = container.scrollHeight;
+    }
+}
+
+// Check for new messages periodically
+if (currentChatUserId) {
+    function checkNewMessages() {
+        const lastMessage = document.querySelector('.message-wrapper:last-child');
+        const lastMessageId = lastMessage ? lastMessage.dataset.messageId || 0 : 0;
+
+        fetch(`/messages/${currentChatUserId}/new?last_message_id=${lastMessageId}`)
+            .then(response => response.json())
+            .then(data => {
+                if (data.success && data.messages.length > 0) {
+                    // In a real app, you would append new messages here
+                    // For simplicity, we'll just reload
+                    location.reload();
+                }
+            });
+    }
+
+    // Check every 5 seconds
+    messagePollingInterval = setInterval(checkNewMessages, 5000);
+}
+
+// Update unread count (long polling: the server answers only when the count changes)
+let lastUnreadCount = null;
+function updateUnreadCount() {
+    const params = lastUnreadCount === null ? '' : `?since=${lastUnreadCount}&wait=25`;
+    fetch(`/api/unread_count${params}`)
+        .then(response => response.json())
+        .then(data => {
+            lastUnreadCount = data.count;
+            const badge = document.querySelector('.unread-count');
+            if (badge) {
+                if (data.count > 0) {
+                    badge.textContent = data.count;
+                    badge.style.display = 'flex';
+                } else {
+                    badge.style.display = 'none';
+                }
+            }
+            setTimeout(updateUnreadCount, 1000);
+        })
+        .catch(() => setTimeout(updateUnreadCount, 30000));
+}
+
+// Initialize
+document.addEventListener('DOMContentLoaded', function() {
+    scrollToBottom();
+
+    // Keep unread count up to date
+    updateUnreadCount();
+
+    // Mark all messages as read when opening chat
+    if (currentChatUserId) {
+        fetch(`/api/mark_as_read/${currentChatUserId}`, { method: 'POST' });
+    }
+});
@@ -0,0 +1,94 @@
+// Подсветка активного диалога при наведении
+document.addEventListener('DOMContentLoaded', function() {
+    const dialogCards = document.querySelectorAll('.dialog-card');
+    dialogCards.forEach(card => {
+        card.addEventListener('mouseenter', function() {
+            this.style.backgroundColor = '#f8f9fa';
+        });
+        card.addEventListener('mouseleave', function() {
+            this.style.backgroundColor = 'white';
+        });
+    });
+
+    // Поиск по переписке
+    const searchForm = document.getElementById('messageSearchForm');
+    const searchInput = document.getElementById('messageSearchInput');
+    const resultsBox = document.getElementById('messageSearchResults');
+    if (!searchForm || !searchInput || !resultsBox) {
+        return;
+    }
+
+    function escapeHtml(text) {
+        const div = document.createElement('div');
+        div.textContent = text || '';
+        return div.innerHTML;
+    }
+
+    // Подсветка слов запроса (по началу слова, как ищет сервер)
+    function highlight(text, query) {
+        let html = escapeHtml(text);
+        query.toLowerCase().split(/[^\p{L}\p{N}_]+/u)
+            .filter(word => word.length >= 2)
+            .map(word => word.slice(0, 5).replace(/[.*+?^${}()|[\]\\]/g, '\\$&'))
+            .forEach(stem => {
+                html = html.replace(new RegExp(`(${stem}[\\p{L}\\p{N}_]*)`, 'giu'), '<mark>$1</mark>');
+            });
+        return html;
+    }
+
+    function render(results, query) {
+        if (results.length === 0) {
+            resultsBox.innerHTML = '<p class="text-muted text-center p-3 mb-0">Ничего не найдено</p>';
+            return;
+        }
+        resultsBox.innerHTML = results.map(result => `
+            <a class="search-result" href="${result.url}">
+                <div class="d-flex justify-content-between">
+                    <strong>${escapeHtml(result.partner_username)}</strong>
+                    <small class="text-muted">${new Date(result.created_at).toLocaleString('ru-RU')}</small>
+                </div>
+                ${result.previous ? `<div class="search-context">${result.previous.is_my_message ? 'Вы: ' : ''}${escapeHtml(result.previous.text)}</div>` : ''}
+                <div>${result.is_my_message ? '<i class="fas fa-share fa-xs me-1"></i>' : ''}${highlight(result.snippet, query)}</div>
+            </a>
+        `).join('');
+    }
+
+    let timer = null;
+    let lastQuery = '';
+    async function search() {
+        const query = searchInput.value.trim();
+        if (query === lastQuery) {
+            return;
+        }
+        lastQuery = query;
+        if (query.length < 2) {
+            resultsBox.classList.add('d-none');
+            resultsBox.innerHTML = '';
+            return;
+        }
+        try {
+            const response = await fetch(`/api/messages/search?q=${encodeURIComponent(query)}`);
+            const data = await response.json();
+            // Ответ на устаревший запрос не показываем
+            if (query !== lastQuery) {
+                return;
+            }
+            if (data.success) {
+                render(data.results, query);
+                resultsBox.classList.remove('d-none');
+            }
+        } catch (error) {
+            console.error('Ошибка поиска:', error);
+        }
+    }
+
+    searchInput.addEventListener('input', function() {
+        clearTimeout(timer);
+        timer = setTimeout(search, 300);
+    });
+    searchForm.addEventListener('submit', function(e) {
+        e.preventDefault();
+        clearTimeout(timer);
+        search();
+    });
+});
@@ -0,0 +1,359 @@
+// Game data
+const gameItems = [
+    { id: 1, name: 'Книга', icon: '📚', category: 'books' },
+    { id: 2, name: 'Наушники', icon: '🎧', category: 'electronics' },
+    { id: 3, name: 'Футболка', icon: '👕', category: 'clothes' },
+    { id: 4, name: 'Растение', icon: '🌿', category: 'other' },
+    { id: 5, name: 'Фотоаппарат', icon: '📷', category: 'electronics' },
+    { id: 6, name: 'Кроссовки', icon: '👟', category: 'clothes' },
+    { id: 7, name: 'Скейтборд', icon: '🛹', category: 'sports' },
+    { id: 8, name: 'Краски', icon: '🎨', category: 'hobby' }
+];
+
+// Game state
+let gameState = {
+    score: 0,
+    timeLeft: 60,
+    level: 1,
+    selectedItems: [],
+    matchedPairs: 0,
+    totalPairs: 0,
+    timer: null,
+    isGameActive: false,
+    game: null
+};
+
+// DOM elements
+const startScreen = document.getElementById('startScreen');
+const gameScreen = document.getElementById('gameScreen');
+const resultsScreen = document.getElementById('resultsScreen');
+const gameBoard = document.getElementById('gameBoard');
+const scoreElement = document.getElementById('score');
+const timerElement = document.getElementById('timer');
+const levelElement = document.getElementById('level');
+const finalScoreElement = document.getElementById('finalScore');
+const pairsFoundElement = document.getElementById('pairsFound');
+const timeLeftElement = document.getElementById('timeLeft');
+const finalMessageElement = document.getElementById('finalMessage');
+const confettiContainer = document.getElementById('confettiContainer');
+const countdownOverlay = document.getElementById('countdownOverlay');
+
+// Show specific screen
+function showScreen(screenId) {
+    document.querySelectorAll('.game-screen').forEach(screen => {
+        screen.classList.remove('active');
+    });
+    document.getElementById(screenId).classList.add('active');
+}
+
+// Start new game
+function startGame() {
+    resetGameState();
+    registerGame(gameState);
+    generateGameBoard();
+    showCountdown();
+}
+
+// The server accepts a score only for a game it has started
+function registerGame(state) {
+    fetch('/api/minigame/start', { method: 'POST' })
+        .then(response => response.json())
+        .then(data => {
+            if (data.success) {
+                state.game = data.game;
+            }
+        })
+        .catch(() => {});
+}
+
+// Show countdown before game starts
+function showCountdown() {
+    showScreen('gameScreen');
+
+    let countdown = 3;
+    countdownOverlay.style.display = 'flex';
+    countdownOverlay.innerHTML = `<div class="countdown-number">${countdown}</div>`;
+
+    const countdownInterval = setInterval(() => {
+        countdown--;
+        if (countdown > 0) {
+            countdownOverlay.innerHTML = `<div class="countdown-number">${countdown}</div>`;
+        } else {
+            countdownOverlay.innerHTML = `<div class="countdown-number">Старт!</div>`;
+            setTimeout(() => {
+                countdownOverlay.style.display = 'none';
+                startTimer();
+                gameState.isGameActive = true;
+            }, 1000);
+            clearInterval(countdownInterval);
+        }
+    }, 1000);
+}
+
+// Restart game
+function restartGame() {
+    if (gameState.timer) {
+        clearInterval(gameState.timer);
+    }
+    startGame();
+}
+
+// Reset game state
+function resetGameState() {
+    gameState = {
+        score: 0,
+        timeLeft: 60,
+        level: 1,
+        selectedItems: [],
+        matchedPairs: 0,
+        totalPairs: 8,
+        timer: null,
+        isGameActive: false,
+        game: null
+    };
+
+    updateUI();
+
+    // Reset timer colors
+    timerElement.classList.remove('warning', 'danger');
+}
+
+// Generate game board
+function generateGameBoard() {
+    gameBoard.innerHTML = '';
+
+    // Duplicate items and shuffle
+    const gameItemsDuplicated = [...gameItems, ...gameItems];
+    const shuffledItems = shuffleArray(gameItemsDuplicated);
+
+    shuffledItems.forEach((item, index) => {
+        const itemElement = document.createElement('div');
+        itemElement.className = 'item-card';
+        itemElement.innerHTML = `
+            <div class="item-icon">${item.icon}</div>
+            <div class="item-name">${item.name}</div>
+            <div class="item-category">${item.category}</div>
+        `;
+        itemElement.dataset.itemId = item.id;
+        itemElement.addEventListener('click', () => selectItem(itemElement, item));
+        gameBoard.appendChild(itemElement);
+    });
+}
+
+// Select item
+function selectItem(element, item) {
+    if (!gameState.isGameActive || element.classList.contains('selected') || element.classList.contains('matched')) {
+        return;
+    }
+
+    // Prevent selecting more than 2 items
+    if (gameState.selectedItems.length >= 2) {
+        return;
+    }
+
+    element.classList.add('selected');
+    gameState.selectedItems.push({ element, item });
+
+    if (gameState.selectedItems.length === 2) {
+        checkMatch();
+    }
+}
+
+// Check if selected items match
+function checkMatch() {
+    const [first, second] = gameState.selectedItems;
+
+    if (first.item.id === second.item.id) {
+        // Match found
+        first.element.classList.add('matched');
+        second.element.classList.add('matched');
+        gameState.matchedPairs++;
+        gameState.score += 100 * gameState.level;
+
+        // Bonus for quick matches
+        if (gameState.timeLeft > 45) {
+            gameState.score += 50;
+        } else if (gameState.timeLeft > 30) {
+            gameState.score += 25;
+        }
+
+        updateUI();
+
+        // Check win condition
+        if (gameState.matchedPairs === gameState.totalPairs) {
+            endGame(true);
+        }
+    } else {
+        // No match
+        setTimeout(() => {
+            first.element.classList.remove('selected');
+            second.element.classList.remove('selected');
+        }, 1000);
+    }
+
+    // Clear selection
+    setTimeout(() => {
+        gameState.selectedItems = [];
+    }, 1000);
+}
+
+// Start timer
+function startTimer() {
+    gameState.timer = setInterval(() => {
+        gameState.timeLeft--;
+        updateUI();
+
+        // Update timer color based on remaining time
+        if (gameState.timeLeft <= 10) {
+            timerElement.classList.add('danger');
+            timerElement.classList.remove('warning');
+        } else if (gameState.timeLeft <= 30) {
+            timerElement.classList.add('warning');
+        }
+
+        if (gameState.timeLeft <= 0) {
+            endGame(false);
+        }
+    }, 1000);
+}
+
+// End game
+function endGame(isWin) {
+    gameState.isGameActive = false;
+    clearInterval(gameState.timer);
+
+    // Update results
+    finalScoreElement.textContent = gameState.score;
+    pairsFoundElement.textContent = `${gameState.matchedPairs}/${gameState.totalPairs}`;
+    timeLeftElement.textContent = gameState.timeLeft;
+
+    if (isWin) {
+        finalMessageElement.textContent = 'Поздравляем! Вы нашли все пары! 🎉';
+        createConfetti();
+    } else {
+        finalMessageElement.textContent = 'Время вышло! Попробуйте ещё раз! 💪';
+    }
+
+    showScreen('resultsScreen');
+    submitScore(gameState.score, gameState.game);
+}
+
+// Leaderboard
+let currentBoard = 'all';
+
+function submitScore(score, game) {
+    const formData = new FormData();
+    formData.append('score', score);
+    formData.append('game', game || '');
+
+    fetch('/api/minigame/score', { method: 'POST', body: formData })
+        .then(response => response.json())
+        .then(data => {
+            if (!data.success && data.message) {
+                document.getElementById('leaderboardPosition').textContent = data.message;
+            }
+        })
+        .catch(() => {})
+        .finally(() => loadLeaderboard(currentBoard));
+}
+
+function loadLeaderboard(board) {
+    currentBoard = board;
+    document.querySelectorAll('.leaderboard-tab').forEach(tab => {
+        tab.classList.toggle('active', tab.dataset.board === board);
+    });
+
+    fetch(`/api/minigame/leaderboard?board=${board}`)
+        .then(response => response.json())
+        .then(data => {
+            if (!data.success) {
+                return;
+            }
+            const myId = data.around && data.around.length ? findMyId(data) : null;
+            renderLeaderboardRows(document.getElementById('leaderboardTop'), data.top, myId);
+
+            const position = data.position ? data.position[board] : null;
+            const positionElement = document.getElementById('leaderboardPosition');
+            if (position && position.rank) {
+                positionElement.textContent = `Ваш лучший результат: ${position.score}, место ${position.rank} из ${position.players}`;
+            } else if (data.position) {
+                positionElement.textContent = 'Вашего результата здесь пока нет';
+            }
+
+            // Neighbours are shown only when the player is outside the top list
+            const inTop = myId !== null && data.top.some(entry => entry.user_id === myId);
+            const around = inTop ? [] : (data.around || []);
+            document.getElementById('leaderboardAroundTitle').style.display = around.length ? 'block' : 'none';
+            renderLeaderboardRows(document.getElementById('leaderboardAround'), around, myId);
+        })
+        .catch(() => {});
+}
+
+function findMyId(data) {
+    const rank = data.position[currentBoard].rank;
+    const me = data.around.find(entry => entry.rank === rank);
+    return me ? me.user_id : null;
+}
+
+function renderLeaderboardRows(list, entries, myId) {
+    list.innerHTML = '';
+    entries.forEach(entry => {
+        const row = document.createElement('li');
+        row.className = 'leaderboard-row' + (entry.user_id === myId ? ' me' : '');
+
+        const rank = document.createElement('span');
+        rank.className = 'leaderboard-rank';
+        rank.textContent = `#${entry.rank}`;
+
+        const name = document.createElement('span');
+        name.className = 'leaderboard-name';
+        name.textContent = entry.username || 'Игрок';
+
+        const score = document.createElement('span');
+        score.className = 'leaderboard-score';
+        score.textContent = entry.score;
+
+        row.append(rank, name, score);
+        list.appendChild(row);
+    });
+}
+
+// Update UI
+function updateUI() {
+    scoreElement.textContent = gameState.score;
+    timerElement.textContent = gameState.timeLeft;
+    levelElement.textContent = gameState.level;
+}
+
+// Utility functions
+function shuffleArray(array) {
+    const newArray = [...array]; // Create a copy to avoid mutating the original
+    for (let i = newArray.length - 1; i > 0; i--) {
+        const j = Math.floor(Math.random() * (i + 1));
+        [newArray[i], newArray[j]] = [newArray[j], newArray[i]];
+    }
+    return newArray;
+}
+
+function createConfetti() {
+    // Clear any existing confetti
+    confettiContainer.innerHTML = '';
+
+    for (let i = 0; i < 50; i++) {
+        const confetti = document.createElement('div');
+        confetti.className = 'confetti';
+        confetti.style.left = Math.random() * 100 + '%';
+        confetti.style.background = `hsl(${Math.random() * 360}, 70%, 60%)`;
+        confetti.style.animationDelay = Math.random() * 2 + 's';
+        confettiContainer.appendChild(confetti);
+
+        setTimeout(() => {
+            if (confetti.parentNode === confettiContainer) {
+                confetti.remove();
+            }
+        }, 3000);
+    }
+}
+
+// Initialize game
+updateUI();
@@ -0,0 +1,28 @@
+// Add fade-in animation
+const fadeElements = document.querySelectorAll('.fade-in');
+
+fadeElements.forEach((el, index) => {
+    el.style.opacity = '0';
+    el.style.transform = 'translateY(20px)';
+    el.style.transition = 'opacity 0.8s ease, transform 0.8s ease';
+
+    setTimeout(() => {
+        el.style.opacity = '1';
+        el.style.transform = 'translateY(0)';
+    }, index * 200);
+});
+
+// Add confetti animation
+function createConfetti() {
+    const confettiContainer = document.querySelector('.confetti');
+    for (let i = 0; i < 12; i++) {
+        const confetti = document.createElement('div');
+        confetti.className = 'confetti-item';
+        confetti.style.left = Math.random() * 100 + '%';
+        confetti.style.animationDelay = Math.random() * 2 + 's';
+        confetti.style.background = `hsl(${Math.random() * 360}, 70%, 60%)`;
+        confettiContainer.appendChild(confetti);
+    }
+}
+
+createConfetti();
@@ -0,0 +1,45 @@
+// Propose an exchange and open the conversation with the author
+const proposeButton = document.getElementById('proposeExchange');
+if (proposeButton) {
+    proposeButton.addEventListener('click', async () => {
+        const body = new FormData();
+        body.append('offer_id', proposeButton.dataset.offerId);
+        const response = await fetch('/exchanges/propose', { method: 'POST', body });
+        const data = await response.json();
+        if (data.success) {
+            window.location.href = '/messages/' + proposeButton.dataset.userId;
+        } else {
+            alert(data.message || 'Не удалось предложить обмен');
+        }
+    });
+}
+
+// Add fade-in animation
+const fadeElements = document.querySelectorAll('.fade-in');
+
+const fadeInOnScroll = new IntersectionObserver((entries) => {
+    entries.forEach(entry => {
+        if (entry.isIntersecting) {
+            entry.target.style.opacity = 1;
+            entry.target.style.transform = 'translateY(0)';
+        }
+    });
+}, { threshold: 0.1 });
+
+fadeElements.forEach(el => {
+    el.style.opacity = 0;
+    el.style.transform = 'translateY(20px)';
+    el.style.transition = 'opacity 0.6s ease, transform 0.6s ease';
+    fadeInOnScroll.observe(el);
+});
+
+// Add interactive effects
+document.querySelectorAll('.contact-item, .info-card').forEach(item => {
+    item.addEventListener('mouseenter', function() {
+        this.style.transform = 'translateY(-5px)';
+    });
+
+    item.addEventListener('mouseleave', function() {
+        this.style.transform = 'translateY(0)';
+    });
+});
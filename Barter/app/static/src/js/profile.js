@@ -0,0 +1,72 @@
+async function deleteOffer(button, offerId) {
+    if (!confirm('Вы уверены, что хотите удалить это объявление?')) {
+        return;
+    }
+
+    try {
+        const response = await fetch(`/delete_offer/${offerId}`, {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+            }
+        });
+
+        const result = await response.json();
+
+        if (result.success) {
+            // Удаляем карточку объявления из DOM
+            const offerCard = document.getElementById(`offer-card-${offerId}`);
+            if (offerCard) {
+                offerCard.remove();
+                alert('Объявление успешно удалено');
+
+                // Обновляем счетчик объявлений
+                const statValueElement = document.querySelector('.stat-card:first-child .stat-value');
+                if (statValueElement) {
+                    const currentCount = parseInt(statValueElement.textContent);
+                    statValueElement.textContent = currentCount - 1;
+                }
+
+                // Если объявлений не осталось, показываем пустой state
+                const offersGrid = document.querySelector('.offers-grid');
+                if (offersGrid && offersGrid.children.length === 0) {
+                    const emptyState = `
+                        <div class="empty-state">
+                            <div class="empty-icon">📝</div>
+                            <div class="empty-text">У вас пока нет активных объявлений</div>
+                            <a href="/addoffer" class="action-button action-primary">
+                                <i class="fas fa-plus"></i>
+                                Создать первое объявление
+                            </a>
+                        </div>
+                    `;
+                    offersGrid.parentElement.innerHTML = `
+                        <div class="offers-header">
+                            <h2 class="section-title">
+                                <i class="fas fa-list-alt"></i>
+                                Активные объявления
+                            </h2>
+                            <a href="/addoffer" class="action-button action-primary">
+                                <i class="fas fa-plus"></i>
+                                Добавить объявление
+                            </a>
+                        </div>
+                        ${emptyState}
+                    `;
+                }
+            }
+        } else {
+            alert(`Ошибка: ${result.message}`);
+        }
+    } catch (error) {
+        console.error('Ошибка при удалении объявления:', error);
+        alert('Произошла ошибка при удалении объявления');
+    }
+}
+
+function editOffer(offerId) {
+    // Редирект на страницу редактирования
+    // Если у вас есть страница редактирования
+    // window.location.href = `/edit_offer/${offerId}`;
+    alert('Функция редактирования пока не реализована');
+}
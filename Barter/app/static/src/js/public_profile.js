@@ -0,0 +1,105 @@
+// Rating stars selection
+
+function selectRating(rating) {
+    selectedRating = rating;
+    document.getElementById('ratingValue').value = rating;
+
+    // Update star display
+    const stars = document.querySelectorAll('.rating-star');
+    stars.forEach(star => {
+        const value = parseInt(star.getAttribute('data-value'));
+        if (value <= rating) {
+            star.classList.add('selected');
+        } else {
+            star.classList.remove('selected');
+        }
+    });
+}
+
+// Submit rating form
+async function submitRating(event) {
+    event.preventDefault();
+
+    const form = event.target;
+    const formData = new FormData(form);
+    const targetUserId = formData.get('target_user_id');
+    const rating = formData.get('rating');
+    const comment = formData.get('comment');
+
+    if (!rating) {
+        alert('Пожалуйста, выберите оценку');
+        return;
+    }
+
+    const submitBtn = form.querySelector('.submit-btn');
+    const originalText = submitBtn.innerHTML;
+    submitBtn.innerHTML = '<i class="fas fa-spinner fa-spin"></i> Отправка...';
+    submitBtn.disabled = true;
+
+    try {
+        const response = await fetch(`/rate_user/${targetUserId}`, {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/x-www-form-urlencoded',
+            },
+            body: `rating=${rating}&comment=${encodeURIComponent(comment)}`
+        });
+
+        const data = await response.json();
+
+        if (data.success) {
+            alert(data.message || 'Оценка отправлена!');
+            location.reload(); // Reload to show updated rating
+        } else {
+            alert(data.message || 'Ошибка при отправке оценки');
+            submitBtn.innerHTML = originalText;
+            submitBtn.disabled = false;
+        }
+    } catch (error) {
+        alert('Ошибка сети: ' + error.message);
+        submitBtn.innerHTML = originalText;
+        submitBtn.disabled = false;
+    }
+}
+
+// Add fade-in animation on scroll
+const fadeElements = document.querySelectorAll('.fade-in');
+const fadeInOnScroll = new IntersectionObserver((entries) => {
+    entries.forEach(entry => {
+        if (entry.isIntersecting) {
+            entry.target.style.opacity = 1;
+            entry.target.style.transform = 'translateY(0)';
+        }
+    });
+}, { threshold: 0.1 });
+
+fadeElements.forEach(el => {
+    el.style.opacity = 0;
+    el.style.transform = 'translateY(20px)';
+    el.style.transition = 'opacity 0.6s ease, transform 0.6s ease';
+    fadeInOnScroll.observe(el);
+});
+
+// Уведомление о возможности обсуждения
+document.addEventListener('DOMContentLoaded', function() {
+    if (canMessage) {
+        // Можно добавить всплывающую подсказку при наведении на кнопку обсуждения
+        const messageButtons = document.querySelectorAll('.message-button');
+        messageButtons.forEach(btn => {
+            btn.addEventListener('mouseenter', function() {
+                this.style.transform = 'translateY(-3px) scale(1.02)';
+            });
+            btn.addEventListener('mouseleave', function() {
+                this.style.transform = 'translateY(0) scale(1)';
+            });
+        });
+
+        // Автоматическое выделение текста в текстовом поле при фокусе
+        const commentInput = document.getElementById('comment');
+        if (commentInput) {
+            commentInput.addEventListener('focus', function() {
+                this.select();
+            });
+        }
+    }
+});
@@ -0,0 +1,71 @@
+# test_assets.py
+# Минификация бандлов: CSS и консервативная JS.
+from assets import minify_css, minify_js
+
+
+def test_css_comments_and_whitespace():
+    source = """
+    /* шапка */
+    .header  >  a ,
+    .nav a {
+        color : red;
+        margin: 0 auto;
+    }
+    """
+    assert minify_css(source) == ".header>a,.nav a{color : red;margin: 0 auto}"
+
+
+def test_css_strings_are_untouched():
+    source = '.icon::before { content: "a  ;  b /* not a comment */"; }'
+    assert minify_css(source) == '.icon::before{content: "a  ;  b /* not a comment */"}'
+
+
+def test_css_media_query():
+    source = "@media (max-width: 600px) {\n  .card { padding: 4px; }\n}\n"
+    assert minify_css(source) == "@media (max-width: 600px){.card{padding: 4px}}"
+
+
+def test_js_drops_indentation_blank_lines_and_line_comments():
+    source = """
+    // инициализация
+    function init() {
+        const a = 1;
+
+        return a; // остается: комментарий в конце строки не трогаем
+    }
+    """
+    assert minify_js(source) == (
+        "function init() {\n"
+        "const a = 1;\n"
+        "return a; // остается: комментарий в конце строки не трогаем\n"
+        "}\n"
+    )
+
+
+def test_js_keeps_line_breaks_for_asi():
+    source = "let a = 1\nlet b = a\n(b)\n"
+    assert minify_js(source).splitlines() == ["let a = 1", "let b = a", "(b)"]
+
+
+def test_js_multiline_template_literal_is_kept():
+    source = (
+        "const html = `\n"
+        "    <div>\n"
+        "        // не комментарий\n"
+        "\n"
+        "    </div>`;\n"
+        "    call(html);\n"
+    )
+    assert minify_js(source) == (
+        "const html = `\n"
+        "    <div>\n"
+        "        // не комментарий\n"
+        "\n"
+        "    </div>`;\n"
+        "call(html);\n"
+    )
+
+
+def test_css_quote_inside_comment():
+    source = "/* don't break */ .a { color: red; }"
+    assert minify_css(source) == ".a{color: red}"
@@ -0,0 +1,191 @@
+# test_cache.py
+# TTLCache: TTL, LRU, теги и защита от сохранения значения, загруженного
+# до инвалидации (эпохи тегов), single-flight.
+import threading
+import time
+
+import pytest
+
+import cache
+from cache import TTLCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_get_set_and_ttl(clock):
+    c = TTLCache("t", ttl=10)
+    c.set("a", 1)
+    assert c.get("a") == 1
+    clock[0] += 9.9
+    assert c.get("a") == 1
+    clock[0] += 0.2
+    assert c.get("a") is None
+    assert c.stats()["expirations"] == 1
+
+
+def test_lru_eviction_by_entries():
+    c = TTLCache("t", max_entries=2)
+    c.set("a", 1)
+    c.set("b", 2)
+    c.get("a")
+    c.set("c", 3)
+    assert c.get("b") is None
+    assert c.get("a") == 1 and c.get("c") == 3
+    assert c.stats()["evictions"] == 1
+
+
+def test_value_larger_than_limit_is_not_stored():
+    c = TTLCache("t", max_bytes=100)
+    c.set("big", "x" * 1000)
+    assert c.get("big") is None
+    assert c.stats()["bytes"] == 0
+
+
+def test_invalidate_tag_drops_only_tagged_keys():
+    c = TTLCache("t")
+    c.set(1, "offer 1", tags=[("offer", 1), ("user", 7)])
+    c.set(2, "offer 2", tags=[("offer", 2), ("user", 7)])
+    c.set(3, "offer 3", tags=[("offer", 3)])
+
+    assert sorted(c.invalidate_tag(("user", 7))) == [1, 2]
+    assert c.get(1) is None and c.get(2) is None
+    assert c.get(3) == "offer 3"
+    assert c.invalidate_tag(("user", 7)) == []
+
+
+def test_tag_index_is_cleaned_on_eviction():
+    c = TTLCache("t", max_entries=1)
+    c.set("a", 1, tags=["x"])
+    c.set("b", 2, tags=["y"])
+    assert c.invalidate_tag("x") == []
+    assert c.get("b") == 2
+
+
+def test_get_or_load_caches_and_tags_from_value():
+    c = TTLCache("t")
+    calls = []
+
+    def load():
+        calls.append(1)
+        return {"id": 5, "user_id": 9}
+
+    value = c.get_or_load("k", load, tags=lambda v: [("user", v["user_id"])])
+    assert value == {"id": 5, "user_id": 9}
+    assert c.get_or_load("k", load) == value
+    assert len(calls) == 1
+    assert c.invalidate_tag(("user", 9)) == ["k"]
+
+
+def test_none_is_cached_only_on_request():
+    c = TTLCache("t")
+    calls = []
+
+    def load():
+        calls.append(1)
+        return None
+
+    c.get_or_load("k", load)
+    c.get_or_load("k", load)
+    assert len(calls) == 2
+    c.get_or_load("n", load, cache_none=True)
+    c.get_or_load("n", load, cache_none=True)
+    assert len(calls) == 3
+
+
+def test_tag_invalidated_during_load_is_not_stored():
+    c = TTLCache("t")
+
+    def load():
+        # Запись, прочитанная до изменения строки, не должна пережить его
+        c.invalidate_tag(("offer", 1))
+        return "old"
+
+    assert c.get_or_load("k", load, tags=[("offer", 1)]) == "old"
+    assert c.get("k") is None
+    # Следующая загрузка после инвалидации сохраняется как обычно
+    assert c.get_or_load("k", lambda: "new", tags=[("offer", 1)]) == "new"
+    assert c.get("k") == "new"
+
+
+def test_other_tag_invalidated_during_load_does_not_block_store():
+    c = TTLCache("t")
+
+    def load():
+        c.invalidate_tag(("offer", 2))
+        return "value"
+
+    c.get_or_load("k", load, tags=[("offer", 1)])
+    assert c.get("k") == "value"
+
+
+def test_delete_during_load_is_not_stored():
+    c = TTLCache("t")
+
+    def load():
+        c.delete("k")
+        return "old"
+
+    c.get_or_load("k", load)
+    assert c.get("k") is None
+
+
+def test_clear_during_load_is_not_stored():
+    c = TTLCache("t")
+
+    def load():
+        c.clear()
+        return "old"
+
+    c.get_or_load("k", load)
+    assert c.get("k") is None
+
+
+def test_loader_error_is_raised_and_not_cached():
+    c = TTLCache("t")
+
+    def fail():
+        raise RuntimeError("db down")
+
+    with pytest.raises(RuntimeError):
+        c.get_or_load("k", fail)
+    assert c.get_or_load("k", lambda: 1) == 1
+
+
+def test_single_flight_runs_one_loader():
+    c = TTLCache("t")
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def load():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return "value"
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(c.get_or_load("k", load)))
+    leader.start()
+    assert started.wait(5)
+    followers = [
+        threading.Thread(target=lambda: results.append(c.get_or_load("k", load)))
+        for _ in range(5)
+    ]
+    for thread in followers:
+        thread.start()
+    # Ведомые уже ждут загрузку ведущего
+    deadline = time.time() + 5
+    while c.stats()["coalesced"] < 5 and time.time() < deadline:
+        time.sleep(0.01)
+    release.set()
+    for thread in [leader] + followers:
+        thread.join(5)
+
+    assert results == ["value"] * 6
+    assert len(calls) == 1
+    assert c.stats()["coalesced"] == 5
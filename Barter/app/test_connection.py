@@ -1,5 +1,24 @@
 
-from database import db
+# test_connection.py
+# Диагностика БД: проверка подключения, задержки подключения и запросов,
+# повтор запросов services.py с EXPLAIN, сравнение пула и подключения на запрос.
+#
+#   python test_connection.py                       # быстрая проверка (как раньше)
+#   python test_connection.py connect -n 50         # время подключения против времени запроса
+#   python test_connection.py queries -n 20         # запросы services.py: задержки и EXPLAIN
+#   python test_connection.py pool -n 200 -c 8      # подключение на запрос против пула
+#   python test_connection.py all --json > diag.json
+import argparse
+import json
+import socket
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import mysql.connector
+
+from database import db, query_log
 
 def test_connection():
     print("🧪 ТЕСТ ПОДКЛЮЧЕНИЯ К БАЗЕ ДАННЫХ")
@@ -48,5 +67,314 @@ def test_connection():
     print("🎉 ТЕСТ ЗАВЕРШЕН!")
     return True
 
+# ================================
+# Измерения
+# ================================
+
+def summarize(samples):
+    """Распределение задержек в миллисекундах"""
+    if not samples:
+        return {"count": 0}
+    ordered = sorted(samples)
+
+    def pick(p):
+        return ordered[max(0, min(len(ordered) - 1, int(round(p / 100 * len(ordered))) - 1))]
+
+    return {
+        "count": len(ordered),
+        "min_ms": round(ordered[0] * 1000, 3),
+        "p50_ms": round(pick(50) * 1000, 3),
+        "p95_ms": round(pick(95) * 1000, 3),
+        "p99_ms": round(pick(99) * 1000, 3),
+        "max_ms": round(ordered[-1] * 1000, 3),
+        "mean_ms": round(statistics.fmean(ordered) * 1000, 3),
+    }
+
+
+def measure_connect(iterations):
+    """Разложить время на TCP, рукопожатие MySQL (с авторизацией) и сам запрос"""
+    params = db.connection_params()
+    tcp, handshake, query, close = [], [], [], []
+
+    for _ in range(iterations):
+        start = time.perf_counter()
+        sock = socket.create_connection((params["host"], params["port"]), timeout=5)
+        tcp.append(time.perf_counter() - start)
+        sock.close()
+
+        start = time.perf_counter()
+        connection = mysql.connector.connect(**params)
+        handshake.append(time.perf_counter() - start)
+
+        cursor = connection.cursor()
+        start = time.perf_counter()
+        cursor.execute("SELECT 1")
+        cursor.fetchall()
+        query.append(time.perf_counter() - start)
+        cursor.close()
+
+        start = time.perf_counter()
+        connection.close()
+        close.append(time.perf_counter() - start)
+
+    return {
+        "tcp_connect": summarize(tcp),
+        "mysql_connect": summarize(handshake),
+        "select_1": summarize(query),
+        "close": summarize(close),
+    }
+
+
+def representative_params():
+    """Подобрать реальные параметры: самый активный продавец, свежее объявление и т.п."""
+    def one(query, default=None):
+        rows = db.execute_query(query, fetch=True)
+        return rows[0] if rows else default
+
+    seller = one(
+        """SELECT user_id, COUNT(*) AS c FROM offers WHERE is_active = TRUE
+           GROUP BY user_id ORDER BY c DESC LIMIT 1""",
+        {"user_id": 1},
+    )
+    user = one(f"SELECT id, username, email FROM users WHERE id = {int(seller['user_id'])}", {})
+    offer = one("SELECT id FROM offers WHERE is_active = TRUE ORDER BY id DESC LIMIT 1", {"id": 1})
+    category = one(
+        """SELECT category FROM offers WHERE is_active = TRUE AND category IS NOT NULL
+           GROUP BY category ORDER BY COUNT(*) DESC LIMIT 1""",
+        {"category": "other"},
+    )
+    city = one(
+        """SELECT city FROM offers WHERE is_active = TRUE AND city IS NOT NULL
+           GROUP BY city ORDER BY COUNT(*) DESC LIMIT 1""",
+        {"city": "moscow"},
+    )
+    recipient = one(
+        "SELECT recipient_id FROM messages GROUP BY recipient_id ORDER BY COUNT(*) DESC LIMIT 1",
+        {"recipient_id": seller["user_id"]},
+    )
+    rater = one(
+        "SELECT rater_user_id FROM ratings WHERE target_user_id = %s LIMIT 1" % int(seller["user_id"]),
+        {"rater_user_id": 1},
+    )
+    return {
+        "user_id": seller["user_id"],
+        "username": user.get("username", ""),
+        "email": user.get("email", ""),
+        "offer_id": offer["id"],
+        "category": category["category"],
+        "city": city["city"],
+        "chat_user_id": recipient["recipient_id"],
+        "rater_id": rater["rater_user_id"],
+    }
+
+
+def service_scenarios(p):
+    """Методы чтения services.py с типичными параметрами (без побочных записей)"""
+    from services import (
+        UserService, OfferService, RatingService, ExchangeService,
+        AuthService, MessageService, UnreadCountService
+    )
+
+    return [
+        ("UserService.get_user_by_id", lambda: UserService.get_user_by_id(p["user_id"])),
+        ("UserService.get_user_by_username", lambda: UserService.get_user_by_username(p["username"])),
+        ("OfferService.get_all_offers", lambda: OfferService.get_all_offers()),
+        ("OfferService.get_all_offers[category,city]",
+         lambda: OfferService.get_all_offers(p["category"], p["city"])),
+        ("OfferService.get_all_offers[search]", lambda: OfferService.get_all_offers(search="велосипед")),
+        ("OfferService.get_offers_page", lambda: OfferService.get_offers_page(limit=21)),
+        ("OfferService.get_offer_by_id", lambda: OfferService.get_offer_by_id(p["offer_id"])),
+        ("OfferService.get_user_offers", lambda: OfferService.get_user_offers(p["user_id"])),
+        ("OfferService.count_user_offers", lambda: OfferService.count_user_offers(p["user_id"])),
+        ("RatingService.get_user_rating_stats", lambda: RatingService.get_user_rating_stats(p["user_id"])),
+        ("RatingService.get_recent_reviews", lambda: RatingService.get_recent_reviews(p["user_id"])),
+        ("RatingService.get_user_rating", lambda: RatingService.get_user_rating(p["rater_id"], p["user_id"])),
+        ("ExchangeService.count_successful_exchanges",
+         lambda: ExchangeService.count_successful_exchanges(p["user_id"])),
+        ("AuthService.check_user_exists", lambda: AuthService.check_user_exists(p["username"], p["email"])),
+        ("MessageService.get_user_dialogs", lambda: MessageService.get_user_dialogs(p["chat_user_id"])),
+        ("UnreadCountService.reconcile_user[count]",
+         lambda: UnreadCountService.reconcile_user(p["chat_user_id"])),
+    ]
+
+
+def capture_queries(func):
+    """Выполнить метод сервиса и записать все его SQL-запросы с параметрами"""
+    from services import CACHES
+
+    # Кеши спрятали бы запросы - сбрасываем их перед захватом
+    for cache in CACHES.values():
+        cache.clear()
+
+    log = []
+    token = query_log.set(log)
+    try:
+        func()
+    finally:
+        query_log.reset(token)
+    return [(query, params) for query, params, _ in log]
+
+
+def explain(cursor, query, params):
+    try:
+        cursor.execute("EXPLAIN " + query, params or ())
+        return [
+            {key: row.get(key) for key in ("table", "type", "possible_keys", "key", "rows", "filtered", "Extra")}
+            for row in cursor.fetchall()
+        ]
+    except mysql.connector.Error as e:
+        return [{"error": str(e)}]
+
+
+def measure_queries(iterations):
+    """Повторить каждый SELECT из services.py на одном соединении: задержки + EXPLAIN"""
+    params = representative_params()
+    connection = mysql.connector.connect(**db.connection_params())
+    cursor = connection.cursor(dictionary=True)
+    results = []
+
+    for name, func in service_scenarios(params):
+        for query, query_params in capture_queries(func):
+            if not query.lstrip().upper().startswith("SELECT"):
+                continue
+
+            samples = []
+            rows = 0
+            for _ in range(iterations):
+                start = time.perf_counter()
+                cursor.execute(query, query_params or ())
+                rows = len(cursor.fetchall())
+                samples.append(time.perf_counter() - start)
+
+            results.append({
+                "name": name,
+                "query": " ".join(query.split()),
+                "params": [str(value) for value in (query_params or ())],
+                "rows": rows,
+                "latency": summarize(samples),
+                "explain": explain(cursor, query, query_params),
+            })
+
+    cursor.close()
+    connection.close()
+    return {"params": {key: str(value) for key, value in params.items()}, "queries": results}
+
+
+def _timed_select(_=None):
+    start = time.perf_counter()
+    db.execute_query("SELECT 1 AS ok", fetch=True)
+    return time.perf_counter() - start
+
+
+def _run_mode(iterations, concurrency):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        samples = list(executor.map(_timed_select, range(iterations)))
+    elapsed = time.perf_counter() - start
+    return dict(summarize(samples), throughput_qps=round(iterations / elapsed, 1))
+
+
+def measure_pool(iterations, concurrency):
+    """Сравнить подключение на каждый запрос с пулом соединений"""
+    previous_pool = db.pool
+    db.pool = None
+    try:
+        direct = _run_mode(iterations, concurrency)
+        if not db.init_pool(max(concurrency, 1)):
+            return {"connect_per_query": direct, "pooled": {"error": "не удалось создать пул"}}
+        pooled = _run_mode(iterations, concurrency)
+    finally:
+        db.close_pool()
+        db.pool = previous_pool
+
+    speedup = direct["p50_ms"] / pooled["p50_ms"] if pooled.get("p50_ms") else None
+    return {
+        "concurrency": concurrency,
+        "connect_per_query": direct,
+        "pooled": pooled,
+        "p50_speedup": round(speedup, 1) if speedup else None,
+    }
+
+
+# ================================
+# Вывод
+# ================================
+
+def print_distribution(label, stats):
+    if not stats.get("count"):
+        print(f"   {label:<44} нет данных")
+        return
+    print(
+        f"   {label:<44} p50 {stats['p50_ms']:>8.2f} мс   p95 {stats['p95_ms']:>8.2f} мс"
+        f"   p99 {stats['p99_ms']:>8.2f} мс   max {stats['max_ms']:>8.2f} мс"
+    )
+
+
+def print_report(results):
+    if "connect" in results:
+        print("\n⏱  ПОДКЛЮЧЕНИЕ ПРОТИВ ЗАПРОСА")
+        for label, stats in results["connect"].items():
+            print_distribution(label, stats)
+
+    if "queries" in results:
+        print("\n🔎 ЗАПРОСЫ services.py")
+        for item in sorted(results["queries"]["queries"], key=lambda q: -q["latency"].get("p95_ms", 0)):
+            print_distribution(f"{item['name']} ({item['rows']} стр.)", item["latency"])
+            for row in item["explain"]:
+                if "error" in row:
+                    print(f"      EXPLAIN: {row['error']}")
+                else:
+                    print(
+                        f"      {row['table']}: type={row['type']} key={row['key']} "
+                        f"rows={row['rows']} {row['Extra'] or ''}"
+                    )
+
+    if "pool" in results:
+        pool = results["pool"]
+        print(f"\n🔁 ПУЛ ПРОТИВ ПОДКЛЮЧЕНИЯ НА ЗАПРОС (потоков: {pool.get('concurrency')})")
+        for label in ("connect_per_query", "pooled"):
+            stats = pool[label]
+            if "error" in stats:
+                print(f"   {label:<44} {stats['error']}")
+            else:
+                print_distribution(label, stats)
+                print(f"   {'':<44} {stats['throughput_qps']} запросов/с")
+        if pool.get("p50_speedup"):
+            print(f"   Ускорение p50 с пулом: x{pool['p50_speedup']}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Диагностика задержек БД")
+    parser.add_argument(
+        "mode", nargs="?", default="check",
+        choices=["check", "connect", "queries", "pool", "all"],
+    )
+    parser.add_argument("-n", "--iterations", type=int, default=20, help="повторов на измерение")
+    parser.add_argument("-c", "--concurrency", type=int, default=4, help="потоков в режиме pool")
+    parser.add_argument("--json", action="store_true", help="вывести результат в JSON")
+    parser.add_argument("--output", help="сохранить JSON-результат в файл")
+    args = parser.parse_args(argv)
+
+    if args.mode == "check":
+        return 0 if test_connection() else 1
+
+    results = {"mode": args.mode, "iterations": args.iterations, "started_at": time.time()}
+    if args.mode in ("connect", "all"):
+        results["connect"] = measure_connect(args.iterations)
+    if args.mode in ("queries", "all"):
+        results["queries"] = measure_queries(args.iterations)
+    if args.mode in ("pool", "all"):
+        results["pool"] = measure_pool(args.iterations, args.concurrency)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2, default=str)
+    if args.json:
+        json.dump(results, sys.stdout, ensure_ascii=False, indent=2, default=str)
+        print()
+    else:
+        print_report(results)
+    return 0
+
 if __name__ == "__main__":
-    test_connection()
\ No newline at end of file
+    sys.exit(main())
\ No newline at end of file
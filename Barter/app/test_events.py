@@ -0,0 +1,81 @@
+# test_events.py
+# EventHub: ожидание событий long polling и номера событий тем.
+import asyncio
+import threading
+import time
+
+import events
+from events import EventHub
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def test_event_between_check_and_wait_is_not_lost():
+    hub = EventHub()
+    topic = events.unread_topic(1)
+
+    async def poll():
+        seen = hub.version(topic)
+        # Проверка в БД ничего не нашла, а событие пришло до начала ожидания
+        hub.notify(topic)
+        started = time.monotonic()
+        woke = await hub.wait(topic, timeout=5, since=seen)
+        return woke, time.monotonic() - started
+
+    woke, waited = run(poll())
+    assert woke
+    assert waited < 0.5
+    assert hub.waiting_count() == 0
+
+
+def test_wait_times_out_without_events():
+    hub = EventHub()
+    topic = events.dialog_topic(2, 1)
+
+    async def poll():
+        return await hub.wait(topic, timeout=0.05, since=hub.version(topic))
+
+    assert run(poll()) is False
+    assert hub.waiting_count() == 0
+
+
+def test_notify_from_another_thread_wakes_waiter():
+    hub = EventHub()
+    topic = events.dialog_topic(1, 2)
+
+    async def poll():
+        seen = hub.version(topic)
+        timer = threading.Timer(0.05, hub.notify, args=(topic,))
+        timer.start()
+        try:
+            return await hub.wait(topic, timeout=5, since=seen)
+        finally:
+            timer.cancel()
+
+    assert run(poll()) is True
+
+
+def test_other_topics_do_not_wake():
+    hub = EventHub()
+
+    async def poll():
+        seen = hub.version(events.unread_topic(1))
+        hub.notify(events.unread_topic(2))
+        return await hub.wait(events.unread_topic(1), timeout=0.05, since=seen)
+
+    assert run(poll()) is False
+
+
+def test_evicted_topic_wakes_instead_of_hanging(monkeypatch):
+    monkeypatch.setattr(events, "MAX_TOPIC_VERSIONS", 1)
+    hub = EventHub()
+    hub.notify("a")
+    seen = hub.version("a")
+    hub.notify("b")
+
+    async def poll():
+        return await hub.wait("a", timeout=5, since=seen)
+
+    assert run(poll()) is True
@@ -0,0 +1,173 @@
+# test_leaderboard.py
+# RankedIndex (блоки + дерево Фенвика) против отсортированного списка,
+# порядок Board и таблицы Leaderboard без БД, проверка результата по игре,
+# начатой на сервере.
+import random
+import time
+from bisect import insort
+
+import pytest
+
+import leaderboard
+from backend import MemoryBackend
+from leaderboard import ALL_TIME, MAX_SCORE, Board, GameSessions, Leaderboard, RankedIndex, max_score_for
+
+
+@pytest.fixture
+def small_blocks(monkeypatch):
+    # Маленькие блоки - деление и удаление блоков на коротких данных
+    monkeypatch.setattr(leaderboard, "BLOCK_SIZE", 4)
+
+
+def check(index: RankedIndex, expected: list):
+    assert len(index) == len(expected)
+    assert index.slice(0, len(expected) + 5) == expected
+    for position, key in enumerate(expected):
+        assert index.index(key) == position
+
+
+def test_random_operations_match_sorted_list(small_blocks):
+    rng = random.Random(7)
+    index = RankedIndex()
+    expected = []
+    for step in range(3000):
+        if expected and rng.random() < 0.4:
+            key = rng.choice(expected)
+            expected.remove(key)
+            assert index.remove(key)
+        else:
+            key = (rng.randint(0, 500), rng.random())
+            insort(expected, key)
+            index.add(key)
+        if step % 100 == 0:
+            check(index, expected)
+    check(index, expected)
+
+
+def test_slice_windows(small_blocks):
+    index = RankedIndex()
+    keys = list(range(0, 200, 2))
+    for key in reversed(keys):
+        index.add(key)
+    for start in (0, 1, 3, 7, 8, 50, 95, 99):
+        for count in (1, 4, 9, 30):
+            assert index.slice(start, count) == keys[start:start + count]
+    assert index.slice(100, 5) == []
+    assert index.slice(-3, 2) == keys[:2]
+    assert index.slice(5, 0) == []
+
+
+def test_remove_missing_key(small_blocks):
+    index = RankedIndex()
+    assert not index.remove(1)
+    for key in (1, 3, 5):
+        index.add(key)
+    assert not index.remove(2)
+    assert not index.remove(9)
+    assert len(index) == 3
+
+
+def test_emptied_then_refilled(small_blocks):
+    index = RankedIndex()
+    for key in range(20):
+        index.add(key)
+    for key in range(20):
+        assert index.remove(key)
+    assert len(index) == 0 and index.slice(0, 5) == []
+    index.add(42)
+    check(index, [42])
+
+
+def test_board_keeps_best_and_breaks_ties_by_time():
+    board = Board()
+    assert board.submit(1, 500, 10.0)
+    assert board.submit(2, 700, 20.0)
+    assert board.submit(3, 500, 5.0)
+    assert not board.submit(2, 600, 30.0)
+    assert board.submit(1, 800, 40.0)
+
+    assert [entry["user_id"] for entry in board.entries(0, 10)] == [1, 2, 3]
+    assert [entry["score"] for entry in board.entries(0, 10)] == [800, 700, 500]
+    assert board.rank(3) == 3
+    assert board.rank(99) is None
+    assert len(board.index) == 3
+
+
+@pytest.fixture
+def board(monkeypatch):
+    published = []
+    monkeypatch.setattr(leaderboard.events, "publish", lambda channel, payload: published.append(payload))
+    lb = Leaderboard()
+    lb.published = published
+    return lb
+
+
+def test_submit_updates_all_time_and_today(board):
+    board.submit(1, 300)
+    board.submit(2, 900)
+    position = board.submit(1, 500)
+
+    assert position["all"] == {"score": 500, "rank": 2, "players": 2}
+    assert position["today"] == {"score": 500, "rank": 2, "players": 2}
+    assert len(board.published) == 3
+    # Худший результат не рассылается и не ставится в запись
+    board.submit(2, 100)
+    assert len(board.published) == 3
+
+
+def test_around_returns_neighbours(board):
+    for user_id in range(1, 21):
+        board.submit(user_id, user_id * 10)
+    around = board.around(10, radius=2)
+    assert [entry["user_id"] for entry in around] == [12, 11, 10, 9, 8]
+    assert [entry["rank"] for entry in around] == [9, 10, 11, 12, 13]
+    assert [entry["user_id"] for entry in board.around(20, radius=2)] == [20, 19, 18]
+    assert board.around(999) == []
+
+
+def test_remote_result_is_applied_without_republishing(board):
+    board.submit(1, 100)
+    board.apply_remote({"user_id": 2, "score": 200, "achieved_at": round(time.time(), 3)})
+    assert [entry["user_id"] for entry in board.top(ALL_TIME)] == [2, 1]
+    assert len(board.published) == 1
+
+
+@pytest.fixture
+def games(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(leaderboard.time, "time", lambda: now[0])
+    sessions = GameSessions(MemoryBackend())
+    sessions.now = now
+    return sessions
+
+
+def test_score_limit_grows_with_elapsed_time():
+    assert max_score_for(1.0) == 0
+    assert max_score_for(leaderboard.GAME_COUNTDOWN_SECONDS) == leaderboard.PAIR_POINTS
+    assert max_score_for(leaderboard.GAME_COUNTDOWN_SECONDS + 2.5) == 3 * leaderboard.PAIR_POINTS
+    assert max_score_for(600) == MAX_SCORE
+
+
+def test_forged_score_is_rejected(games):
+    # Без начатой игры и с выдуманным номером результат не принимается
+    assert not games.finish(1, "", 500)
+    assert not games.finish(1, "forged", 500)
+
+    game = games.start(1)
+    assert not games.finish(1, "forged", 500)
+    assert not games.finish(2, game, 500)
+    # Максимум через две секунды после старта - быстрее, чем позволяет игра
+    games.now[0] += 2
+    assert not games.finish(1, game, MAX_SCORE)
+    # Номер одноразовый: после неудачной попытки игра закрыта
+    games.now[0] += 60
+    assert not games.finish(1, game, MAX_SCORE)
+
+
+def test_finished_game_is_accepted_once(games):
+    first = games.start(1)
+    game = games.start(1)
+    games.now[0] += 40
+    assert not games.finish(1, first, 800)
+    assert games.finish(1, game, 800)
+    assert not games.finish(1, game, 800)
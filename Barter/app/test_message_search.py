@@ -0,0 +1,87 @@
+# test_message_search.py
+# Поиск по переписке: термины и поиск по началу слова. Индекс message_search
+# живет в SQLite в памяти (запрос поиска - обычный SQL), сообщения и
+# собеседники - в словарях.
+import sqlite3
+from datetime import datetime
+
+import pytest
+
+import services
+from services import MessageSearchService
+
+MESSAGES = {
+    1: "Меняю ноутбук на велосипед",
+    2: "Есть книги и учебники по физике",
+    3: "Ноутбуки больше не нужны, спасибо",
+    4: "snake_case и еще немного текста",
+    5: "Отдам книгу и книжную полку",
+}
+USER, PARTNER = 1, 2
+
+
+@pytest.fixture
+def search(monkeypatch):
+    index = sqlite3.connect(":memory:")
+    index.row_factory = sqlite3.Row
+    index.execute(
+        "CREATE TABLE message_search (user_id INT, term TEXT, message_id INT, partner_id INT, tf INT,"
+        " PRIMARY KEY (user_id, term, message_id))"
+    )
+    for message_id, text in MESSAGES.items():
+        index.executemany(
+            "INSERT INTO message_search VALUES (?, ?, ?, ?, ?)",
+            MessageSearchService._rows(message_id, USER, PARTNER, text),
+        )
+
+    def execute_query(query, params=None, fetch=False, **kwargs):
+        if "message_search" in query:
+            rows = index.execute(query.replace("%s", "?"), list(params)).fetchall()
+            return [dict(row) for row in rows]
+        if "FROM users" in query:
+            return [{"id": PARTNER, "username": "partner", "avatar_url": None}]
+        if "FROM messages " in query and "hit_id" not in query:
+            return [
+                {"id": message_id, "sender_id": USER, "recipient_id": PARTNER,
+                 "message": MESSAGES[message_id], "created_at": datetime(2024, 1, message_id)}
+                for message_id in params if message_id in MESSAGES
+            ]
+        return []
+
+    monkeypatch.setattr(services.db, "execute_query", execute_query)
+    return lambda query: [row["message_id"] for row in MessageSearchService.search(USER, query)]
+
+
+def test_terms_are_cut_to_stem_and_normalized():
+    assert MessageSearchService.terms("Ёлка, ёлки и 5 ноутбуков") == {"елка": 1, "елки": 1, "ноутб": 1}
+
+
+def test_short_query_finds_longer_words(search):
+    assert sorted(search("ноут")) == [1, 3]
+    assert sorted(search("кни")) == [2, 5]
+    assert search("учеб") == [2]
+
+
+def test_full_word_query_matches_by_stem(search):
+    assert sorted(search("ноутбук")) == [1, 3]
+    assert search("велосипедом") == [1]
+    assert search("физиология") == []
+
+
+def test_every_query_word_must_match(search):
+    assert search("ноут велос") == [1]
+    assert search("ноут физик") == []
+
+
+def test_query_word_matching_several_words_counts_once(search):
+    # "кни" подходит и к "книгу", и к "книжную" - это одно совпадение слова запроса
+    assert search("кни пол") == [5]
+
+
+def test_underscore_is_not_a_wildcard(search):
+    assert search("snake_") == [4]
+    assert search("sn_ke") == []
+
+
+def test_empty_query(search):
+    assert search("  ") == []
@@ -0,0 +1,175 @@
+# test_offer_import.py
+# Массовая загрузка объявлений: чтение CSV/JSON/JSON Lines, проверка строк
+# и извлечение фото из архива (без БД).
+import contextlib
+import io
+import json
+import os
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import services
+from services import IMPORT_FIELD_LIMITS, OfferImportService
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"0" * 32
+JPG = b"\xff\xd8\xff" + b"1" * 32
+
+VALID = {
+    "give": "гитара",
+    "get": "велосипед",
+    "contact": "+7 900 0000000",
+    "category": "hobby",
+    "city": "spb",
+    "district": "",
+    "image": "",
+}
+
+
+def rows(data: bytes, filename: str) -> list:
+    return list(OfferImportService.read_rows(io.BytesIO(data), filename))
+
+
+def make_zip(files) -> zipfile.ZipFile:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        for name, content in files.items():
+            archive.writestr(name, content)
+    buffer.seek(0)
+    return zipfile.ZipFile(buffer)
+
+
+def test_read_csv_with_bom():
+    data = "\ufeffgive,get,contact\nкнига,лампа,@me\nстол,стул,@you\n".encode("utf-8")
+    assert rows(data, "offers.CSV") == [
+        {"give": "книга", "get": "лампа", "contact": "@me"},
+        {"give": "стол", "get": "стул", "contact": "@you"},
+    ]
+
+
+def test_read_jsonl_skips_blank_lines():
+    data = b'{"give": "a"}\n\n{"give": "b"}\n'
+    assert rows(data, "offers.jsonl") == [{"give": "a"}, {"give": "b"}]
+
+
+def test_read_json_array():
+    data = json.dumps([{"give": "a"}, {"give": "b"}]).encode()
+    assert rows(data, "offers.json") == [{"give": "a"}, {"give": "b"}]
+
+
+def test_read_json_must_be_array():
+    with pytest.raises(ValueError):
+        rows(b'{"give": "a"}', "offers.json")
+
+
+def test_read_unknown_extension():
+    with pytest.raises(ValueError):
+        rows(b"give\n", "offers.xlsx")
+
+
+def test_valid_row():
+    values, errors = OfferImportService.validate_row(dict(VALID, give="  гитара  "), None)
+    assert errors == []
+    assert values["give"] == "гитара"
+    assert values["district"] is None
+
+
+def test_not_an_object():
+    values, errors = OfferImportService.validate_row(["give", "get"], None)
+    assert values is None and len(errors) == 1
+
+
+def test_required_fields_and_unknown_choices():
+    values, errors = OfferImportService.validate_row(
+        dict(VALID, give="", contact=None, category="cars", city="paris"), None
+    )
+    assert values is None
+    assert errors == [
+        "Не заполнено поле give",
+        "Не заполнено поле contact",
+        "Неизвестная категория 'cars'",
+        "Неизвестный город 'paris'",
+    ]
+
+
+def test_field_length_limits():
+    long_row = dict(VALID, give="x" * (IMPORT_FIELD_LIMITS["give"] + 1), district="y" * 101)
+    values, errors = OfferImportService.validate_row(long_row, None)
+    assert values is None
+    assert len(errors) == 2
+
+
+def test_image_must_be_in_archive():
+    archive = make_zip({"a.png": PNG})
+    values, errors = OfferImportService.validate_row(dict(VALID, image="a.png"), archive)
+    assert errors == [] and values["image"] == "a.png"
+
+    _, errors = OfferImportService.validate_row(dict(VALID, image="b.png"), archive)
+    assert errors == ["Нет фото 'b.png' в архиве"]
+    _, errors = OfferImportService.validate_row(dict(VALID, image="a.png"), None)
+    assert errors == ["Нет фото 'a.png' в архиве"]
+
+
+def test_save_image_checks_signature(tmp_path):
+    archive = make_zip({"a.png": PNG, "b.jpeg": JPG, "c.png": b"not an image at all"})
+
+    filename = OfferImportService.save_image(archive, "a.png", str(tmp_path), 7)
+    assert filename.startswith("offer_7_") and filename.endswith(".png")
+    assert (tmp_path / filename).read_bytes() == PNG
+    assert OfferImportService.save_image(archive, "b.jpeg", str(tmp_path), 7).endswith(".jpg")
+
+    with pytest.raises(ValueError):
+        OfferImportService.save_image(archive, "c.png", str(tmp_path), 7)
+    assert len(os.listdir(tmp_path)) == 2
+
+
+class BatchCursor:
+    """Курсор транзакции: многострочный INSERT и чтение ID по метке пачки"""
+
+    def __init__(self, ids):
+        self.ids = ids
+        self.inserts = []
+        self.selects = []
+
+    def executemany(self, query, rows):
+        self.inserts.append(rows)
+
+    def execute(self, query, params):
+        self.selects.append(params)
+
+    def fetchall(self):
+        return [{"id": offer_id} for offer_id in self.ids]
+
+
+@pytest.fixture
+def insert_batch(monkeypatch):
+    published = []
+    monkeypatch.setattr(services.events, "publish_offer_created", published.append)
+
+    def run(cursor, count):
+        monkeypatch.setattr(services.db, "transaction", contextlib.contextmanager(lambda: (yield cursor)))
+        batch = [(number, dict(VALID, district=None)) for number in range(1, count + 1)]
+        with ThreadPoolExecutor(1) as pool:
+            return OfferImportService._insert_batch(7, batch, None, pool, "", ""), published
+
+    return run
+
+
+def test_batch_is_one_insert_with_ids_read_back(insert_batch):
+    # ID одного INSERT не обязаны идти подряд
+    cursor = BatchCursor([40, 43, 46])
+    report, published = insert_batch(cursor, 3)
+
+    assert len(cursor.inserts) == 1 and len(cursor.inserts[0]) == 3
+    token = cursor.inserts[0][0][-1]
+    assert all(row[-1] == token for row in cursor.inserts[0])
+    assert cursor.selects == [(token,)]
+    assert [(row["row"], row["offer_id"]) for row in report] == [(1, 40), (2, 43), (3, 46)]
+    assert [offer["id"] for offer in published] == [40, 43, 46]
+
+
+def test_batch_with_missing_ids_is_reported_as_failed(insert_batch):
+    report, published = insert_batch(BatchCursor([40]), 2)
+    assert [row["status"] for row in report] == ["error", "error"]
+    assert published == []
@@ -0,0 +1,77 @@
+# test_ratelimit.py
+# Token bucket RateLimiter и разбор лимитов/классов маршрутов.
+import pytest
+
+import ratelimit
+from ratelimit import RateLimiter, route_class
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(ratelimit.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_burst_then_limited(clock):
+    limiter = RateLimiter({"poll": (1.0, 3)})
+    assert [limiter.hit("poll", "ip:1") for _ in range(3)] == [0.0, 0.0, 0.0]
+    retry_after = limiter.hit("poll", "ip:1")
+    assert retry_after == pytest.approx(1.0)
+    assert limiter.stats()["allowed"]["poll"] == 3
+    assert limiter.stats()["limited"]["poll"] == 1
+
+
+def test_tokens_refill_with_rate(clock):
+    limiter = RateLimiter({"search": (2.0, 2)})
+    limiter.hit("search", "u")
+    limiter.hit("search", "u")
+    assert limiter.hit("search", "u") == pytest.approx(0.5)
+    clock[0] += 0.5
+    assert limiter.hit("search", "u") == 0.0
+    assert limiter.hit("search", "u") > 0
+
+
+def test_refill_is_capped_by_burst(clock):
+    limiter = RateLimiter({"write": (1.0, 2)})
+    limiter.hit("write", "u")
+    clock[0] += 3600
+    assert [limiter.hit("write", "u") for _ in range(2)] == [0.0, 0.0]
+    assert limiter.hit("write", "u") > 0
+
+
+def test_clients_and_classes_have_separate_buckets(clock):
+    limiter = RateLimiter({"poll": (1.0, 1), "default": (1.0, 1)})
+    assert limiter.hit("poll", "a") == 0.0
+    assert limiter.hit("poll", "b") == 0.0
+    assert limiter.hit("default", "a") == 0.0
+    assert limiter.hit("poll", "a") > 0
+
+
+def test_least_recent_client_is_evicted(clock):
+    limiter = RateLimiter({"poll": (1.0, 1)}, max_clients=2)
+    limiter.hit("poll", "a")
+    limiter.hit("poll", "b")
+    limiter.hit("poll", "c")
+    assert limiter.stats()["clients"] == 2
+    # Корзина "a" вытеснена - клиент снова начинает с полного всплеска
+    assert limiter.hit("poll", "a") == 0.0
+    assert limiter.hit("poll", "c") > 0
+
+
+def test_route_classes():
+    assert route_class("GET", "/messages/12/new") == "poll"
+    assert route_class("GET", "/api/unread_count") == "poll"
+    assert route_class("GET", "/api/search_users") == "search"
+    assert route_class("POST", "/addoffer") == "write"
+    assert route_class("GET", "/offer") == "default"
+    assert route_class("GET", "/static/dist/home.css") is None
+    assert route_class("GET", "/health/ready") is None
+
+
+def test_limits_from_environment(monkeypatch):
+    monkeypatch.setenv("BARTER_RATE_POLL", "5:50")
+    monkeypatch.setenv("BARTER_RATE_SEARCH", "broken")
+    limits = ratelimit.load_limits()
+    assert limits["poll"] == (5.0, 50)
+    assert limits["search"] == ratelimit.DEFAULT_LIMITS["search"]
@@ -0,0 +1,94 @@
+# test_shared_cache.py
+# Общий уровень кеша: сериализация строк БД и SharedCache поверх бэкенда,
+# который считается общим (MemoryBackend вместо Redis).
+from datetime import date, datetime
+from decimal import Decimal
+
+import pytest
+
+from backend import MemoryBackend
+from cache import SharedCache, TTLCache, dumps_value, loads_value
+
+
+class SharedMemoryBackend(MemoryBackend):
+    shared = True
+
+
+def test_roundtrip_keeps_db_types():
+    row = {
+        "id": 3,
+        "give": "гитара",
+        "created_at": datetime(2024, 5, 1, 12, 30, 15, 123456),
+        "birthday": date(2000, 1, 2),
+        "avg_rating": Decimal("4.3333"),
+        "blob": b"\x00\xffraw",
+        "image_url": None,
+        "is_active": True,
+    }
+    assert loads_value(dumps_value(row)) == row
+
+
+def test_roundtrip_lists_and_nested():
+    value = [{"id": 1, "at": datetime(2024, 1, 1)}, {"id": 2, "tags": [Decimal("1.5"), None]}]
+    restored = loads_value(dumps_value(value))
+    assert restored == value
+    assert isinstance(restored[0]["at"], datetime)
+    assert isinstance(restored[1]["tags"][0], Decimal)
+
+
+def test_plain_dict_with_marker_like_key_is_kept():
+    value = {"__dt__": "not a date", "other": 1}
+    assert loads_value(dumps_value(value)) == value
+
+
+def test_unknown_type_is_rejected():
+    with pytest.raises(TypeError):
+        dumps_value({"x": object()})
+
+
+def make_pair():
+    backend = SharedMemoryBackend()
+    first = SharedCache(TTLCache("offers"), backend)
+    second = SharedCache(TTLCache("offers"), backend)
+    return backend, first, second
+
+
+def test_second_worker_reads_shared_value_without_loading():
+    _, first, second = make_pair()
+    row = {"id": 1, "created_at": datetime(2024, 1, 1, 10, 0)}
+    assert first.get_or_load(1, lambda: row) == row
+
+    def fail():
+        raise AssertionError("загрузка из БД не нужна")
+
+    assert second.get_or_load(1, fail) == row
+    assert second.stats()["shared_hits"] == 1
+
+
+def test_tag_invalidation_reaches_shared_level():
+    _, first, second = make_pair()
+    tags = lambda v: [("user", v["user_id"])]
+    first.get_or_load(1, lambda: {"id": 1, "user_id": 7}, tags=tags)
+    second.get_or_load(1, lambda: None, tags=tags)
+
+    first.invalidate_tag(("user", 7))
+    # Локальную копию второго воркера сбрасывает рассылка CacheService
+    second.invalidate_tag(("user", 7), local_only=True)
+    assert second.get_or_load(1, lambda: {"id": 1, "user_id": 7, "fresh": True}, tags=tags)["fresh"]
+
+
+def test_local_only_delete_keeps_shared_value():
+    backend, first, _ = make_pair()
+    first.get_or_load(1, lambda: {"id": 1})
+    first.delete(1, local_only=True)
+    assert backend.get(first._key(1)) is not None
+    first.delete(1)
+    assert backend.get(first._key(1)) is None
+
+
+def test_unshared_backend_uses_only_local_level():
+    backend = MemoryBackend()
+    c = SharedCache(TTLCache("offers"), backend)
+    c.get_or_load(1, lambda: {"id": 1})
+    assert backend.get(c._key(1)) is None
+    assert c.stats()["shared_misses"] == 0